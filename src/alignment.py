@@ -0,0 +1,83 @@
+import numpy as np
+
+# === RIEMPIMENTO DEI BUCHI SULLA GRIGLIA ENTITÀ × ANNO ===
+# Il pannello (panel.py) porta già ogni metrica sulla stessa griglia entità × anno;
+# le serie sparse (PIL Maddison, popolazione storica) restano però con anni
+# mancanti, e un dropna dopo la selezione toglie righe intere senza dirlo.
+# fill_gaps riempie i buchi di tutte le entità insieme, senza cicli:
+#   - per ogni cella, indice dell'ultimo anno osservato prima (maximum.accumulate)
+#     e del primo dopo (minimum.accumulate sulla matrice rovesciata)
+#   - 'linear'    interpolazione lineare tra i due valori (solo buchi interni)
+#   - 'loglinear' interpolazione lineare del logaritmo (crescita costante; solo
+#                 tra valori positivi), adatta a PIL e popolazione
+#   - 'ffill'     ultimo valore osservato, anche dopo la fine della serie
+# `max_gap` limita il riempimento: per le interpolazioni la lunghezza massima del
+# buco, per ffill la distanza massima dall'ultimo dato. Nessun metodo estrapola
+# prima del primo dato. Ogni cella riempita è segnata nella maschera restituita.
+
+METHODS = ('linear', 'loglinear', 'ffill')
+
+
+def fill_gaps(values, method='linear', max_gap=None):
+    """(matrice riempita, maschera delle celle riempite) per una matrice entità × anno."""
+    if method not in METHODS:
+        raise ValueError(f"metodo sconosciuto: {method} (disponibili: {', '.join(METHODS)})")
+    values = np.asarray(values, dtype=float)
+    n_e, n_y = values.shape
+    valid = ~np.isnan(values)
+    idx = np.arange(n_y)
+    rows = np.arange(n_e)[:, None]
+
+    prev = np.where(valid, idx, -1)
+    np.maximum.accumulate(prev, axis=1, out=prev)
+    before = values[rows, np.maximum(prev, 0)]
+    fill = ~valid & (prev >= 0)
+
+    if method == 'ffill':
+        if max_gap is not None:
+            fill &= idx - prev <= max_gap
+        out = np.where(fill, before, values)
+        return out, fill
+
+    nxt = np.where(valid, idx, n_y)
+    nxt = np.minimum.accumulate(nxt[:, ::-1], axis=1)[:, ::-1]
+    after = values[rows, np.minimum(nxt, n_y - 1)]
+    fill &= nxt < n_y
+    if max_gap is not None:
+        fill &= nxt - prev - 1 <= max_gap
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = (idx - prev) / (nxt - prev)
+        if method == 'linear':
+            filled = before + frac * (after - before)
+        else:
+            fill &= (before > 0) & (after > 0)
+            filled = np.exp(np.log(before) + frac * (np.log(after) - np.log(before)))
+    out = np.where(fill, filled, values)
+    return out, fill
+
+
+def align(panel, metrics, method='linear', max_gap=None):
+    """Metriche del pannello riempite: {metrica: (matrice, maschera)}."""
+    if isinstance(metrics, str):
+        metrics = [metrics]
+    return {m: fill_gaps(panel.metrics[m], method, max_gap) for m in metrics}
+
+
+if __name__ == '__main__':
+    import time
+
+    from panel import load_panel
+
+    p = load_panel()
+    t0 = time.perf_counter()
+    aligned = align(p, ['gdp_per_capita', 'population'], 'loglinear', max_gap=10)
+    print(f"{len(p.entities)} entità × {len(p.years)} anni, 2 metriche in {time.perf_counter() - t0:.4f} s")
+    for m, (filled, mask) in aligned.items():
+        before = (~np.isnan(p.metrics[m])).sum()
+        print(f"{m:16} osservati {before:6}  riempiti {mask.sum():6}")
+    gdp, mask = aligned['gdp_per_capita']
+    for e in ('China', 'Nigeria', 'India'):
+        i = p.entity_id[e]
+        years = p.years[mask[i] & (p.years >= 1900)]
+        print(f"{e:10} PIL pro capite, anni riempiti dal 1900: {', '.join(map(str, years)) or '-'}")
@@ -0,0 +1,310 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+import matplotlib  # noqa: E402
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+
+# === ANIMAZIONI ANNO PER ANNO ===
+# python src/animate.py decoupling tcre debt [--format gif|mp4] [--fps 12] [--jobs N]
+# Versioni "time-lapse" dei grafici di emissions_country.py, tcre.py e
+# climate_debt.py. Ridisegnare l'intera figura a ogni anno costa quasi tutto
+# il tempo in assi, testi e legenda; qui:
+#   - gli elementi fissi (assi, limiti, titoli, legenda) sono disegnati una volta
+#   - gli elementi che cambiano sono "animated": a ogni fotogramma si ripristina
+#     lo sfondo salvato (blitting) e si disegnano solo quelli, aggiornando i dati
+#   - i fotogrammi sono divisi a blocchi tra processi; ogni processo costruisce
+#     la propria figura, rasterizza e comprime (PNG a palette comune) i suoi fotogrammi
+#   - la codifica finale usa ffmpeg se installato (MP4), altrimenti Pillow (GIF)
+# Il resoconto riporta fotogrammi al secondo di rasterizzazione e complessivi;
+# con --compare-naive anche quelli del ridisegno completo della figura.
+
+SRC_DIR = Path(__file__).resolve().parent
+OUT_DIR = SRC_DIR.parent / 'results' / 'animations'
+FIGSIZE = (11, 6.5)
+DPI = 90
+
+
+class DecouplingAnimation:
+    """Curve PIL totale → CO₂ dei paesi di emissions_country.py che crescono anno per anno."""
+
+    entities = ['European Union (27)', 'United States', 'China', 'India',
+                'Japan', 'Germany', 'United Kingdom', 'France', 'Italy']
+
+    def __init__(self, first_year=1950, last_year=2023):
+        from panel import load_panel
+
+        q = (load_panel().select('co2', 'population', 'gdp_per_capita')
+             .where(entities=self.entities, years=(first_year, last_year)))
+        self.years = q.panel.years[q.panel.year_slice((first_year, last_year))]
+        self.gdp = q.total('gdp_per_capita', scale=1e-9).wide('gdp_per_capita_total').to_numpy()
+        self.co2 = q.wide('co2').to_numpy() / 1e9
+        # solo entità con almeno un anno completo (l'UE non ha il PIL Maddison)
+        keep = (~np.isnan(self.gdp) & ~np.isnan(self.co2)).any(axis=1)
+        self.entities = [e for e, k in zip(self.entities, keep) if k]
+        self.gdp, self.co2 = self.gdp[keep], self.co2[keep]
+        self.frames = list(range(len(self.years)))
+
+    def setup(self, fig):
+        import seaborn as sns
+
+        ax = fig.add_subplot()
+        colors = sns.color_palette('tab10', len(self.entities))
+        ax.set_xlim(0, np.nanmax(self.gdp) * 1.05)
+        ax.set_ylim(0, np.nanmax(self.co2) * 1.08)
+        ax.set_title('Decoupling Economico-Emissivo', fontsize=16, fontweight='bold')
+        ax.set_xlabel('PIL totale (miliardi USD 2011)')
+        ax.set_ylabel('Emissioni annuali CO₂ (Gt)')
+        ax.grid(True, alpha=0.3)
+        self.lines = [ax.plot([], [], linewidth=3, color=c, label=e)[0] for e, c in zip(self.entities, colors)]
+        self.heads = [ax.plot([], [], 'o', markersize=8, color=c)[0] for c in colors]
+        ax.legend(loc='upper left', fontsize=9)
+        self.label = ax.text(0.98, 0.04, '', transform=ax.transAxes, ha='right', fontsize=28,
+                             fontweight='bold', color='0.35')
+        return self.lines + self.heads + [self.label]
+
+    def update(self, i):
+        for k, (line, head) in enumerate(zip(self.lines, self.heads)):
+            x, y = self.gdp[k, :i + 1], self.co2[k, :i + 1]
+            ok = ~(np.isnan(x) | np.isnan(y))
+            line.set_data(x[ok], y[ok])
+            head.set_data(x[ok][-1:], y[ok][-1:])
+        self.label.set_text(str(self.years[i]))
+
+
+class TCREAnimation:
+    """Dispersione cumulata → anomalia di tcre.py che si riempie, con la retta stimata fino a quell'anno."""
+
+    def __init__(self):
+        from tcre_engine import expanding_fit, tcre_data
+
+        data = tcre_data()
+        self.years = data['Year'].to_numpy()
+        self.x = data['Cumulative_GtCO2'].to_numpy()
+        self.y = data['Temp_anomaly'].to_numpy()
+        self.slope, self.intercept, self.r2 = expanding_fit(self.x, self.y)
+        self.frames = [i for i in range(len(self.years)) if i >= 2]
+
+    def setup(self, fig):
+        ax = fig.add_subplot()
+        ax.set_xlim(0, self.x.max() * 1.05)
+        ax.set_ylim(self.y.min() - 0.2, self.y.max() + 0.2)
+        ax.set_title('Emissioni cumulative e riscaldamento (TCRE)', fontsize=16, fontweight='bold')
+        ax.set_xlabel('Emissioni cumulative di CO₂ (GtCO₂)')
+        ax.set_ylabel('Anomalia di temperatura (°C, vs 1861–1890)')
+        ax.grid(True, alpha=0.3)
+        norm = plt.Normalize(self.years[0], self.years[-1])
+        self.points = ax.scatter(self.x[:1], self.y[:1], c=self.years[:1], cmap='plasma', norm=norm,
+                                 s=30, edgecolor='black', linewidth=0.3)
+        fig.colorbar(plt.cm.ScalarMappable(norm=norm, cmap='plasma'), ax=ax, label='Anno')
+        self.fit = ax.plot([], [], color='darkred', linewidth=2.5)[0]
+        self.label = ax.text(0.03, 0.95, '', transform=ax.transAxes, va='top', fontsize=13,
+                             fontweight='bold', bbox=dict(boxstyle='round', facecolor='white', alpha=0.85))
+        return [self.points, self.fit, self.label]
+
+    def update(self, i):
+        self.points.set_offsets(np.column_stack([self.x[:i + 1], self.y[:i + 1]]))
+        self.points.set_array(self.years[:i + 1])
+        xs = np.array([0, self.x[i]])
+        self.fit.set_data(xs, self.intercept[i] + self.slope[i] * xs)
+        self.label.set_text(f"{self.years[i]}\nTCRE {self.slope[i] * 1000:.2f} °C/1000 Gt  R² {self.r2[i]:.2f}")
+
+
+class DebtAnimation:
+    """Classifica del debito climatico (climate_debt.py) per anno di taglio."""
+
+    top = 12
+
+    def __init__(self, first_year=1900, last_year=2023):
+        from debt_engine import compute_debt
+        from hierarchy import load_hierarchy
+
+        h = load_hierarchy()
+        table = compute_debt(h.panel, first_cutoff=first_year, last_cutoff=last_year)
+        ids = np.array([table.entity_id[e] for e in h.entities_at('country')])
+        debt = np.nan_to_num(table.debt[ids] / 1e9, nan=-np.inf)
+        # classifica di tutti gli anni con un solo argsort lungo i paesi
+        order = np.argsort(-debt, axis=0, kind='stable')[:self.top]
+        self.names = np.array(table.entities, dtype=object)[ids][order]     # top × anni
+        self.values = np.take_along_axis(debt, order, axis=0)
+        self.years = table.years
+        self.frames = list(range(len(self.years)))
+
+    def setup(self, fig):
+        ax = fig.add_subplot()
+        ax.set_xlim(0, np.nanmax(self.values[np.isfinite(self.values)]) * 1.18)
+        ax.set_ylim(self.top - 0.4, -0.6)
+        ax.set_yticks([])
+        ax.set_title('Debito Climatico Storico\nGtCO₂ oltre la quota equa per capita',
+                     fontsize=15, fontweight='bold', color='darkred')
+        ax.set_xlabel('GtCO₂ di debito climatico')
+        ax.grid(True, axis='x', alpha=0.3)
+        colors = plt.cm.Reds_r(np.linspace(0.05, 0.6, self.top))
+        self.bars = list(ax.barh(np.arange(self.top), np.zeros(self.top), color=colors, edgecolor='black'))
+        self.names_txt = [ax.text(0, k, '', ha='right', va='center', fontsize=10, fontweight='bold',
+                                  clip_on=False) for k in range(self.top)]
+        self.values_txt = [ax.text(0, k, '', va='center', fontsize=10, color='darkred')
+                           for k in range(self.top)]
+        self.label = ax.text(0.97, 0.06, '', transform=ax.transAxes, ha='right', fontsize=28,
+                             fontweight='bold', color='0.35')
+        self.left = 0.17    # spazio per i nomi dei paesi a sinistra delle barre
+        return self.bars + self.names_txt + self.values_txt + [self.label]
+
+    def update(self, i):
+        pad = self.bars[0].axes.get_xlim()[1] * 0.01
+        for k, bar in enumerate(self.bars):
+            v = self.values[k, i]
+            shown = np.isfinite(v) and v > 0
+            bar.set_width(v if shown else 0)
+            self.names_txt[k].set_text(self.names[k, i] if shown else '')
+            self.names_txt[k].set_x(-pad)
+            self.values_txt[k].set_text(f'{v:.0f} Gt' if shown else '')
+            self.values_txt[k].set_x((v if shown else 0) + pad)
+        self.label.set_text(str(self.years[i]))
+
+
+ANIMATIONS = {'decoupling': DecouplingAnimation, 'tcre': TCREAnimation, 'debt': DebtAnimation}
+
+
+# --- rasterizzazione ---
+
+def _render_chunk(name, frames, frame_dir, dpi=DPI, blit=True):
+    """Rasterizza i fotogrammi `frames` in PNG a palette; restituisce (n, secondi)."""
+    from PIL import Image
+
+    t0 = time.perf_counter()
+    anim = ANIMATIONS[name]()
+    fig = plt.figure(figsize=FIGSIZE, dpi=dpi, facecolor='white')
+    artists = anim.setup(fig)
+    fig.tight_layout()
+    if hasattr(anim, 'left'):
+        fig.subplots_adjust(left=anim.left)
+    canvas = fig.canvas
+    if frame_dir is not None:
+        # una palette per tutta l'animazione, dall'ultimo fotogramma (il più completo):
+        # stessa in tutti i processi e quantizzazione per fotogramma senza mediancut
+        anim.update(anim.frames[-1])
+        canvas.draw()
+        palette = Image.fromarray(np.asarray(canvas.buffer_rgba())[..., :3]).quantize(
+            colors=255, method=Image.Quantize.MEDIANCUT)
+    if blit:
+        for a in artists:
+            a.set_animated(True)
+        canvas.draw()
+        background = canvas.copy_from_bbox(fig.bbox)
+    for i in frames:
+        anim.update(anim.frames[i])
+        if blit:
+            canvas.restore_region(background)
+            for a in artists:
+                fig.draw_artist(a)
+        else:
+            canvas.draw()
+        rgb = np.asarray(canvas.buffer_rgba())[..., :3]
+        if frame_dir is not None:
+            Image.fromarray(rgb).quantize(palette=palette, dither=Image.Dither.NONE).save(
+                Path(frame_dir) / f'frame_{i:04d}.png', compress_level=1)
+    plt.close(fig)
+    return len(frames), time.perf_counter() - t0
+
+
+def _chunks(n, parts):
+    bounds = np.linspace(0, n, parts + 1).astype(int)
+    return [list(range(a, b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def encode(frame_dir, out_path, fps):
+    """MP4 con ffmpeg, GIF con Pillow; restituisce il file scritto."""
+    out_path = Path(out_path)
+    frames = sorted(Path(frame_dir).glob('frame_*.png'))
+    if out_path.suffix == '.mp4':
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(fps),
+                        '-pattern_type', 'glob', '-i', str(Path(frame_dir) / 'frame_*.png'),
+                        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', str(out_path)],
+                       check=True)
+        return out_path
+    from PIL import Image
+    # fotogrammi già a palette comune: niente ottimizzazione per fotogramma (×20 più lenta)
+    images = [Image.open(f) for f in frames]
+    images[0].save(out_path, save_all=True, append_images=images[1:],
+                   duration=round(1000 / fps), loop=0, disposal=1, optimize=False)
+    return out_path
+
+
+def animate(name, out_dir=OUT_DIR, fmt='gif', fps=12, jobs=None, dpi=DPI):
+    """Genera l'animazione `name`; restituisce tempi e throughput."""
+    if fmt == 'mp4' and shutil.which('ffmpeg') is None:
+        print("ffmpeg non trovato: uso GIF (Pillow)", file=sys.stderr)
+        fmt = 'gif'
+    t0 = time.perf_counter()
+    n = len(ANIMATIONS[name]().frames)
+    workers = max(1, min(jobs or os.cpu_count(), n))
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=f'{name}_', dir=out_dir) as frame_dir:
+        t_raster = time.perf_counter()
+        chunks = _chunks(n, workers)
+        if workers == 1:
+            done = [_render_chunk(name, chunks[0], frame_dir, dpi)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                done = list(pool.map(_render_chunk, [name] * len(chunks), chunks,
+                                     [frame_dir] * len(chunks), [dpi] * len(chunks)))
+        raster_s = time.perf_counter() - t_raster
+        t_encode = time.perf_counter()
+        path = encode(frame_dir, out_dir / f'{name}.{fmt}', fps)
+        encode_s = time.perf_counter() - t_encode
+    total_s = time.perf_counter() - t0
+    return {'animation': name, 'frames': n, 'workers': workers, 'file': str(path),
+            'raster_s': raster_s, 'encode_s': encode_s, 'total_s': total_s,
+            'raster_fps': n / raster_s, 'fps': n / total_s,
+            'worker_fps': [k / s for k, s in done]}
+
+
+def naive_fps(name, n=20, dpi=DPI):
+    """Fotogrammi al secondo ridisegnando tutta la figura (senza blitting), sui primi `n`."""
+    frames, secs = _render_chunk(name, list(range(n)), None, dpi, blit=False)
+    blit_frames, blit_secs = _render_chunk(name, list(range(n)), None, dpi, blit=True)
+    return frames / secs, blit_frames / blit_secs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Animazioni anno per anno dei grafici principali.")
+    parser.add_argument('animations', nargs='*', help=f"default: tutte ({', '.join(ANIMATIONS)})")
+    parser.add_argument('--format', choices=['gif', 'mp4'], default='gif')
+    parser.add_argument('--fps', type=int, default=12)
+    parser.add_argument('--dpi', type=int, default=DPI)
+    parser.add_argument('--jobs', type=int, default=None, help="processi per la rasterizzazione")
+    parser.add_argument('--out', type=Path, default=OUT_DIR)
+    parser.add_argument('--compare-naive', action='store_true',
+                        help="misura anche il ridisegno completo della figura (20 fotogrammi)")
+    args = parser.parse_args(argv)
+    names = args.animations or list(ANIMATIONS)
+    unknown = set(names) - set(ANIMATIONS)
+    if unknown:
+        parser.error(f"animazioni sconosciute: {', '.join(sorted(unknown))}")
+
+    print(f"{'Animazione':12} {'fotogrammi':>10} {'processi':>8} {'raster (s)':>10} {'codifica (s)':>12} "
+          f"{'fps raster':>10} {'fps totali':>10}")
+    for name in names:
+        r = animate(name, args.out, args.format, args.fps, args.jobs, args.dpi)
+        print(f"{name:12} {r['frames']:10} {r['workers']:8} {r['raster_s']:10.2f} {r['encode_s']:12.2f} "
+              f"{r['raster_fps']:10.1f} {r['fps']:10.1f}  → {r['file']}")
+        if args.compare_naive:
+            naive, blit = naive_fps(name, dpi=args.dpi)
+            print(f"{'':12} ridisegno completo: {naive:.1f} fps, blitting: {blit:.1f} fps "
+                  f"(un processo, senza codifica, ×{blit / naive:.1f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import hierarchy
+import owid_store
+import panel
+from owid_store import DATA_DIR, load
+
+# === BENCHMARK DELLE FASI DI OGNI SCRIPT ===
+# Una misura per fase: lettura CSV (per file), costruzione e query del
+# pannello, debito climatico, cumulate per fonte, decoupling, totali globali
+# della gerarchia, dati e fit TCRE, render Agg, avvio della CLI in modalità
+# solo tabella contro l'import delle librerie grafiche.
+# Ogni fase chiama la funzione vera dello script o del modulo condiviso
+# (scavalcando la cache di memoize con __wrapped__), non una sua copia.
+# Gira sul pannello di data/ e su pannelli sintetici con 10× e 100× entità
+# e, separatamente, 10× e 100× anni.
+# I risultati sono salvati in benchmarks/ (uno per commit, fuori da git) e
+# confrontati con l'esecuzione precedente per evidenziare le regressioni.
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / 'benchmarks'
+SLOWER = 1.20   # soglia oltre la quale un caso è segnalato come regressione
+
+CO2_COL = 'Annual CO₂ emissions'
+# metriche lette dalle fasi: i pannelli sintetici copiano solo queste
+BENCH_METRICS = ['co2', 'population', 'gdp_per_capita', *panel.FUEL_METRICS.values(),
+                 'temperature', 'temperature_lower', 'temperature_upper']
+
+
+def timeit(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {'min_s': min(times), 'median_s': statistics.median(times), 'repeat': repeat}
+
+
+def scale_panel(data, entities=1, years=1, seed=0):
+    """Pannello sintetico: entità copiate `entities` volte (rinominate) e serie
+    allungate all'indietro di `years` volte, con valori leggermente perturbati.
+
+    Gli anni reali restano gli ultimi, così le finestre di default degli script
+    (1990–2023, ultimo anno osservato, ...) continuano a valere.
+    """
+    if entities == 1 and years == 1:
+        return data
+    rng = np.random.default_rng(seed)
+    n_years = len(data.years) * years
+    all_years = np.arange(int(data.years[-1]) - n_years + 1, int(data.years[-1]) + 1)
+    names = [e if k == 0 else f'{e} #{k}' for k in range(entities) for e in data.entities]
+    metrics = {}
+    for m in BENCH_METRICS:
+        values = np.asarray(data.metrics[m])
+        # copie perturbate prima, serie reale in fondo
+        wide = np.concatenate([values * rng.uniform(0.9, 1.1) for _ in range(years - 1)] + [values],
+                              axis=1)
+        metrics[m] = np.concatenate([wide * rng.uniform(0.9, 1.1) if k else wide
+                                     for k in range(entities)])
+    return panel.Panel(names, data.codes * entities, all_years, metrics)
+
+
+@contextmanager
+def using_panel(data):
+    """Fa leggere `data` a load_panel()/load_hierarchy() per la durata del blocco."""
+    saved = panel._panel, hierarchy._hierarchy
+    panel._panel, hierarchy._hierarchy = data, hierarchy.Hierarchy(data)
+    try:
+        yield
+    finally:
+        panel._panel, hierarchy._hierarchy = saved
+
+
+def script_function(script, name):
+    """Funzione `name` di uno script piatto, senza eseguirne grafici e salvataggi.
+
+    Esegue solo le istruzioni che precedono begin('compute'): import, costanti
+    e funzioni di calcolo (gli script sono scritti in quest'ordine).
+    """
+    path = Path(__file__).with_name(script)
+    tree = ast.parse(path.read_text(encoding='utf-8'))
+    head = []
+    for node in tree.body:
+        if (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+                and getattr(node.value.func, 'id', None) == 'begin'):
+            break
+        head.append(node)
+    namespace = {'__name__': path.stem, '__file__': str(path)}
+    exec(compile(ast.Module(head, type_ignores=[]), str(path), 'exec'), namespace)
+    return namespace[name]
+
+
+# --- fasi: funzioni vere, senza memoize ---
+
+def case_panel_frame(data):
+    entities = data.entities[::10]
+    return lambda: data.frame(['co2', 'population', 'gdp_per_capita'], entities, require='co2')
+
+
+def case_climate_debt(data):
+    fn = script_function('climate_debt.py', 'cumulative_debt').__wrapped__
+    countries = hierarchy.Hierarchy(data).entities_at('country')
+    return lambda: fn(countries)
+
+
+def case_fuel_cumsum(data):
+    fn = script_function('fuel.py', 'cumulative_by_fuel').__wrapped__
+    fuel_cols = {fuel: panel.METRICS[m][1] for fuel, m in panel.FUEL_METRICS.items()}
+    return lambda: fn(fuel_cols)
+
+
+def case_decoupling(data):
+    from decoupling import decoupling_frame
+    fn = decoupling_frame.__wrapped__
+    countries = hierarchy.Hierarchy(data).entities_at('country')
+    return lambda: fn(countries)
+
+
+def case_global_total(data):
+    # gerarchia nuova a ogni giro: rollup per gruppo ricalcolati, non riletti
+    def run():
+        h = hierarchy.Hierarchy(data)
+        for m in ('co2', *panel.FUEL_METRICS.values()):
+            h.global_total(m)
+        return h.group_total('co2', 'countries')
+    return run
+
+
+def case_tcre(data):
+    import tcre_engine
+
+    def run():
+        d = tcre_engine.tcre_data()
+        return tcre_engine.expanding_fit(d['Cumulative_GtCO2'], d['Temp_anomaly'])
+    return run
+
+
+def case_debt_engine(data):
+    from debt_engine import compute_debt
+    return lambda: compute_debt(data)
+
+
+CASES = {
+    'panel_frame': case_panel_frame,
+    'climate_debt': case_climate_debt,
+    'fuel_cumsum': case_fuel_cumsum,
+    'decoupling_frame': case_decoupling,
+    'global_total': case_global_total,
+    'tcre': case_tcre,
+    'debt_engine_all_cutoffs': case_debt_engine,
+}
+
+
+def case_render(co2):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    sub = co2[co2['Entity'].isin(['China', 'United States', 'India', 'Germany', 'Japan'])]
+
+    def run():
+        fig, ax = plt.subplots(figsize=(17, 10))
+        for e, g in sub.groupby('Entity'):
+            ax.plot(g['Year'], g[CO2_COL] / 1e9, linewidth=4, marker='o', markersize=6, label=e)
+        ax.legend()
+        fig.canvas.draw()
+        plt.close(fig)
+    return run
+
+
+def case_startup(argv):
+    # processo Python nuovo: misura anche il costo degli import
+    def run():
+        subprocess.run([sys.executable, *argv], cwd=ROOT, capture_output=True, check=True,
+                       env={**os.environ, 'MPLBACKEND': 'Agg'})
+    return run
+
+
+def run_suite(scales=(1, 10, 100), repeat=5, include_render=True):
+    results = {}
+
+    # lettura CSV: parse completo vs copia binaria di owid_store
+    for src in sorted(DATA_DIR.glob('*.csv')):
+        results[f'load_csv[{src.name}]'] = timeit(lambda: pd.read_csv(src), repeat)
+        load(src.name)
+        owid_store._loaded.clear()
+        results[f'load_store[{src.name}]'] = timeit(
+            lambda: (owid_store._loaded.clear(), load(src.name)), repeat)
+
+    results['panel_build[x1]'] = timeit(panel.build_panel, repeat)
+    data = panel.load_panel()
+    co2 = load('annual-co2-emissions-per-country.csv')
+
+    # stesse fasi sul pannello reale e su pannelli più larghi (entità) o più lunghi (anni)
+    sizes = [(f'x{s}', s, 1) for s in scales] + [(f'years x{s}', 1, s) for s in scales if s != 1]
+    for label, n_entities, n_years in sizes:
+        scaled = scale_panel(data, n_entities, n_years)
+        cells = len(scaled.entities) * len(scaled.years)
+        with using_panel(scaled):
+            for name, case in CASES.items():
+                r = timeit(case(scaled), repeat if max(n_entities, n_years) < 100 else max(1, repeat // 2))
+                r['cells'] = cells
+                results[f'{name}[{label}]'] = r
+        del scaled
+
+    # avvio: tabella dalla CLI senza grafici vs sole importazioni degli script
+    startup = min(repeat, 3)
+    for analysis in ('debt', 'fuel', 'tcre'):
+        results[f'startup_cli[{analysis} --no-plot]'] = timeit(
+            case_startup(['src/cli.py', analysis, '--no-plot', '--format', 'json']), startup)
+    results['startup_imports[pandas+pyplot+seaborn+scipy]'] = timeit(
+        case_startup(['-c', 'import pandas, matplotlib.pyplot, seaborn, scipy.stats']), startup)
+
+    if include_render:
+        results['render_agg[decoupling]'] = timeit(case_render(co2), repeat)
+    return results
+
+
+# --- storico e confronto ---
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save(results, out_dir=RESULTS_DIR):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    commit = _commit()
+    record = {'commit': commit, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'numpy': np.__version__,
+              'pandas': pd.__version__, 'cpus': os.cpu_count(), 'cases': results}
+    path = out_dir / f'{time.strftime("%Y%m%d-%H%M%S")}_{commit}.json'
+    path.write_text(json.dumps(record, indent=1))
+    return path
+
+
+def previous(out_dir=RESULTS_DIR, exclude=None):
+    runs = sorted(p for p in out_dir.glob('*.json') if p != exclude)
+    return json.loads(runs[-1].read_text()) if runs else None
+
+
+def report(results, baseline=None):
+    print(f"{'Caso':60} {'min (ms)':>10} {'mediana':>10} {'vs prec.':>9}")
+    print('-' * 92)
+    for name, r in results.items():
+        delta = ''
+        if baseline and name in baseline['cases']:
+            ratio = r['min_s'] / baseline['cases'][name]['min_s']
+            delta = f"{ratio:8.2f}×" + ('  ← PIÙ LENTO' if ratio > SLOWER else '')
+        print(f"{name:60} {r['min_s'] * 1e3:10.1f} {r['median_s'] * 1e3:10.1f} {delta}")
+    if baseline:
+        print(f"\nConfronto con il commit {baseline['commit']} ({baseline['timestamp']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark delle fasi di caricamento, join, calcolo e render.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-render', action='store_true')
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args(argv)
+
+    baseline = previous()
+    results = run_suite(args.scales, args.repeat, not args.no_render)
+    report(results, baseline)
+    if not args.no_save:
+        print(f"Risultati salvati in {save(results)}")
+
+
+if __name__ == '__main__':
+    main()
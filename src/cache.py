@@ -0,0 +1,350 @@
+import ast
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import textwrap
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from owid_store import CACHE_DIR, source_hash
+
+try:
+    import fcntl
+except ImportError:         # Windows
+    fcntl = None
+    import msvcrt
+
+# === CACHE DELLE TABELLE DERIVATE ===
+# Le tabelle intermedie (pannello, cumulate, global_annual di fuel.py,
+# tabella di decoupling) sono memorizzate con una chiave che dipende da:
+#   - hash dei CSV sorgente
+#   - argomenti della funzione (lista entità, finestra di anni, ...)
+#   - versione del codice: sorgente della funzione e delle funzioni/classi del
+#     suo modulo che usa, più i moduli del progetto che raggiunge (per nome
+#     globale o import, anche dentro le funzioni), per intero e in modo transitivo
+# Se cambia solo un titolo nello script, la chiave resta uguale e i calcoli
+# non vengono rifatti. Su disco la cache ha una dimensione massima con
+# rimozione LRU; in memoria si tengono le ultime voci usate dal processo.
+# L'indice su disco è letto e riscritto sotto un lock di file: i processi
+# paralleli di render_all non perdono voci e ogni .pkl resta soggetto all'LRU.
+# Lo stesso risultato è restituito a ogni chiamata, quindi va trattato come
+# immutabile: DataFrame e Series escono come copie (superficiali, copy-on-write
+# come in owid_store.load), gli array numpy sono resi di sola lettura.
+
+SRC_DIR = Path(__file__).resolve().parent
+DERIVED_DIR = CACHE_DIR / 'derived'
+INDEX_PATH = DERIVED_DIR / 'index.json'
+LOCK_PATH = DERIVED_DIR / 'index.lock'
+MAX_BYTES = int(float(os.environ.get('OWID_CACHE_MAX_MB', 256)) * 1e6)
+MEMORY_ENTRIES = 32
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()     # il servizio chiama le funzioni in cache da più thread
+
+
+def _canonical(obj):
+    # valori non JSON con una forma stabile tra processi; tutto il resto è rifiutato
+    # (un repr può cambiare da un processo all'altro o essere troncato, es. array grandi)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        data = np.ascontiguousarray(obj)
+        return {'ndarray': hashlib.sha256(data.tobytes()).hexdigest(),
+                'dtype': str(data.dtype), 'shape': list(data.shape)}
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    if isinstance(obj, os.PathLike):
+        return os.fspath(obj)
+    raise TypeError(f"argomento di tipo {type(obj).__name__} non utilizzabile come chiave di cache")
+
+
+def _digest(obj):
+    text = json.dumps(obj, sort_keys=True, default=_canonical, ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def code_version(*objects):
+    """Hash del sorgente di funzioni, moduli o file usati come versione del codice."""
+    h = hashlib.sha256()
+    for obj in objects:
+        if isinstance(obj, (str, os.PathLike)):
+            with open(obj, 'rb') as f:
+                h.update(f.read())
+        else:
+            h.update(inspect.getsource(obj).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def _is_main_guard(node):
+    return isinstance(node, ast.If) and ast.unparse(node.test) in ('__name__ == "__main__"',
+                                                                  "__name__ == '__main__'")
+
+
+def _local_imports(tree):
+    """File del progetto importati in un albero ast (anche dentro funzioni, non nel blocco __main__)."""
+    names = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        for child in ast.iter_child_nodes(node):
+            if _is_main_guard(child):
+                continue
+            if isinstance(child, ast.Import):
+                names.update(a.name.split('.')[0] for a in child.names)
+            elif isinstance(child, ast.ImportFrom) and child.module and not child.level:
+                names.add(child.module.split('.')[0])
+            stack.append(child)
+    return {p for p in (SRC_DIR / f'{n}.py' for n in names) if p.exists()}
+
+
+@functools.lru_cache(maxsize=None)
+def _file_imports(path):
+    return _local_imports(ast.parse(Path(path).read_bytes()))
+
+
+def _module_closure(paths):
+    seen = set()
+    stack = list(paths)
+    while stack:
+        path = stack.pop()
+        if path not in seen:
+            seen.add(path)
+            stack.extend(_file_imports(path))
+    return seen
+
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _local_path(obj):
+    module = obj if inspect.ismodule(obj) else inspect.getmodule(obj)
+    path = getattr(module, '__file__', None)
+    if path is None or Path(path).resolve().parent != SRC_DIR:
+        return None
+    return Path(path).resolve()
+
+
+def dependencies(fn):
+    """Oggetti e file il cui sorgente fa da versione del codice di `fn`.
+
+    Del modulo di `fn` entrano solo le funzioni e classi usate (un titolo cambiato
+    nello script non invalida la cache); degli altri moduli del progetto raggiunti,
+    il file intero e, in modo transitivo, quelli che importano.
+    """
+    own = _local_path(fn)
+    parts, files = {}, set()
+    stack = [fn]
+    while stack:
+        obj = inspect.unwrap(stack.pop())
+        if not (inspect.isfunction(obj) or inspect.isclass(obj)) or obj.__qualname__ in parts:
+            continue
+        parts[obj.__qualname__] = obj
+        files |= _local_imports(ast.parse(textwrap.dedent(inspect.getsource(obj))))
+        if inspect.isclass(obj):
+            members = list(vars(obj).values())
+        else:
+            members = [obj.__globals__[n] for n in _code_names(obj.__code__) if n in obj.__globals__]
+        for member in members:
+            path = _local_path(member) if inspect.ismodule(member) or callable(member) else None
+            if path is None:
+                continue
+            if path != own:
+                files.add(path)
+            elif not inspect.ismodule(member):
+                stack.append(member)
+    files = _module_closure(files) - {own}
+    return [parts[k] for k in sorted(parts)] + sorted(files)
+
+
+def cache_key(name, sources, params, version):
+    return _digest({
+        'name': name,
+        'sources': {s: source_hash(s) for s in sorted(sources)},
+        'params': params,
+        'version': version,
+    })
+
+
+# --- indice su disco con LRU per dimensione ---
+
+@contextmanager
+def _index_lock():
+    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_PATH, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_index():
+    if INDEX_PATH.exists():
+        return json.loads(INDEX_PATH.read_text())
+    return {}
+
+
+def _write_index(index):
+    tmp = INDEX_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    tmp.write_text(json.dumps(index, indent=1))
+    tmp.replace(INDEX_PATH)
+
+
+def _evict(index, max_bytes):
+    total = sum(e['bytes'] for e in index.values())
+    for key in sorted(index, key=lambda k: index[k]['atime']):
+        if total <= max_bytes:
+            break
+        total -= index[key]['bytes']
+        (DERIVED_DIR / index.pop(key)['file']).unlink(missing_ok=True)
+    # .pkl rimasti fuori dall'indice (scritture concorrenti prima del lock)
+    indexed = {e['file'] for e in index.values()}
+    for path in DERIVED_DIR.glob('*.pkl'):
+        if path.name not in indexed:
+            path.unlink(missing_ok=True)
+
+
+def get(key):
+    with _memory_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return True, _memory[key]
+    with _index_lock():
+        index = _read_index()
+        entry = index.get(key)
+        if entry is None or not (DERIVED_DIR / entry['file']).exists():
+            return False, None
+        with open(DERIVED_DIR / entry['file'], 'rb') as f:
+            value = pickle.load(f)
+        entry['atime'] = time.time()
+        _write_index(index)
+    _remember(key, value)
+    return True, value
+
+
+def put(key, value, name='', max_bytes=None):
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    path = DERIVED_DIR / f'{key}.pkl'
+    with _index_lock():
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_bytes(data)
+        tmp.replace(path)
+        index = _read_index()
+        index[key] = {'file': path.name, 'name': name, 'bytes': len(data), 'atime': time.time()}
+        _evict(index, MAX_BYTES if max_bytes is None else max_bytes)
+        _write_index(index)
+    _remember(key, value)
+
+
+def _freeze(value, seen=None):
+    """Rende di sola lettura gli array numpy di `value`, anche dentro dict,
+    liste, tuple e attributi di oggetti (es. RankIndex, FuelAttribution)."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return value
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        pass                    # copiati a ogni restituzione, vedi _shared
+    elif isinstance(value, dict):
+        for v in value.values():
+            _freeze(v, seen)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _freeze(v, seen)
+    elif hasattr(value, '__dict__') and not isinstance(value, type):
+        for v in vars(value).values():
+            _freeze(v, seen)
+    return value
+
+
+def _shared(value):
+    """Valore da restituire al chiamante: mai il DataFrame tenuto in memoria."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    return value
+
+
+def _remember(key, value):
+    _freeze(value)
+    with _memory_lock:
+        _memory[key] = value
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def clear():
+    with _memory_lock:
+        _memory.clear()
+    with _index_lock():
+        for path in DERIVED_DIR.glob('*'):
+            if path != LOCK_PATH:
+                path.unlink()
+
+
+def memoize(sources, version=None, depends=(), name=None):
+    """Decoratore: riusa il risultato finché sorgenti, argomenti e codice non cambiano.
+
+    La versione del codice è derivata da `dependencies(fn)`; `depends`: altri
+    moduli/file il cui sorgente deve entrarci (es. file non importati).
+    Il risultato è condiviso tra le chiamate: gli array numpy sono di sola
+    lettura, DataFrame e Series sono restituiti in copia.
+    """
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @functools.cache
+        def ver():
+            # calcolata alla prima chiamata: l'import dei moduli resta leggero
+            return version or code_version(*dependencies(fn), *depends)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = cache_key(label, sources, _bound(fn, args, kwargs), ver())
+            hit, value = get(key)
+            if hit:
+                return _shared(value)
+            value = fn(*args, **kwargs)
+            put(key, value, label)
+            return _shared(value)
+
+        return wrapper
+    return decorator
+
+
+def _bound(fn, args, kwargs):
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return bound.arguments
+
+
+if __name__ == '__main__':
+    index = _read_index()
+    total = sum(e['bytes'] for e in index.values())
+    print(f"{len(index)} voci, {total / 1e6:.1f} MB su {MAX_BYTES / 1e6:.0f} MB")
+    for key, e in sorted(index.items(), key=lambda kv: -kv[1]['atime']):
+        print(f"{e['name']:30} {e['bytes'] / 1e6:8.2f} MB  {key[:12]}")
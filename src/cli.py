@@ -0,0 +1,237 @@
+import argparse
+import importlib
+import sys
+import time
+
+# === RIGA DI COMANDO UNICA PER LE ANALISI ===
+# python src/cli.py <analisi> [--format table|json|csv] [--plot | --no-plot] [--import-times]
+# Le tabelle sono calcolate con i soli moduli condivisi (numpy/pandas): gli
+# script dei grafici importano in testa matplotlib, seaborn e scipy anche
+# quando serve solo la tabella a console. Qui si stampa solo la tabella
+# (--no-plot, predefinito) e le librerie grafiche non vengono mai importate;
+# con --plot sono caricate per rigenerare il grafico dello script (tramite
+# render_all, salvato in results/). --import-times riporta il costo di
+# import di ogni modulo caricato dal comando.
+
+_import_times = {}
+
+
+def lazy_import(name):
+    """Importa `name` alla prima richiesta e registra il tempo impiegato."""
+    if name in sys.modules:
+        return sys.modules[name]
+    t0 = time.perf_counter()
+    module = importlib.import_module(name)
+    _import_times[name] = time.perf_counter() - t0
+    return module
+
+
+# --- analisi: ognuna restituisce un DataFrame ---
+
+def debt_table(args):
+    np = lazy_import('numpy')
+    debt_engine = lazy_import('debt_engine')
+    hierarchy = lazy_import('hierarchy')
+
+    h = hierarchy.load_hierarchy()
+    debt = debt_engine.compute_debt(h.panel)
+    entities = args.entities or h.entities_at('country')
+    debt_engine.year_offset(debt.years, args.year)     # KeyError fuori dagli anni di taglio
+    # solo entità con dati nell'anno di taglio (esclude URSS, Jugoslavia, ...)
+    co2 = h.panel.get('co2', entities, (args.year, args.year))[:, 0]
+    entities = [e for e, v in zip(entities, co2) if not np.isnan(v)]
+    table = debt.at(args.year, entities)
+    out = table[['Entity', 'CO2_cumulative_Gt', 'Cum_per_capita_tons', 'Climate_Debt_Gt']]
+    out.columns = ['Paese', 'GtCO₂', 't pro capite', 'Debito Gt']
+    return out.head(args.top)
+
+
+def decoupling_table(args):
+    decoupling = lazy_import('decoupling')
+    table = decoupling.decoupling_table(first_year=args.first_year, last_year=args.last_year,
+                                        entities=args.entities)
+    cols = ['Rank', 'Entity', 'Last_year', 'CO2_Gt_last', 'GDP_CAGR_%', 'CO2_CAGR_%',
+            'Intensity_last', 'Intensity_reduction_%', 'Decoupling']
+    return table[cols].head(args.top)
+
+
+def fuel_table(args):
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+    hierarchy = lazy_import('hierarchy')
+    panel = lazy_import('panel')
+
+    h = hierarchy.load_hierarchy()
+    gt = {fuel: np.nansum(h.global_total(metric)) / 1e9 for fuel, metric in panel.FUEL_METRICS.items()}
+    out = pd.DataFrame({'Fonte': list(gt), 'GtCO₂': list(gt.values())})
+    out['%'] = out['GtCO₂'] / out['GtCO₂'].sum() * 100
+    return pd.concat([out, pd.DataFrame([{'Fonte': 'Totale', 'GtCO₂': out['GtCO₂'].sum(), '%': 100.0}])],
+                     ignore_index=True)
+
+
+def tcre_table(args):
+    pd = lazy_import('pandas')
+    tcre_engine = lazy_import('tcre_engine')
+
+    data = tcre_engine.tcre_data()
+    slope, intercept, r2 = tcre_engine.expanding_fit(data['Cumulative_GtCO2'], data['Temp_anomaly'])
+    last = data.iloc[-1]
+    row = {
+        'TCRE °C/GtCO₂': slope[-1], 'R²': r2[-1], 'Anno': int(last['Year']),
+        'Cumulata GtCO₂': last['Cumulative_GtCO2'], 'Anomalia °C': last['Temp_anomaly'],
+        'Budget 1.5°C GtCO₂': tcre_engine.remaining_budget(slope[-1], last['Temp_anomaly']),
+    }
+    if args.bootstrap:
+        samples = tcre_engine.bootstrap(data, n_rep=args.bootstrap)
+        row['Budget p2.5'], row['Budget p97.5'] = samples['budget_gt'].quantile([0.025, 0.975])
+    return pd.DataFrame([row])
+
+
+def inequality_table(args):
+    inequality = lazy_import('inequality')
+
+    table = inequality.compute_inequality().table(args.basis)
+    if args.years:
+        table = table[table['Year'].isin(args.years)]
+    return table.reset_index(drop=True)
+
+
+def window_table(args):
+    hierarchy = lazy_import('hierarchy')
+    range_index = lazy_import('range_index')
+
+    index = range_index.build_index()
+    entities = args.entities or hierarchy.load_hierarchy().entities_at('country')
+    table = index.query(args.metric, entities, args.start, args.end, missing=args.missing, per_capita=True)
+    table[args.metric] /= 1e9
+    table = table.rename(columns={args.metric: 'Gt', f'{args.metric}_per_capita': 't pro capite',
+                                  f'{args.metric}_years_observed': 'Anni con dati', 'Years': 'Anni'})
+    table = table.drop(columns=['Start', 'End'])
+    if not args.entities:
+        table = table.nlargest(args.top, 'Gt')
+    return table.reset_index(drop=True)
+
+
+def rank_table(args):
+    pd = lazy_import('pandas')
+    rank_index = lazy_import('rank_index')
+
+    index = rank_index.build_rank_index()
+    if not args.entities:
+        return index.top_by_year(args.measure, args.top, (args.start, args.end))
+    years = index.years[(index.years >= args.start) & (index.years <= args.end)]
+    ranks = index.ranks(args.measure, [[e] for e in args.entities], years[None, :])
+    table = pd.DataFrame({'Year': list(years) * len(args.entities),
+                          'Entity': [e for e in args.entities for _ in years],
+                          'Rank': ranks.ravel()})
+    return table[table['Rank'] != rank_index.NO_RANK].reset_index(drop=True)
+
+
+def trajectory_table(args):
+    pd = lazy_import('pandas')
+    scenarios = lazy_import('scenarios')
+
+    # stessi paesi, stesso anno per CO₂ e popolazione e stessa regola di trajectory.py
+    base = scenarios.baseline(args.entities or scenarios.TRAJECTORY_COUNTRIES)
+    per_capita = (base['co2'] / base['population']).to_numpy()
+    out = pd.DataFrame({'Paese': base.index, 'Anno': base['year'].to_numpy(),
+                        'CO₂ (Gt)': base['co2'].to_numpy() / 1e9, 'Per capita (t)': per_capita,
+                        'Riduzione annua %': scenarios.annual_reduction(per_capita, base['year'].to_numpy())})
+    out = out.sort_values('Per capita (t)', ascending=False, ignore_index=True)
+    return out.head(args.top)
+
+
+# analisi → (funzione, grafico di render_all o None, descrizione)
+ANALYSES = {
+    'debt': (debt_table, 'climate_debt', "emissioni cumulative e debito climatico per paese"),
+    'decoupling': (decoupling_table, 'decoupling', "decoupling PIL/CO₂ per tutte le entità Maddison"),
+    'fuel': (fuel_table, 'fuel', "responsabilità cumulativa per fonte"),
+    'inequality': (inequality_table, None, "Gini, Theil e quote top 10%/bottom 50% delle emissioni pro capite"),
+    'rank': (rank_table, None, "classifiche per anno (annuali, cumulate, pro capite, debito, quote per fonte)"),
+    'tcre': (tcre_table, 'tcre', "TCRE, R² e budget residuo per +1.5°C"),
+    'trajectory': (trajectory_table, 'trajectory', "riduzione annua necessaria al 2050"),
+    'window': (window_table, None, "emissioni cumulative tra due anni qualsiasi (indice a somme prefisse)"),
+}
+
+
+def emit(df, fmt, out=sys.stdout):
+    if fmt == 'json':
+        out.write(df.to_json(orient='records', force_ascii=False, indent=1) + '\n')
+    elif fmt == 'csv':
+        df.to_csv(out, index=False)
+    else:
+        out.write(df.to_string(index=False, float_format=lambda v: f'{v:,.4g}') + '\n')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Analisi delle emissioni storiche di CO₂ (tabelle e grafici).")
+    sub = parser.add_subparsers(dest='analysis', required=True)
+    for name, (_, _, help_text) in ANALYSES.items():
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('--format', choices=['table', 'json', 'csv'], default='table')
+        # i grafici sono quelli fissi degli script: non seguono --entities/--year/--top,
+        # quindi per default si stampa solo la tabella
+        p.add_argument('--plot', action=argparse.BooleanOptionalAction, default=False,
+                       help="rigenera anche il grafico dello script in results/ (fisso, ignora le "
+                            "opzioni); --no-plot: solo tabella (predefinito)")
+        p.add_argument('--import-times', action='store_true', help="tempo di import dei moduli caricati")
+        p.add_argument('--top', type=int, default=10)
+        p.add_argument('--entities', nargs='+', default=None)
+        if name == 'debt':
+            p.add_argument('--year', type=int, default=2023)
+        if name == 'decoupling':
+            p.add_argument('--first-year', type=int, default=1990)
+            p.add_argument('--last-year', type=int, default=2023)
+        if name == 'tcre':
+            p.add_argument('--bootstrap', type=int, default=0, help="repliche bootstrap per l'intervallo del budget")
+        if name == 'inequality':
+            p.add_argument('--basis', choices=['annual', 'cumulative'], default=None)
+            p.add_argument('--years', type=int, nargs='+', default=[1850, 1900, 1950, 2000, 2023])
+        if name == 'rank':
+            p.add_argument('--measure', default='co2',
+                           choices=['co2', 'cumulative', 'per_capita', 'debt', 'share_coal', 'share_oil',
+                                    'share_gas', 'share_cement', 'share_flaring', 'share_other_industry'])
+            p.add_argument('--start', type=int, default=2023)
+            p.add_argument('--end', type=int, default=2023)
+        if name == 'trajectory':
+            p.set_defaults(top=15)
+        if name == 'window':
+            p.add_argument('--metric', default='co2',
+                           choices=['co2', 'ghg', 'coal', 'oil', 'gas', 'cement', 'flaring', 'other_industry'])
+            p.add_argument('--start', type=int, default=1850)
+            p.add_argument('--end', type=int, default=2023)
+            # 'observed' per default: con 'strict' i paesi con un buco nella finestra
+            # (Cina, India, Russia, ...) diventerebbero NaN e sparirebbero dalla classifica
+            p.add_argument('--missing', choices=['strict', 'observed', 'raise'], default='observed',
+                           help="anni mancanti nella finestra: somma dei soli anni presenti (con "
+                                "'Anni con dati'), NaN, errore")
+    return parser
+
+
+def main(argv=None):
+    t0 = time.perf_counter()
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    fn, figure, _ = ANALYSES[args.analysis]
+    try:
+        table = fn(args)
+    except KeyError as e:
+        parser.error(f"entità, metrica o anno non validi: {e}")
+    emit(table, args.format)
+
+    if args.plot and figure is not None:
+        render_all = lazy_import('render_all')
+        r = render_all.render_all([figure], jobs=1)[0]
+        print(f"Grafico: {', '.join(r['files'])}" + (' (invariato)' if r['cached'] else ''), file=sys.stderr)
+
+    if args.import_times:
+        heavy = [m for m in ('matplotlib', 'seaborn', 'scipy') if m in sys.modules]
+        print(f"\n{'Modulo':20} {'import (ms)':>12}", file=sys.stderr)
+        for name, secs in sorted(_import_times.items(), key=lambda kv: -kv[1]):
+            print(f"{name:20} {secs * 1e3:12.1f}", file=sys.stderr)
+        print(f"Librerie grafiche/statistiche caricate: {', '.join(heavy) or 'nessuna'}", file=sys.stderr)
+        print(f"Tempo totale del comando: {(time.perf_counter() - t0) * 1e3:.0f} ms", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,10 +3,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# === CARICAMENTO DATI ===
-co2 = pd.read_csv("annual-co2-emissions-per-country.csv")
-pop = pd.read_csv("population.csv")
-pop = pop.rename(columns={'Population (historical)': 'Population'})
+import panel
+from cache import memoize
+from instrument import begin
 
 # Solo paesi singoli (no World, no European Union)
 entities = [
@@ -16,28 +15,40 @@ entities = [
     'Mexico', 'South Africa', 'Turkey', 'Iran', 'Poland'
 ]
 
-df = co2[co2['Entity'].isin(entities)].copy()
-df = df.rename(columns={'Annual CO₂ emissions': 'CO2_tons'})
-df = df.merge(pop[['Entity', 'Year', 'Population']], on=['Entity', 'Year'], how='left')
+# === CARICAMENTO DATI E CUMULATE (in cache finché dati e calcolo non cambiano) ===
+@memoize(sources=panel.SOURCES)
+def cumulative_debt(entities, last_year=2023):
+    data = panel.load_panel()
+    df = (data.select('co2', 'population')
+          .where(entities=entities, years=(None, last_year))
+          .dropna('co2')
+          .rename(co2='CO2_tons', population='Population')
+          .collect())
 
-# === EMISSIONI CUMULATIVE 1850–2023 ===
-cumulative = df[df['Year'] <= 2023].groupby('Entity')['CO2_tons'].sum().reset_index()
-cumulative['CO2_cumulative_Gt'] = cumulative['CO2_tons'] / 1e9
-cumulative = cumulative.sort_values('CO2_cumulative_Gt', ascending=False)
+    # === EMISSIONI CUMULATIVE 1850–2023 ===
+    cumulative = df.groupby('Entity')['CO2_tons'].sum().reset_index()
+    cumulative['CO2_cumulative_Gt'] = cumulative['CO2_tons'] / 1e9
+    cumulative = cumulative.sort_values('CO2_cumulative_Gt', ascending=False)
 
-# Popolazione 2023
-pop_2023 = df[df['Year'] == 2023][['Entity', 'Population']].dropna()
-cumulative = cumulative.merge(pop_2023, on='Entity', how='left')
+    # Popolazione 2023
+    pop_2023 = df[df['Year'] == last_year][['Entity', 'Population']].dropna()
+    cumulative = cumulative.merge(pop_2023, on='Entity', how='left')
 
-# Debito climatico
-world_cum_tons = co2[co2['Entity'] == 'World']['Annual CO₂ emissions'].sum()
-world_pop_2023 = pop[pop['Entity'] == 'World'].sort_values('Year').iloc[-1]['Population']
-world_per_capita_cum = world_cum_tons / world_pop_2023
+    # Debito climatico
+    world_cum_tons = np.nansum(data.series('co2', 'World'))
+    world_pop_2023 = data.last_valid('population', 'World')[1]
+    world_per_capita_cum = world_cum_tons / world_pop_2023
 
-cumulative['Cum_per_capita_tons'] = cumulative['CO2_tons'] / cumulative['Population']
-cumulative['Climate_Debt_Gt'] = ((cumulative['Cum_per_capita_tons'] - world_per_capita_cum) * cumulative['Population']) / 1e9
+    cumulative['Cum_per_capita_tons'] = cumulative['CO2_tons'] / cumulative['Population']
+    cumulative['Climate_Debt_Gt'] = ((cumulative['Cum_per_capita_tons'] - world_per_capita_cum) * cumulative['Population']) / 1e9
+    return cumulative
+
+
+begin('compute')
+cumulative = cumulative_debt(entities)
 
 # === GRAFICO FINALE CON COLORI PERSONALIZZATI ===
+begin('plot')
 plt.figure(figsize=(21, 10))
 
 # --- 1. GRAFICO A TORTA con colori belli e distinti ---
@@ -108,6 +119,7 @@ plt.tight_layout()
 plt.show()
 
 # === TABELLA TOP 10 ===
+begin('report')
 print("\nTOP 10 PAESI PER EMISSIONI CUMULATIVE (1850–2023)")
 print("="*80)
 top10_table = cumulative.head(10)[['Entity', 'CO2_cumulative_Gt']].round(1)
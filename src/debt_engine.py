@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from panel import load_panel
+
+# === DEBITO CLIMATICO PER TUTTE LE ENTITÀ E TUTTI GLI ANNI DI TAGLIO ===
+# Un solo passaggio di somme cumulative sulla matrice entità × anno:
+#   cumulata[e, t]  = emissioni dal primo anno disponibile fino a t
+#   baseline[t]     = cumulata[World, t] / popolazione[World, t]
+#   debito[e, t]    = cumulata[e, t] - baseline[t] * popolazione[e, t]
+# (stessa formula di climate_debt.py, dove t era fissato al 2023)
+
+FIRST_CUTOFF = 1900
+POP_FFILL_YEARS = 1     # population.csv si ferma un anno prima delle emissioni
+
+
+def _ffill(arr, limit=None):
+    # Ultimo valore disponibile lungo gli anni, al più `limit` anni dopo l'ultimo
+    # dato (None = senza limite); vettoriale, senza cicli sulle entità
+    pos = np.arange(arr.shape[1])
+    idx = np.where(~np.isnan(arr), pos, 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    out = arr[np.arange(arr.shape[0])[:, None], idx]
+    if limit is not None:
+        out[pos - idx > limit] = np.nan
+    return out
+
+
+def year_offset(years, year):
+    """Posizione di `year` nella griglia `years` (consecutivi); KeyError se fuori."""
+    t = int(year) - int(years[0])
+    if not 0 <= t < len(years):
+        raise KeyError(f"anno {year} fuori dall'intervallo {years[0]}–{years[-1]}")
+    return t
+
+
+class DebtTable:
+
+    def __init__(self, entities, years, cumulative, population, baseline):
+        self.entities = entities
+        self.entity_id = {e: i for i, e in enumerate(entities)}
+        self.years = years
+        self.cumulative = cumulative    # t CO₂, entità × anno di taglio
+        self.population = population    # persone, entità × anno di taglio
+        self.baseline = baseline        # t CO₂ per persona, un valore per anno
+        self.debt = cumulative - baseline[None, :] * population   # t CO₂
+
+    def baseline_series(self):
+        return pd.Series(self.baseline, index=pd.Index(self.years, name='Year'),
+                         name='World_cum_per_capita_tons')
+
+    def at(self, year, entities=None):
+        """Tabella come `cumulative` in climate_debt.py per un anno di taglio."""
+        t = year_offset(self.years, year)
+        ids = (np.arange(len(self.entities)) if entities is None
+               else np.array([self.entity_id[e] for e in entities], dtype=np.intp))
+        out = pd.DataFrame({
+            'Entity': np.array(self.entities, dtype=object)[ids],
+            'CO2_tons': self.cumulative[ids, t],
+            'Population': self.population[ids, t],
+        })
+        out['CO2_cumulative_Gt'] = out['CO2_tons'] / 1e9
+        out['Cum_per_capita_tons'] = out['CO2_tons'] / out['Population']
+        out['Climate_Debt_Gt'] = self.debt[ids, t] / 1e9
+        out = out.dropna(subset=['CO2_tons'])
+        return out.sort_values('CO2_cumulative_Gt', ascending=False).reset_index(drop=True)
+
+    def to_frame(self):
+        """Tabella lunga Entity × anno di taglio (per animazioni e verifiche)."""
+        n_e, n_y = self.cumulative.shape
+        out = pd.DataFrame({
+            'Entity': np.repeat(np.array(self.entities, dtype=object), n_y),
+            'Year': np.tile(self.years, n_e),
+            'CO2_cumulative_Gt': self.cumulative.ravel() / 1e9,
+            'Population': self.population.ravel(),
+            'Climate_Debt_Gt': self.debt.ravel() / 1e9,
+        })
+        return out.dropna(subset=['CO2_cumulative_Gt']).reset_index(drop=True)
+
+
+def compute_debt(panel=None, first_cutoff=FIRST_CUTOFF, last_cutoff=None, world='World'):
+    panel = load_panel() if panel is None else panel
+    co2 = panel.metrics['co2']
+    pop = _ffill(panel.metrics['population'], limit=POP_FFILL_YEARS)
+
+    # Cumulata su tutta la serie: NaN finché l'entità non ha ancora dati
+    cum = np.nancumsum(co2, axis=1)
+    started = np.logical_or.accumulate(~np.isnan(co2), axis=1)
+    cum[~started] = np.nan
+
+    w = panel.entity_id[world]
+    baseline = cum[w] / pop[w]
+
+    # gli anni di taglio si fermano all'ultimo anno con emissioni osservate
+    # (il pannello arriva più avanti per la serie delle temperature)
+    last_observed = int(panel.years[np.flatnonzero((~np.isnan(co2)).any(axis=0))[-1]])
+    last_cutoff = last_observed if last_cutoff is None else min(int(last_cutoff), last_observed)
+    ys = panel.year_slice((first_cutoff, last_cutoff))
+    return DebtTable(panel.entities, panel.years[ys], cum[:, ys], pop[:, ys], baseline[ys])
+
+
+if __name__ == '__main__':
+    table = compute_debt()
+    print(table.baseline_series().tail())
+    print(table.at(2023).head(10)[['Entity', 'CO2_cumulative_Gt', 'Climate_Debt_Gt']].round(1).to_string(index=False))
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from cache import memoize
+from panel import SOURCES, load_panel
+
+# === DECOUPLING PER TUTTE LE ENTITÀ DEL DATASET MADDISON ===
+# Calcolo vettoriale sulle righe contigue del pannello (una riga = un'entità):
+# nessun ciclo per entità e nessuna nuova scansione della tabella completa.
+#   - primo/ultimo anno con CO₂, popolazione e PIL tutti presenti
+#   - CAGR di PIL totale e CO₂, trend log-lineare (OLS) di entrambi
+#   - intensità carbonica (kg CO₂ per $1000 di PIL 2011) e sua riduzione
+#   - classificazione: disaccoppiamento assoluto / relativo / accoppiato
+
+FIRST_YEAR = 1990
+LAST_YEAR = 2023
+MIN_YEARS = 5
+# Buchi di PIL/popolazione fino a MAX_GAP anni stimati (log-lineare) invece di
+# togliere l'anno; gli anni stimati sono segnati nelle colonne *_filled
+MAX_GAP = 5
+
+
+def _masked_trend(y, mask, t):
+    # pendenza OLS di log(y) su t per riga, usando solo le celle valide
+    w = mask.astype(float)
+    ly = np.where(mask, np.log(np.where(mask & (y > 0), y, 1.0)), 0.0)
+    n = w.sum(1)
+    st, sy = (w * t).sum(1), (w * ly).sum(1)
+    stt, sty = (w * t * t).sum(1), (w * t * ly).sum(1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (sty - st * sy / n) / (stt - st * st / n)
+
+
+def classify(gdp_cagr, co2_cagr):
+    return np.select(
+        [gdp_cagr <= 0, co2_cagr < 0, co2_cagr < gdp_cagr],
+        ['recessione', 'assoluto', 'relativo'],
+        default='accoppiato')
+
+
+@memoize(sources=SOURCES)
+def decoupling_frame(entities, first_year=FIRST_YEAR, last_year=LAST_YEAR):
+    """Tabella lunga Entity/Year dei grafici di decoupling (emissions_country.py,
+    less_emissions.py): PIL totale, CO₂ e intensità carbonica anno per anno."""
+    df = (load_panel()
+          .select('co2', 'population', 'gdp_per_capita')
+          .where(entities=entities, years=(first_year, last_year))
+          .fill('gdp_per_capita', 'population', method='loglinear', max_gap=MAX_GAP)
+          .dropna()
+          .rename(co2='CO2_t', population='Population', gdp_per_capita='GDP_per_capita')
+          .collect())
+
+    df['GDP_total_USD'] = df['GDP_per_capita'] * df['Population']     # USD 2011 totali
+    df['GDP_billion_USD'] = df['GDP_total_USD'] / 1e9
+    df['CO2_Gt'] = df['CO2_t'] / 1e9
+    # kg CO₂ per $1000, come in decoupling_table
+    df['Carbon_Intensity'] = df['CO2_t'] * 1e6 / df['GDP_total_USD']
+    return df
+
+
+def decoupling_table(panel=None, first_year=FIRST_YEAR, last_year=LAST_YEAR,
+                     entities=None, min_years=MIN_YEARS):
+    """Tabella ordinata per divario di crescita PIL − CO₂ (decoupling più forte in cima)."""
+    panel = load_panel() if panel is None else panel
+    ys = panel.year_slice((first_year, last_year))
+    years = panel.years[ys].astype(float)
+
+    gdp_pc = panel.get('gdp_per_capita', entities, (first_year, last_year))
+    has_gdp = ~np.isnan(gdp_pc).all(1)
+    ids = panel.ids(entities)[has_gdp]
+    gdp = gdp_pc[has_gdp] * panel.metrics['population'][ids][:, ys]
+    co2 = panel.metrics['co2'][ids][:, ys]
+
+    valid = ~np.isnan(gdp) & ~np.isnan(co2) & (gdp > 0)
+    count = valid.sum(1)
+    keep = count >= min_years
+    ids, gdp, co2, valid, count = ids[keep], gdp[keep], co2[keep], valid[keep], count[keep]
+
+    rows = np.arange(len(ids))
+    first = valid.argmax(1)
+    last = valid.shape[1] - 1 - valid[:, ::-1].argmax(1)
+    span = years[last] - years[first]
+
+    gdp0, gdp1 = gdp[rows, first], gdp[rows, last]
+    co20, co21 = co2[rows, first], co2[rows, last]
+    # kg CO₂ per $1000: t × 1000 kg / ($ / 1000)
+    int0, int1 = co20 * 1e6 / gdp0, co21 * 1e6 / gdp1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gdp_cagr = (gdp1 / gdp0) ** (1 / span) - 1
+        co2_cagr = (co21 / co20) ** (1 / span) - 1
+        reduction = (1 - int1 / int0) * 100
+
+    t = years[None, :] - years.mean()
+    out = pd.DataFrame({
+        'Entity': np.array(panel.entities, dtype=object)[ids],
+        'First_year': years[first].astype(int),
+        'Last_year': years[last].astype(int),
+        'CO2_Gt_last': co21 / 1e9,
+        'GDP_billion_USD_last': gdp1 / 1e9,
+        'GDP_CAGR_%': gdp_cagr * 100,
+        'CO2_CAGR_%': co2_cagr * 100,
+        'GDP_trend_%': np.expm1(_masked_trend(gdp, valid, t)) * 100,
+        'CO2_trend_%': np.expm1(_masked_trend(co2, valid, t)) * 100,
+        'Intensity_first': int0,
+        'Intensity_last': int1,
+        'Intensity_reduction_%': reduction,
+        'Decoupling': classify(gdp_cagr, co2_cagr),
+    })
+    out['Gap_pp'] = out['GDP_CAGR_%'] - out['CO2_CAGR_%']
+    out = out.sort_values('Gap_pp', ascending=False, ignore_index=True)
+    out.insert(0, 'Rank', np.arange(1, len(out) + 1))
+    return out
+
+
+if __name__ == '__main__':
+    table = decoupling_table()
+    print(f"DECOUPLING {FIRST_YEAR}–{LAST_YEAR}: {len(table)} entità")
+    print(table['Decoupling'].value_counts().to_string())
+    cols = ['Rank', 'Entity', 'Last_year', 'GDP_CAGR_%', 'CO2_CAGR_%', 'Intensity_reduction_%', 'Decoupling']
+    print(table[cols].head(20).round(2).to_string(index=False))
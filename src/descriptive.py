@@ -0,0 +1,151 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import hierarchy
+import manifest
+from cache import memoize
+from owid_store import read_filtered
+
+# === STATISTICHE DESCRITTIVE PER ENTITÀ E DECENNIO ===
+# Al posto di describe() sull'intero file (paesi e aggregati mescolati), per
+# ogni dataset, entità, decennio e variabile:
+#   count, mean, std, min, p25, median, p75, max, primo/ultimo anno e valore,
+#   CAGR tra il primo e l'ultimo valore del decennio,
+#   crescita annua media e volatilità (deviazione standard della crescita annua).
+# Ogni file è letto con tipi compatti (category / int16 / float32) e aggregato
+# con un solo raggruppamento (Variable, Entity, Decade); i file sono elaborati
+# in parallelo. Il livello dell'entità (country, continent, aggregate, world)
+# permette di non confondere paesi e aggregati.
+
+# titolo nei grafici → file
+DATASETS = {
+    "CO₂ per fonte/settore": "co2-by-source.csv",
+    "CO₂ per combustibile": "co2-emissions-by-fuel-line.csv",
+    "GHG totali (incl. LULUCF)": "total-ghg-emissions.csv",
+    "CO₂ per capita": "co2-emissions-per-capita.csv",
+    "CO₂ per regione": "annual-co-emissions-by-region.csv",
+    "CO₂ per paese": "annual-co2-emissions-per-country.csv",
+    "Anomalia termica globale": "temperature-anomaly.csv",
+}
+STATS = ['count', 'mean', 'std', 'min', 'p25', 'median', 'p75', 'max',
+         'first_year', 'last_year', 'first', 'last', 'cagr', 'mean_growth', 'volatility']
+
+
+def entity_decade_stats(name, levels=None):
+    """Statistiche per (Variable, Entity, Decade) di un file di data/."""
+    df = read_filtered(name)
+    values = [c for c in df.columns if c not in ('Entity', 'Code', 'Year')]
+    long = df.melt(id_vars=['Entity', 'Year'], value_vars=values,
+                   var_name='Variable', value_name='Value').dropna(subset=['Value'])
+    long = long.sort_values(['Variable', 'Entity', 'Year'], kind='stable', ignore_index=True)
+
+    # crescita annua solo tra anni consecutivi della stessa serie
+    var = long['Variable'].astype('category').cat.codes.to_numpy()
+    ent = long['Entity'].cat.codes.to_numpy()
+    year = long['Year'].to_numpy()
+    value = long['Value'].to_numpy(dtype=float)
+    prev = np.r_[np.nan, value[:-1]]
+    same = np.r_[False, (var[1:] == var[:-1]) & (ent[1:] == ent[:-1]) & (np.diff(year) == 1)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        long['Growth'] = np.where(same & (prev > 0), value / prev - 1, np.nan)
+    long['Decade'] = (year // 10 * 10).astype('int16')
+
+    g = long.groupby(['Variable', 'Entity', 'Decade'], observed=True, sort=False)
+    out = g['Value'].agg(['count', 'mean', 'std', 'min', 'median', 'max', 'first', 'last'])
+    quant = g['Value'].quantile([0.25, 0.75]).unstack()
+    out['p25'], out['p75'] = quant[0.25], quant[0.75]
+    out['first_year'] = g['Year'].min()
+    out['last_year'] = g['Year'].max()
+    out['mean_growth'] = g['Growth'].mean()
+    out['volatility'] = g['Growth'].std()
+    span = (out['last_year'] - out['first_year']).to_numpy(dtype=float)
+    first, last = out['first'].to_numpy(dtype=float), out['last'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['cagr'] = np.where((span > 0) & (first > 0) & (last > 0), (last / first) ** (1 / span) - 1, np.nan)
+
+    out = out.reset_index()
+    out.insert(0, 'Dataset', name)
+    levels = levels or {}
+    codes = df.drop_duplicates('Entity').set_index('Entity')['Code'] if 'Code' in df.columns else {}
+    out.insert(3, 'Level', [levels.get(e) or hierarchy.entity_level(e, codes.get(e))
+                            for e in out['Entity']])
+
+    # tipi compatti
+    for c in ('Dataset', 'Variable', 'Entity', 'Level'):
+        out[c] = out[c].astype('category')
+    for c in ('count', 'first_year', 'last_year'):
+        out[c] = out[c].astype('int16')
+    for c in STATS:
+        if out[c].dtype == 'float64':
+            out[c] = out[c].astype('float32')
+    return out[['Dataset', 'Variable', 'Entity', 'Level', 'Decade'] + STATS]
+
+
+def _levels():
+    h = hierarchy.load_hierarchy()
+    return dict(zip(h.panel.entities, h.level))
+
+
+def _concat(frames):
+    out = {}
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            out[col] = union_categoricals([f[col] for f in frames])
+        else:
+            out[col] = np.concatenate([f[col].to_numpy() for f in frames])
+    return pd.DataFrame(out)
+
+
+def _alias_stats(stats, name, columns):
+    """Statistiche di un file duplicato, ricavate da quelle del file di riferimento."""
+    out = stats[stats['Variable'].isin(columns)].reset_index(drop=True)
+    out['Dataset'] = pd.Categorical([name] * len(out))
+    return out
+
+
+@memoize(sources=list(DATASETS.values()))
+def stats_table(files=tuple(DATASETS.values()), jobs=None):
+    """Tabella unica delle statistiche di tutti i file (calcolati in parallelo).
+
+    I file che il manifest riconosce come duplicati non sono riletti: le loro
+    righe sono copiate da quelle del file di riferimento.
+    """
+    m = manifest.get_manifest()
+    aliases = m['aliases']
+    sources = list(dict.fromkeys(aliases[f]['source'] if f in aliases else f for f in files))
+    levels = _levels()
+    workers = jobs or min(len(sources), os.cpu_count())
+    if workers == 1:
+        frames = [entity_decade_stats(f, levels) for f in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(entity_decade_stats, sources, [levels] * len(sources)))
+    computed = dict(zip(sources, frames))
+    return _concat([computed[f] if f not in aliases else
+                    _alias_stats(computed[aliases[f]['source']], f, m['files'][f]['value_columns'])
+                    for f in files])
+
+
+def decade_summary(table, dataset, variable=None, entity='World', since=None):
+    """Righe di un'entità per decennio (di default la prima variabile del file)."""
+    sub = table[table['Dataset'] == DATASETS.get(dataset, dataset)]
+    variable = variable or sub['Variable'].iloc[0]
+    sub = sub[(sub['Variable'] == variable) & (sub['Entity'] == entity)]
+    if since is not None:
+        sub = sub[sub['Decade'] >= since]
+    return sub.sort_values('Decade').reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    import time
+    t0 = time.perf_counter()
+    table = stats_table.__wrapped__()
+    print(f"{len(table)} righe (file × variabile × entità × decennio) in {time.perf_counter() - t0:.2f} s, "
+          f"{table.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+    print(table.groupby(['Dataset', 'Level'], observed=True).size().unstack(fill_value=0).to_string())
+    cols = ['Decade', 'mean', 'p25', 'median', 'p75', 'cagr', 'volatility']
+    print(decade_summary(table, 'CO₂ per paese', since=1950)[cols].to_string(index=False))
@@ -1,10 +1,12 @@
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# Caricamento e preparazione (come prima)
-df = pd.read_csv("co2-by-source.csv")
+import hierarchy
+import panel
+from cache import memoize
+from fuel_attribution import compute_attribution
+from instrument import begin
 
 fuel_cols = {
     'Coal': 'Annual CO₂ emissions from coal',
@@ -15,19 +17,30 @@ fuel_cols = {
     'Other industry': 'Annual CO₂ emissions from other industry'
 }
 
-# Globale annuale
-global_annual = df.groupby('Year')[list(fuel_cols.values())].sum().reset_index()
+# Caricamento e preparazione (come prima), in cache finché il CSV non cambia
+@memoize(sources=panel.SOURCES)
+def cumulative_by_fuel(fuel_cols):
+    # Globale annuale: riga World della gerarchia, senza sommare paesi e aggregati
+    h = hierarchy.load_hierarchy()
+    global_annual = pd.DataFrame({col: h.global_series(panel.FUEL_METRICS[fuel])
+                                  for fuel, col in fuel_cols.items()})
+    global_annual = global_annual.dropna(how='all').fillna(0).reset_index()
 
-# Convertiamo in GtCO₂
-for fuel, col in fuel_cols.items():
-    global_annual[fuel + '_Gt'] = global_annual[col] / 1e9
+    # Convertiamo in GtCO₂
+    for fuel, col in fuel_cols.items():
+        global_annual[fuel + '_Gt'] = global_annual[col] / 1e9
 
-# Cumulative
-cum_cols = [c for c in global_annual.columns if '_Gt' in c]
-for col in cum_cols:
-    global_annual[col] = global_annual[col.replace('_Gt', '') + '_Gt'].cumsum()
+    # Cumulative
+    cum_cols = [c for c in global_annual.columns if '_Gt' in c]
+    for col in cum_cols:
+        global_annual[col] = global_annual[col.replace('_Gt', '') + '_Gt'].cumsum()
 
-global_annual['Cumulative_Total_Gt'] = global_annual[cum_cols].sum(axis=1)
+    global_annual['Cumulative_Total_Gt'] = global_annual[cum_cols].sum(axis=1)
+    return global_annual
+
+
+begin('compute')
+global_annual = cumulative_by_fuel(fuel_cols)
 
 # Calcolo percentuali cumulative finali
 latest = global_annual.iloc[-1]
@@ -40,6 +53,7 @@ for fuel in fuel_cols.keys():
     percentuali[fuel] = (gt, perc)
 
 # === GRAFICO CON PERCENTUALI NELLA LEGENDA ===
+begin('plot')
 plt.figure(figsize=(16, 9))
 
 years = global_annual['Year']
@@ -83,8 +97,21 @@ plt.tight_layout()
 plt.show()
 
 # Stampa pulita a console
+begin('report')
 print("RESPONSABILITÀ CUMULATIVA 1850–2024")
 print("-" * 50)
 for fuel, (gt, perc) in percentuali.items():
     print(f"{fuel:15}: {gt:6.0f} GtCO₂ → {perc:5.1f}%")
 print(f"{'Totale':15}: {total_2024:.0f} GtCO₂ → 100.0%")
+
+# Stessa ripartizione per i maggiori emettitori, con la fonte dominante
+attribution = compute_attribution()
+countries = hierarchy.load_hierarchy().entities_at('country')
+top = attribution.at(last_year, countries).head(10)
+since = attribution.dominance(top['Entity'])
+print(f"\nMAGGIORI EMETTITORI: QUOTE CUMULATIVE AL {last_year}")
+print("-" * 50)
+for _, row in top.iterrows():
+    shares = ' '.join(f"{fuel} {row[fuel + '_%']:4.1f}%" for fuel in ('Coal', 'Oil', 'Gas'))
+    print(f"{row['Entity']:15}: {row['Total_Gt']:5.0f} Gt | {shares} | "
+          f"dominante: {row['Dominant']} (dal {since.loc[row['Entity'], row['Dominant']]})")
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+import panel
+from cache import memoize
+from debt_engine import year_offset
+from panel import FUEL_METRICS, load_panel
+
+# === ATTRIBUZIONE CUMULATIVA PER FONTE, ENTITÀ E ANNO ===
+# Le sei serie per fonte del pannello sono copiate una volta in un unico array
+# entità × anno × fonte; sullo stesso array, senza altre copie:
+#   - i buchi (NaN) diventano 0 in place e la somma cumulativa lungo gli anni
+#     è fatta con out= sull'array stesso
+#   - la maschera "dati presenti" (bool) diventa in place "serie iniziata", così
+#     una fonte resta NaN finché l'entità non ha il primo dato (es. flaring)
+# Restano disponibili per ogni entità e anno: tonnellate cumulate per fonte,
+# totale, quota di ogni fonte, fonte con la cumulata maggiore e, per ogni
+# fonte, il primo anno in cui è diventata dominante. Il risultato è in cache
+# (cache.py): le interrogazioni non rifanno il calcolo.
+
+FUELS = list(FUEL_METRICS)
+
+
+class FuelAttribution:
+
+    def __init__(self, entities, years, fuels, cumulative, total, leader, dominant_since):
+        self.entities = entities
+        self.entity_id = {e: i for i, e in enumerate(entities)}
+        self.years = years
+        self.year0 = int(years[0])
+        self.fuels = fuels
+        self.fuel_id = {f: i for i, f in enumerate(fuels)}
+        self.cumulative = cumulative            # t CO₂, entità × anno × fonte (NaN prima dell'inizio)
+        self.total = total                      # t CO₂, entità × anno
+        self.leader = leader                    # indice della fonte dominante, -1 se nessuna
+        self.dominant_since = dominant_since    # entità × fonte: primo anno da dominante, -1 se mai
+
+    def __repr__(self):
+        return (f"FuelAttribution({len(self.entities)} entità × {len(self.years)} anni "
+                f"× {len(self.fuels)} fonti)")
+
+    def _ids(self, entities):
+        if entities is None:
+            return np.arange(len(self.entities))
+        if isinstance(entities, str):
+            entities = [entities]
+        return np.array([self.entity_id[e] for e in entities], dtype=np.intp)
+
+    def shares(self, year, entities=None):
+        """Quote (0–1) per fonte nell'anno indicato, entità × fonte."""
+        ids, t = self._ids(entities), year_offset(self.years, year)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.cumulative[ids, t] / self.total[ids, t, None]
+
+    def share(self, entity, fuel, year):
+        t = year_offset(self.years, year)
+        i = self.entity_id[entity]
+        return self.cumulative[i, t, self.fuel_id[fuel]] / self.total[i, t]
+
+    def at(self, year, entities=None):
+        """Tabella per entità: cumulata (Gt) e quota (%) di ogni fonte a fine `year`."""
+        ids, t = self._ids(entities), year_offset(self.years, year)
+        out = pd.DataFrame({'Entity': np.array(self.entities, dtype=object)[ids],
+                            'Total_Gt': self.total[ids, t] / 1e9})
+        shares = self.shares(year, entities)
+        for j, fuel in enumerate(self.fuels):
+            out[f'{fuel}_Gt'] = self.cumulative[ids, t, j] / 1e9
+        for j, fuel in enumerate(self.fuels):
+            out[f'{fuel}_%'] = shares[:, j] * 100
+        lead = self.leader[ids, t]
+        out['Dominant'] = np.where(lead >= 0, np.array(self.fuels, dtype=object)[lead], None)
+        out = out[out['Total_Gt'] > 0]
+        return out.sort_values('Total_Gt', ascending=False).reset_index(drop=True)
+
+    def series(self, entity):
+        """Serie annuale di un'entità: cumulate (Gt), quote (%) e fonte dominante."""
+        i = self.entity_id[entity]
+        out = pd.DataFrame(self.cumulative[i] / 1e9, columns=[f'{f}_Gt' for f in self.fuels],
+                           index=pd.Index(self.years, name='Year'))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares = self.cumulative[i] / self.total[i, :, None] * 100
+        for j, fuel in enumerate(self.fuels):
+            out[f'{fuel}_%'] = shares[:, j]
+        out['Total_Gt'] = self.total[i] / 1e9
+        lead = self.leader[i]
+        out['Dominant'] = np.where(lead >= 0, np.array(self.fuels, dtype=object)[lead], None)
+        return out[out['Total_Gt'] > 0]
+
+    def dominance(self, entities=None):
+        """Per ogni entità, primo anno in cui ciascuna fonte è stata dominante (NA se mai)."""
+        ids = self._ids(entities)
+        out = pd.DataFrame(self.dominant_since[ids], columns=self.fuels,
+                           index=pd.Index(np.array(self.entities, dtype=object)[ids], name='Entity'))
+        return out.where(out >= 0).astype('Int16')
+
+    def to_frame(self):
+        """Tabella lunga Entity × Year × Fuel con cumulata e quota."""
+        n_e, n_y, n_f = self.cumulative.shape
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares = self.cumulative / self.total[:, :, None]
+        out = pd.DataFrame({
+            'Entity': np.repeat(np.array(self.entities, dtype=object), n_y * n_f),
+            'Year': np.tile(np.repeat(self.years, n_f), n_e),
+            'Fuel': np.tile(np.array(self.fuels, dtype=object), n_e * n_y),
+            'Cumulative_Gt': self.cumulative.ravel() / 1e9,
+            'Share': shares.ravel(),
+        })
+        return out.dropna(subset=['Cumulative_Gt']).reset_index(drop=True)
+
+
+@memoize(sources=panel.SOURCES)
+def compute_attribution(fuels=tuple(FUELS)):
+    p = load_panel()
+    n_e, n_y = len(p.entities), len(p.years)
+
+    # unica copia: entità × anno × fonte
+    cum = np.empty((n_e, n_y, len(fuels)))
+    for j, fuel in enumerate(fuels):
+        cum[:, :, j] = p.metrics[FUEL_METRICS[fuel]]
+    started = ~np.isnan(cum)
+    cum[~started] = 0.0
+    np.cumsum(cum, axis=1, out=cum)
+    np.logical_or.accumulate(started, axis=1, out=started)
+    total = cum.sum(axis=2)
+    any_started = started.any(axis=2)
+    cum[~started] = np.nan
+    total[~any_started] = np.nan
+
+    # fonte dominante: quella con la cumulata maggiore (solo dove il totale è > 0)
+    leader = np.argmax(np.where(started, cum, -np.inf), axis=2).astype(np.int8)
+    leader[~(total > 0)] = -1
+    hit = leader[:, :, None] == np.arange(len(fuels), dtype=np.int8)
+    first = hit.argmax(axis=1)
+    dominant_since = np.where(hit.any(axis=1), p.years[first], -1).astype(np.int16)
+
+    return FuelAttribution(p.entities, p.years, list(fuels), cum, total, leader, dominant_since)
+
+
+if __name__ == '__main__':
+    import time
+    t0 = time.perf_counter()
+    fa = compute_attribution.__wrapped__()
+    print(f"{fa} in {time.perf_counter() - t0:.3f} s, {fa.cumulative.nbytes / 1e6:.1f} MB")
+    cols = ['Entity', 'Total_Gt'] + [f'{f}_%' for f in FUELS] + ['Dominant']
+    import hierarchy
+    countries = hierarchy.load_hierarchy().entities_at('country')
+    print(fa.at(2023, countries).head(10)[cols].round(1).to_string(index=False))
+    print(fa.dominance(['World', 'United States', 'China', 'Saudi Arabia', 'Qatar']).to_string())
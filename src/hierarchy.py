@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from panel import load_panel
+
+# === GERARCHIA DELLE ENTITÀ OWID: PAESE → CONTINENTE → WORLD ===
+# I CSV OWID mescolano paesi e aggregati (World, continenti, gruppi di reddito,
+# regioni GCP/UN/Maddison, bunker internazionali). Sommare tutte le righe per
+# anno conta le stesse emissioni più volte. Qui ogni entità riceve un livello:
+#   - 'world'      : OWID_WRL
+#   - 'country'    : codice ISO3, o codice OWID_ di un paese (Kosovo, USSR, ...)
+#   - 'continent'  : i sei continenti OWID (senza codice)
+#   - 'aggregate'  : tutti gli altri aggregati senza codice
+# Per ogni metrica le somme annuali per livello sono calcolate una volta sola
+# (un prodotto matrice appartenenza × dati) e poi lette in O(anni).
+
+# Codici OWID_ che indicano paesi (attuali o storici), non aggregati
+OWID_COUNTRY_CODES = {
+    'OWID_KOS', 'OWID_AKD', 'OWID_CZS', 'OWID_GDR', 'OWID_GFR', 'OWID_ERE',
+    'OWID_SRM', 'OWID_USS', 'OWID_YAR', 'OWID_YPR', 'OWID_YGS', 'OWID_CYN',
+}
+WORLD_CODE = 'OWID_WRL'
+
+# Paesi per continente secondo la definizione OWID (codici ISO3)
+CONTINENTS = {
+    'Africa': """DZA AGO BEN BWA BFA BDI CMR CPV CAF TCD COM COG COD CIV DJI EGY GNQ ERI SWZ
+        ETH GAB GMB GHA GIN GNB KEN LSO LBR LBY MDG MWI MLI MRT MUS MYT MAR MOZ NAM NER NGA
+        REU RWA SHN STP SEN SYC SLE SOM ZAF SSD SDN TZA TGO TUN UGA ESH ZMB ZWE OWID_ERE""",
+    'Asia': """AFG ARM AZE BHR BGD BTN BRN KHM CHN CXR CYP GEO HKG IND IDN IRN IRQ ISR JPN JOR
+        KAZ KWT KGZ LAO LBN MAC MYS MDV MNG MMR NPL PRK OMN PAK PSE PHL QAT SAU SGP KOR LKA
+        SYR TWN TJK THA TLS TUR TKM ARE UZB VNM YEM OWID_AKD OWID_YAR OWID_YPR OWID_CYN""",
+    'Europe': """ALB AND AUT BLR BEL BIH BGR HRV CZE DNK EST FRO FIN FRA DEU GIB GRC GGY HUN
+        ISL IRL IMN ITA JEY LVA LIE LTU LUX MLT MDA MCO MNE NLD MKD NOR POL PRT ROU RUS SMR
+        SRB SVK SVN ESP SJM SWE CHE UKR GBR VAT OWID_KOS OWID_CZS OWID_GDR OWID_GFR OWID_SRM
+        OWID_USS OWID_YGS""",
+    'North America': """AIA ATG ABW BHS BRB BLZ BMU BES VGB CAN CYM CRI CUB CUW DMA DOM SLV GRL
+        GRD GLP GTM HTI HND JAM MTQ MEX MSR ANT NIC PAN PRI BLM KNA LCA MAF SPM VCT SXM TTO TCA
+        USA VIR""",
+    'South America': "ARG BOL BRA CHL COL ECU FLK GUF GUY PRY PER SUR URY VEN",
+    'Oceania': """ASM AUS COK FJI PYF GUM KIR MHL FSM NRU NCL NZL NIU MNP PLW PNG WSM SLB TKL
+        TON TUV VUT WLF""",
+}
+CONTINENT_OF = {code: cont for cont, codes in CONTINENTS.items() for code in codes.split()}
+
+
+def entity_level(entity, code):
+    if code == WORLD_CODE or entity == 'World':
+        return 'world'
+    if isinstance(code, str) and (not code.startswith('OWID_') or code in OWID_COUNTRY_CODES):
+        return 'country'
+    if entity in CONTINENTS:
+        return 'continent'
+    return 'aggregate'
+
+
+def country_mask(df):
+    """Maschera vettoriale delle righe di `df` che sono paesi (serve la colonna Code)."""
+    codes = df['Code'].astype(object)
+    iso = codes.notna() & ~codes.astype(str).str.startswith('OWID_')
+    return (iso | codes.isin(OWID_COUNTRY_CODES)).to_numpy()
+
+
+class Hierarchy:
+
+    def __init__(self, panel):
+        self.panel = panel
+        self.level = np.array([entity_level(e, c) for e, c in zip(panel.entities, panel.codes)])
+        self.parent = {}
+        for e, c, lvl in zip(panel.entities, panel.codes, self.level):
+            if lvl == 'country':
+                self.parent[e] = CONTINENT_OF.get(c, 'World')
+            elif lvl == 'continent':
+                self.parent[e] = 'World'
+
+        # gruppi di rollup: tutti i paesi + un gruppo per continente
+        self.groups = ['countries'] + list(CONTINENTS)
+        member = np.zeros((len(self.groups), len(panel.entities)))
+        member[0] = self.level == 'country'
+        for g, cont in enumerate(CONTINENTS, start=1):
+            member[g] = [self.parent.get(e) == cont and lvl == 'country'
+                         for e, lvl in zip(panel.entities, self.level)]
+        self.membership = member
+        self._rollups = {}
+
+    def entities_at(self, level):
+        return [e for e, lvl in zip(self.panel.entities, self.level) if lvl == level]
+
+    def children(self, name):
+        return [e for e, p in self.parent.items() if p == name]
+
+    def rollup(self, metric):
+        """Somme annuali per gruppo (gruppi × anni), calcolate una volta per metrica."""
+        if metric not in self._rollups:
+            values = self.panel.metrics[metric]
+            present = ~np.isnan(values)
+            sums = self.membership @ np.where(present, values, 0.0)
+            counts = self.membership @ present
+            sums[counts == 0] = np.nan
+            self._rollups[metric] = sums
+        return self._rollups[metric]
+
+    def group_total(self, metric, group, years=None):
+        ys = self.panel.year_slice(years)
+        return self.rollup(metric)[self.groups.index(group), ys]
+
+    def global_total(self, metric, years=None):
+        """Totale mondiale: riga World se presente, altrimenti somma dei soli paesi."""
+        world = self.panel.series(metric, 'World', years)
+        if not np.isnan(world).all():
+            return world
+        return self.group_total(metric, 'countries', years)
+
+    def global_series(self, metric, years=None):
+        ys = self.panel.year_slice(years)
+        return pd.Series(self.global_total(metric, years),
+                         index=pd.Index(self.panel.years[ys], name='Year'), name=metric)
+
+
+_hierarchy = None
+
+
+def load_hierarchy():
+    global _hierarchy
+    if _hierarchy is None:
+        _hierarchy = Hierarchy(load_panel())
+    return _hierarchy
+
+
+if __name__ == '__main__':
+    h = load_hierarchy()
+    for lvl in ('world', 'continent', 'country', 'aggregate'):
+        print(f"{lvl:10}: {len(h.entities_at(lvl))} entità")
+    y = 2023
+    world = h.global_series('co2').loc[y] / 1e9
+    print(f"\nCO₂ {y}: World {world:.2f} Gt | somma paesi {h.group_total('co2', 'countries', (y, y))[0] / 1e9:.2f} Gt")
+    for cont in CONTINENTS:
+        own = h.panel.series('co2', cont, (y, y))[0] / 1e9
+        print(f"  {cont:15} somma paesi {h.group_total('co2', cont, (y, y))[0] / 1e9:6.2f} Gt | riga OWID {own:6.2f} Gt")
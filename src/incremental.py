@@ -0,0 +1,294 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from owid_store import CACHE_DIR, DATA_DIR, file_hash, load, read_filtered, read_tail, source_hash
+from tcre_engine import RegressionStats
+
+# === RICALCOLO INCREMENTALE QUANDO OWID AGGIUNGE UN ANNO ===
+# Lo stato salvato contiene gli aggregati correnti:
+#   - CO₂ cumulativa per entità (climate_debt.py)
+#   - CO₂ cumulativa per entità e per fonte (fuel.py)
+#   - serie globale (riga World) annuale/cumulativa dal 1850 e statistiche
+#     sufficienti della regressione TCRE (tcre.py)
+#   - ultima popolazione nota per entità (debito climatico)
+# Per ogni file lo stato salva sha256 e dimensione in byte alla lettura
+# precedente e un'impronta delle righe già elaborate (somma degli hash di riga,
+# indipendente dall'ordine e aggiornabile riga per riga). update() decide per file:
+#   - file invariato (stesso hash): nessuna lettura;
+#   - i primi `size` byte coincidono con l'hash salvato: il file è cresciuto
+#     solo in coda, si analizzano soltanto i byte nuovi → O(nuove righe);
+#   - altrimenti (i CSV OWID sono ordinati per Entity, quindi un anno nuovo
+#     finisce sparso nel file) il file va riletto: se l'impronta delle righe
+#     fino all'ultimo anno elaborato è invariata si aggregano solo quelle con
+#     Year successivo, se differisce (revisione OWID) tutto lo stato è
+#     ricalcolato da zero.
+# verify() confronta tutti gli aggregati con un ricalcolo completo.
+
+STATE_PATH = CACHE_DIR / 'incremental_state.json'
+
+CO2_FILE = 'annual-co2-emissions-per-country.csv'
+CO2_COL = 'Annual CO₂ emissions'
+POP_FILE = 'population.csv'
+POP_COL = 'Population (historical)'
+TEMP_FILE = 'temperature-anomaly.csv'
+TEMP_COL = 'Global average temperature anomaly relative to 1861-1890'
+FUEL_FILE = 'co2-by-source.csv'
+FUEL_COLS = {
+    'Coal': 'Annual CO₂ emissions from coal',
+    'Oil': 'Annual CO₂ emissions from oil',
+    'Gas': 'Annual CO₂ emissions from gas',
+    'Cement': 'Annual CO₂ emissions from cement',
+    'Flaring': 'Annual CO₂ emissions from flaring',
+    'Other industry': 'Annual CO₂ emissions from other industry',
+}
+TCRE_START = 1850
+WORLD = 'World'
+FILES = [CO2_FILE, POP_FILE, TEMP_FILE, FUEL_FILE]
+COLUMNS = {CO2_FILE: [CO2_COL], POP_FILE: [POP_COL], TEMP_FILE: [TEMP_COL],
+           FUEL_FILE: list(FUEL_COLS.values())}
+
+
+def empty_state():
+    return {
+        'last_year': {f: None for f in FILES},
+        'files': {},
+        'co2_cum': {},
+        'fuel_cum': {fuel: {} for fuel in FUEL_COLS},
+        'population': {},
+        'global_cum_gt': {},
+        'temp': {},
+        'fit': RegressionStats().to_dict(),
+        'fit_last_year': None,
+    }
+
+
+def load_state(path=STATE_PATH):
+    if path.exists():
+        return json.loads(path.read_text())
+    return empty_state()
+
+
+def save_state(state, path=STATE_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+    tmp.write_text(json.dumps(state))
+    tmp.replace(path)
+
+
+def fingerprint(rows, name):
+    """Somma (mod 2⁶⁴) degli hash delle righe: non dipende dall'ordine delle righe."""
+    cols = COLUMNS[name]
+    df = pd.DataFrame({'Entity': rows['Entity'].astype(str).to_numpy(),
+                       'Year': rows['Year'].to_numpy('int64'),
+                       **{c: rows[c].to_numpy('float64') for c in cols}})
+    return int(pd.util.hash_pandas_object(df, index=False).to_numpy().sum(dtype=np.uint64))
+
+
+def _appended(info, src):
+    """True se il file è lo stesso della lettura precedente con righe aggiunte in coda."""
+    size = info.get('size')
+    if not size or src.stat().st_size <= size:
+        return False
+    with open(src, 'rb') as f:
+        f.seek(size - 1)
+        if f.read(1) != b'\n':
+            return False
+    return file_hash(src, size) == info['sha256']
+
+
+def changed_rows(state, name, until=None):
+    """Righe di `name` non ancora elaborate; None se le righe già elaborate sono cambiate."""
+    cols = COLUMNS[name]
+    last = state['last_year'][name]
+    if last is None:
+        return read_filtered(name, columns=cols, years=(None, until))
+    info = state['files'].get(name, {})
+    src = DATA_DIR / name
+    if until is None and info.get('size') == src.stat().st_size and info['sha256'] == source_hash(name):
+        return read_tail(name, info['size'], cols)    # solo intestazione: nessuna riga
+    if until is None and _appended(info, src):
+        rows = read_tail(name, info['size'], cols)
+        # in coda solo entità o anni nuovi: un anno già elaborato della riga
+        # World cambierebbe serie globale e regressione, quindi vale come revisione
+        if ((rows['Entity'] == WORLD) & (rows['Year'] <= last)).any():
+            return None
+        return rows
+    rows = read_filtered(name, columns=cols, years=(None, until))
+    old = rows['Year'].to_numpy() <= last
+    if fingerprint(rows[old], name) != info.get('fingerprint'):
+        return None
+    return rows[~old]
+
+
+def _add_by_entity(target, rows, col):
+    sums = rows.groupby('Entity', observed=True)[col].sum(min_count=1).dropna()
+    for e, v in sums.items():
+        target[e] = target.get(e, 0.0) + float(v)
+
+
+def update(state=None, until=None, save=True):
+    """Porta lo stato in pari con i CSV (fino all'anno `until`, se dato).
+
+    Se un file ha righe già elaborate diverse da quelle salvate (revisione OWID),
+    lo stato riparte vuoto e tutto è ricalcolato.
+    """
+    state = load_state() if state is None else state
+    state.setdefault('files', {})
+    new = {}
+    for name in FILES:
+        new[name] = changed_rows(state, name, until)
+        if new[name] is None:
+            state = empty_state()
+            new = {n: changed_rows(state, n, until) for n in FILES}
+            break
+
+    # CO₂ per entità + serie globale per la TCRE
+    rows = new[CO2_FILE].astype({CO2_COL: 'float64'})
+    _add_by_entity(state['co2_cum'], rows, CO2_COL)
+    world = rows[(rows['Entity'] == WORLD) & (rows['Year'] >= TCRE_START)]
+    annual = world.set_index('Year')[CO2_COL].dropna().sort_index()
+    cum = state['global_cum_gt']
+    prev = cum[max(cum, key=int)] if cum else 0.0
+    for year, value in zip(annual.index, np.cumsum(annual.to_numpy() / 1e9) + prev):
+        cum[str(int(year))] = float(value)
+
+    # CO₂ per fonte
+    rows = new[FUEL_FILE]
+    for fuel, col in FUEL_COLS.items():
+        _add_by_entity(state['fuel_cum'][fuel], rows, col)
+
+    # Ultima popolazione nota per entità
+    rows = new[POP_FILE].dropna(subset=[POP_COL])
+    last = rows.sort_values('Year').drop_duplicates('Entity', keep='last')
+    for e, y, v in zip(last['Entity'], last['Year'], last[POP_COL]):
+        if e not in state['population'] or int(y) >= state['population'][e][0]:
+            state['population'][e] = [int(y), float(v)]
+
+    # Anomalia termica globale
+    rows = new[TEMP_FILE]
+    world = rows[rows['Entity'] == WORLD].dropna(subset=[TEMP_COL])
+    for y, v in zip(world['Year'], world[TEMP_COL].astype('float64')):
+        state['temp'][str(int(y))] = float(v)
+
+    # Regressione TCRE: solo le coppie (cumulata, anomalia) non ancora usate
+    fitted = state['fit_last_year']
+    paired = sorted(int(y) for y in state['global_cum_gt'].keys() & state['temp'].keys()
+                    if fitted is None or int(y) > fitted)
+    if paired:
+        stats = RegressionStats.from_dict(state['fit'])
+        stats.add([state['global_cum_gt'][str(y)] for y in paired],
+                  [state['temp'][str(y)] for y in paired])
+        state['fit'] = stats.to_dict()
+        state['fit_last_year'] = paired[-1]
+
+    for name, rows in new.items():
+        info = state['files'].get(name, {})
+        if len(rows):
+            last = state['last_year'][name]
+            state['last_year'][name] = max(int(rows['Year'].max()), last if last is not None else -10**9)
+            info['fingerprint'] = (info.get('fingerprint', 0) + fingerprint(rows, name)) % 2**64
+        info.setdefault('fingerprint', 0)
+        info['sha256'] = source_hash(name)
+        # con `until` il file non è stato letto fino in fondo: niente lettura in coda
+        info['size'] = (DATA_DIR / name).stat().st_size if until is None else None
+        state['files'][name] = info
+
+    if save:
+        save_state(state)
+    return state
+
+
+# === METRICHE DERIVATE DALLO STATO ===
+
+def tcre(state):
+    slope, intercept, r2 = RegressionStats.from_dict(state['fit']).fit()
+    return {'TCRE': slope, 'intercept': intercept, 'r2': r2,
+            'cumulative_gt': state['global_cum_gt'][max(state['global_cum_gt'], key=int)]}
+
+
+def fuel_totals(state):
+    """GtCO₂ cumulative mondiali per fonte (riga World), come fuel.py."""
+    return {fuel: v.get(WORLD, np.nan) / 1e9 for fuel, v in state['fuel_cum'].items()}
+
+
+def climate_debt(state, world='World'):
+    cum = pd.Series(state['co2_cum'], name='CO2_tons')
+    pop = pd.Series({e: v for e, (y, v) in state['population'].items()}, name='Population')
+    return _debt(cum, pop, world)
+
+
+def _debt(cum, pop, world='World'):
+    out = pd.concat([cum, pop], axis=1).dropna(subset=['CO2_tons'])
+    baseline = cum[world] / pop[world]
+    out['Climate_Debt_Gt'] = (out['CO2_tons'] - baseline * out['Population']) / 1e9
+    return out.rename_axis('Entity').reset_index()
+
+
+# === VERIFICA CONTRO IL RICALCOLO COMPLETO ===
+
+def full_recompute():
+    co2 = load(CO2_FILE)
+    fuel = load(FUEL_FILE)
+    temp = load(TEMP_FILE)
+    pop = load(POP_FILE)
+
+    co2_cum = co2.groupby('Entity', observed=True)[CO2_COL].sum(min_count=1).dropna()
+    last_pop = (pop.dropna(subset=[POP_COL]).sort_values('Year', kind='stable')
+                .drop_duplicates('Entity', keep='last').set_index('Entity'))
+    world_fuel = fuel[fuel['Entity'] == WORLD]
+    fuel_tot = {f: world_fuel[c].sum() / 1e9 for f, c in FUEL_COLS.items()}
+
+    glob = co2[co2['Entity'] == WORLD].set_index('Year')[CO2_COL].sort_index()
+    glob = (glob[glob.index >= TCRE_START] / 1e9).cumsum()
+    world = temp[temp['Entity'] == 'World'].dropna(subset=[TEMP_COL]).set_index('Year')[TEMP_COL]
+    df = pd.concat([glob.rename('x'), world.rename('y')], axis=1, join='inner')
+    slope, intercept = np.polyfit(df['x'], df['y'], 1)
+    r2 = np.corrcoef(df['x'], df['y'])[0, 1] ** 2
+    return {'co2_cum': co2_cum, 'fuel_totals': fuel_tot,
+            'population': last_pop[['Year', POP_COL]],
+            'climate_debt': _debt(co2_cum.rename('CO2_tons'), last_pop[POP_COL].rename('Population')),
+            'tcre': {'TCRE': slope, 'intercept': intercept, 'r2': r2,
+                     'cumulative_gt': glob.iloc[-1]}}
+
+
+def verify(state=None, rtol=1e-9):
+    """Confronta lo stato incrementale con un ricalcolo da zero; solleva se diverge."""
+    state = load_state() if state is None else state
+    full = full_recompute()
+    errors = []
+
+    cum = pd.Series(state['co2_cum']).reindex(full['co2_cum'].index)
+    if not np.allclose(cum, full['co2_cum'], rtol=rtol, equal_nan=True):
+        errors.append('co2_cum')
+    pop = pd.DataFrame(state['population'], index=['Year', POP_COL]).T.reindex(full['population'].index)
+    if not (np.array_equal(pop['Year'], full['population']['Year'])
+            and np.allclose(pop[POP_COL], full['population'][POP_COL], rtol=rtol)):
+        errors.append('population')
+    debt = climate_debt(state).set_index('Entity').reindex(full['climate_debt']['Entity'])
+    if not np.allclose(debt['Climate_Debt_Gt'], full['climate_debt']['Climate_Debt_Gt'],
+                       rtol=rtol, equal_nan=True):
+        errors.append('climate_debt')
+    inc_fuel = fuel_totals(state)
+    for fuel, v in full['fuel_totals'].items():
+        if not np.isclose(inc_fuel[fuel], v, rtol=rtol):
+            errors.append(f'fuel_cum[{fuel}]')
+    inc_tcre = tcre(state)
+    for k, v in full['tcre'].items():
+        if not np.isclose(inc_tcre[k], v, rtol=1e-6):
+            errors.append(f'tcre[{k}]')
+
+    if errors:
+        raise AssertionError(f"Stato incrementale diverso dal ricalcolo completo: {', '.join(errors)}")
+    return True
+
+
+if __name__ == '__main__':
+    state = update()
+    verify(state)
+    t = tcre(state)
+    print(f"Anni elaborati: {state['last_year']}")
+    print(f"TCRE: {t['TCRE']:.6f} °C/GtCO₂ | R²: {t['r2']:.4f} | cumulata: {t['cumulative_gt']:.0f} GtCO₂")
+    print("Verifica contro ricalcolo completo: OK")
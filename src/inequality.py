@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+import hierarchy
+import panel
+from cache import memoize
+from debt_engine import _ffill
+
+# === DISUGUAGLIANZA DELLE EMISSIONI TRA PAESI, ANNO PER ANNO ===
+# Per ogni anno dal 1850, sui paesi (senza aggregati), pesando per popolazione:
+#   - curva di Lorenz: quota cumulata di popolazione (W) e di emissioni (E)
+#     con i paesi ordinati per emissioni pro capite crescenti
+#   - Gini = 1 - Σ (W_i - W_i-1)(E_i + E_i-1)
+#   - Theil T = Σ s_i ln(x_i / μ), s_i = quota delle emissioni del paese i
+#   - quota del 10% più emissivo e del 50% meno emissivo della popolazione
+#     (interpolando sulla curva di Lorenz: dentro un paese il pro capite è uniforme)
+# Due basi: emissioni annuali pro capite e cumulate (dal primo dato) pro capite.
+# Tutti gli anni insieme: un argsort per riga della matrice anno × paese, poi
+# cumsum lungo i paesi; nessun ciclo sugli anni.
+
+FIRST_YEAR = 1850
+BASES = ('annual', 'cumulative')
+
+
+def _share_below(W, E, q):
+    """E(q) per ogni riga: quota di emissioni della frazione q meno emissiva della popolazione."""
+    k = np.argmax(W >= q, axis=1)[:, None]
+    w0, w1 = np.take_along_axis(W, k - 1, axis=1), np.take_along_axis(W, k, axis=1)
+    e0, e1 = np.take_along_axis(E, k - 1, axis=1), np.take_along_axis(E, k, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = np.where(w1 > w0, (q - w0) / (w1 - w0), 0.0)
+    return (e0 + frac * (e1 - e0))[:, 0]
+
+
+def lorenz_batch(values, weights):
+    """Lorenz, Gini, Theil e quote per ogni riga di una matrice anno × paese.
+
+    Celle con valore o peso mancanti hanno peso zero e non contano.
+    """
+    valid = ~np.isnan(values) & ~np.isnan(weights) & (weights > 0)
+    x = np.where(valid, values, 0.0)
+    w = np.where(valid, weights, 0.0)
+
+    order = np.argsort(x, axis=1, kind='stable')
+    x = np.take_along_axis(x, order, axis=1)
+    w = np.take_along_axis(w, order, axis=1)
+    e = w * x
+
+    n_rows = len(x)
+    W = np.zeros((n_rows, x.shape[1] + 1))
+    E = np.zeros_like(W)
+    np.cumsum(w, axis=1, out=W[:, 1:])
+    np.cumsum(e, axis=1, out=E[:, 1:])
+    total_w, total_e = W[:, -1:].copy(), E[:, -1:].copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        W /= total_w
+        E /= total_e
+        gini = 1 - np.sum(np.diff(W, axis=1) * (E[:, 1:] + E[:, :-1]), axis=1)
+        mean = total_e[:, 0] / total_w[:, 0]
+        share = e / total_e
+        theil = np.sum(np.where(x > 0, share * np.log(x / mean[:, None]), 0.0), axis=1)
+
+    ok = (total_w[:, 0] > 0) & (total_e[:, 0] > 0)
+    top10 = 1 - _share_below(W, E, 0.9)
+    bottom50 = _share_below(W, E, 0.5)
+    nan = np.full(n_rows, np.nan)
+    return {
+        'W': W, 'E': E, 'order': order,
+        'gini': np.where(ok, gini, nan), 'theil': np.where(ok, theil, nan),
+        'top10': np.where(ok, top10, nan), 'bottom50': np.where(ok, bottom50, nan),
+        'countries': valid.sum(axis=1), 'mean': np.where(ok, mean, nan),
+    }
+
+
+class CarbonInequality:
+
+    def __init__(self, entities, years, results):
+        self.entities = entities
+        self.years = years
+        self.year0 = int(years[0])
+        self.results = results      # base → dizionario di lorenz_batch
+
+    def table(self, basis=None):
+        """Indici per anno (e base): Gini, Theil, quota top 10% e bottom 50%."""
+        frames = []
+        for b in ([basis] if basis else BASES):
+            r = self.results[b]
+            frames.append(pd.DataFrame({
+                'Year': self.years, 'Basis': b, 'Countries': r['countries'],
+                'Mean_t_per_capita': r['mean'], 'Gini': r['gini'], 'Theil': r['theil'],
+                'Top10_share': r['top10'], 'Bottom50_share': r['bottom50'],
+            }))
+        return pd.concat(frames, ignore_index=True).dropna(subset=['Gini'])
+
+    def lorenz(self, year, basis='annual'):
+        """Curva di Lorenz di un anno: paesi in ordine di pro capite crescente."""
+        r = self.results[basis]
+        t = int(year) - self.year0
+        order = r['order'][t]
+        idx = np.flatnonzero(np.diff(r['W'][t]) > 0)     # i paesi senza dati hanno peso 0
+        return pd.DataFrame({
+            'Entity': np.array(self.entities, dtype=object)[order[idx]],
+            'Population_share': r['W'][t, idx + 1],
+            'Emissions_share': r['E'][t, idx + 1],
+        })
+
+
+@memoize(sources=panel.SOURCES)
+def compute_inequality(first_year=FIRST_YEAR):
+    h = hierarchy.load_hierarchy()
+    p = h.panel
+    ids = p.ids(h.entities_at('country'))
+    co2 = p.metrics['co2'][ids]
+    pop = _ffill(np.asarray(p.metrics['population'][ids]))
+
+    # cumulata dal primo dato: NaN finché il paese non ha emissioni
+    cum = np.nancumsum(co2, axis=1)
+    cum[~np.logical_or.accumulate(~np.isnan(co2), axis=1)] = np.nan
+
+    ys = p.year_slice((first_year, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_capita = {'annual': co2[:, ys] / pop[:, ys], 'cumulative': cum[:, ys] / pop[:, ys]}
+    weights = pop[:, ys].T
+    results = {b: lorenz_batch(per_capita[b].T, weights) for b in BASES}
+    return CarbonInequality([p.entities[i] for i in ids], p.years[ys], results)
+
+
+if __name__ == '__main__':
+    import time
+    t0 = time.perf_counter()
+    ineq = compute_inequality.__wrapped__()
+    print(f"{len(ineq.years)} anni × 2 basi in {time.perf_counter() - t0:.3f} s")
+    table = ineq.table()
+    print(table[table['Year'].isin([1850, 1900, 1950, 1990, 2000, 2010, 2023])].round(3).to_string(index=False))
+    print(ineq.lorenz(2023).tail(5).round(3).to_string(index=False))
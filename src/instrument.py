@@ -0,0 +1,222 @@
+import atexit
+import contextlib
+import csv
+import functools
+import json
+import os
+import signal
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:     # Windows: niente getrusage, il picco RSS resta NaN
+    resource = None
+
+# === TEMPI E MEMORIA PER FASE ===
+# Ogni script divide il lavoro in fasi con nome (load, join, compute, plot, save):
+#   with stage('load'): ...          blocco esplicito (annidabile: 'load/read_csv')
+#   begin('compute')                  negli script piatti: chiude la fase precedente
+# Per ogni fase: tempo reale, tempo CPU, RSS a fine fase e picco RSS del processo;
+# con OWID_TRACEMALLOC=1 anche il picco di memoria Python allocata nella fase.
+# Variabili d'ambiente:
+#   OWID_INSTRUMENT=1          salva JSON + CSV in .owid_cache/instrument/ a fine processo
+#   OWID_INSTRUMENT_OUT=dir    cartella alternativa
+#   OWID_PROFILE=<fase>        profila solo quella fase (es. 'plot' o 'load/read_csv')
+#   OWID_PROFILE_MODE=cprofile | sample   cProfile (.prof) o campionamento (stack compressi,
+#                                         solo dove esiste SIGPROF; altrimenti cProfile)
+
+ENABLED = os.environ.get('OWID_INSTRUMENT', '') not in ('', '0')
+TRACE_MEMORY = os.environ.get('OWID_TRACEMALLOC', '') not in ('', '0')
+PROFILE_STAGE = os.environ.get('OWID_PROFILE') or None
+PROFILE_MODE = os.environ.get('OWID_PROFILE_MODE', 'cprofile')
+SAMPLE_INTERVAL = 0.005    # secondi di CPU tra due campioni
+
+records = []
+label = None        # nome dello script nei record (di default sys.argv[0])
+_stack = []
+_flat = None
+
+
+def _out_dir():
+    if os.environ.get('OWID_INSTRUMENT_OUT'):
+        return Path(os.environ['OWID_INSTRUMENT_OUT'])
+    from owid_store import CACHE_DIR
+    return CACHE_DIR / 'instrument'
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        return float('nan')
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == 'darwin' else peak * 1024 / 1e6   # byte su macOS, KiB su Linux
+
+
+def _script():
+    return label or Path(sys.argv[0]).stem or 'python'
+
+
+# --- profilazione di una singola fase ---
+
+class _Sampler:
+    """Profilatore a campionamento: conta gli stack Python ogni SAMPLE_INTERVAL di CPU."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{Path(code.co_filename).name}:{code.co_name}')
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def disable(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous)
+
+    def dump(self, path):
+        # formato "stack compresso" (flamegraph.pl, speedscope)
+        with open(path, 'w') as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f'{stack} {n}\n')
+
+
+def _start_profiler():
+    if PROFILE_MODE == 'sample' and hasattr(signal, 'SIGPROF'):
+        profiler = _Sampler()
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler, name):
+    profiler.disable()
+    out = _out_dir()
+    out.mkdir(parents=True, exist_ok=True)
+    ext = 'folded' if isinstance(profiler, _Sampler) else 'prof'
+    path = out / f"{_script()}_{name.replace('/', '.')}_{time.strftime('%Y%m%d-%H%M%S')}.{ext}"
+    if isinstance(profiler, _Sampler):
+        profiler.dump(path)
+    else:
+        import pstats
+        profiler.dump_stats(path)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(15)
+    print(f"Profilo della fase '{name}' salvato in {path}", file=sys.stderr)
+    return path
+
+
+# --- fasi ---
+
+@contextlib.contextmanager
+def stage(name):
+    """Misura il blocco come fase `name` (nome completo: fasi aperte + name)."""
+    full = '/'.join([*_stack, name])
+    _stack.append(name)
+    if TRACE_MEMORY:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        mem0 = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    profiler = _start_profiler() if PROFILE_STAGE == full else None
+    peak0 = _peak_rss_mb()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+        record = {'script': _script(), 'stage': full, 'wall_s': wall, 'cpu_s': cpu,
+                  'rss_mb': _rss_mb(), 'peak_rss_mb': _peak_rss_mb(),
+                  'peak_rss_growth_mb': max(_peak_rss_mb() - peak0, 0.0)}
+        if TRACE_MEMORY:
+            record['py_peak_mb'] = (tracemalloc.get_traced_memory()[1] - mem0) / 1e6
+        if profiler is not None:
+            record['profile'] = str(_stop_profiler(profiler, full))
+        records.append(record)
+        _stack.pop()
+
+
+def begin(name):
+    """Apre la fase `name` chiudendo quella aperta con begin() in precedenza."""
+    global _flat
+    end()
+    _flat = stage(name)
+    _flat.__enter__()
+
+
+def end():
+    global _flat
+    if _flat is not None:
+        flat, _flat = _flat, None
+        flat.__exit__(None, None, None)
+
+
+def staged(name=None):
+    """Decoratore: ogni chiamata della funzione è una fase."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- uscita ---
+
+def reset():
+    records.clear()
+
+
+def report(out=sys.stderr):
+    if not records:
+        return
+    print(f"\n{'Fase':32} {'wall (s)':>9} {'cpu (s)':>8} {'RSS (MB)':>9} {'picco':>8}"
+          + (f" {'py (MB)':>8}" if TRACE_MEMORY else ''), file=out)
+    for r in records:
+        line = (f"{r['stage']:32} {r['wall_s']:9.3f} {r['cpu_s']:8.3f} "
+                f"{r['rss_mb']:9.1f} {r['peak_rss_mb']:8.1f}")
+        if TRACE_MEMORY:
+            line += f" {r['py_peak_mb']:8.1f}"
+        print(line, file=out)
+
+
+def save(out_dir=None):
+    """Scrive le fasi registrate in <script>_<timestamp>.json e .csv."""
+    out = Path(out_dir) if out_dir else _out_dir()
+    out.mkdir(parents=True, exist_ok=True)
+    base = out / f"{_script()}_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}"
+    base.with_suffix('.json').write_text(json.dumps(records, indent=1))
+    fields = list(dict.fromkeys(k for r in records for k in r))
+    with open(base.with_suffix('.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(records)
+    return base.with_suffix('.json')
+
+
+@atexit.register
+def _finish():
+    end()
+    if ENABLED and records:
+        report()
+        print(f"Fasi salvate in {save()}", file=sys.stderr)
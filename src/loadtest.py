@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import service
+
+# === PROVA DI CARICO DEL SERVIZIO LOCALE ===
+# python src/loadtest.py [--requests 2000] [--concurrency 16] [--png] [--compare-cli]
+# Avvia service.py nello stesso processo su una porta libera (o usa --url per
+# un servizio già in esecuzione), apre `concurrency` connessioni keep-alive e
+# distribuisce le richieste sugli endpoint di PATHS. Riporta per endpoint la
+# prima risposta (a freddo) e p50 / p99 / massimo delle successive, più il
+# throughput complessivo; con --compare-cli anche il tempo di un comando
+# equivalente lanciato come processo, come fanno oggi i dashboard.
+# Nei percorsi con {n} il valore cambia a ogni richiesta: la risposta non è mai
+# in cache e il calcolo pesante (bootstrap TCRE) pesa anche sul p99 degli altri.
+
+SRC_DIR = Path(__file__).resolve().parent
+
+PATHS = [
+    '/api/debt?top=10',
+    '/api/debt?year=2000&top=20',
+    '/api/decoupling?top=10',
+    '/api/fuel',
+    '/api/fuel_shares?year=2023&top=10',
+    '/api/tcre',
+    '/api/trajectory?top=15',
+    '/api/trajectory?entities=Italy,France,Germany',
+    '/api/tcre?bootstrap={n}',
+]
+PNG_PATHS = ['/png/tcre?dpi=80', '/png/fuel?dpi=80']
+
+
+def _expand(path, i):
+    return path.format(n=1000 + i) if '{n}' in path else path
+
+
+async def _request(reader, writer, host, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, queue, samples, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            try:
+                path, target = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            t0 = time.perf_counter()
+            status = await _request(reader, writer, host, target)
+            samples.setdefault(path, []).append(time.perf_counter() - t0)
+            if status != 200:
+                errors[path] = errors.get(path, 0) + 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run(host, port, paths, requests, concurrency):
+    # prima richiesta di ogni endpoint, da sola: latenza a freddo
+    cold = {}
+    reader, writer = await asyncio.open_connection(host, port)
+    for path in paths:
+        t0 = time.perf_counter()
+        await _request(reader, writer, host, _expand(path, 0))
+        cold[path] = time.perf_counter() - t0
+    writer.close()
+    await writer.wait_closed()
+
+    queue = asyncio.Queue()
+    for i in range(requests):
+        path = paths[i % len(paths)]
+        queue.put_nowait((path, _expand(path, i + 1)))
+    samples, errors = {}, {}
+    t0 = time.perf_counter()
+    await asyncio.gather(*[_client(host, port, queue, samples, errors) for _ in range(concurrency)])
+    return cold, samples, errors, time.perf_counter() - t0
+
+
+async def run_local(paths, requests, concurrency, workers):
+    svc = service.Service(workers)
+    warm = svc.warm()
+    server = await service.start(svc, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        async with server:
+            result = await run('127.0.0.1', port, paths, requests, concurrency)
+            await svc.drain()
+            return (warm, *result)
+    finally:
+        svc.close()
+
+
+def cli_time(repeat=3):
+    """Tempo di `python cli.py debt --no-plot` come processo separato."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, str(SRC_DIR / 'cli.py'), 'debt', '--no-plot'],
+                       check=True, capture_output=True)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def report(cold, samples, errors, elapsed):
+    total = sum(len(s) for s in samples.values())
+    print(f"{'Endpoint':44} {'freddo':>9} {'p50':>8} {'p99':>8} {'max':>8} {'n':>6}  (ms)")
+    everything = []
+    for path, times in samples.items():
+        ms = np.array(times) * 1e3
+        everything.append(ms)
+        flag = f"  {errors[path]} errori" if path in errors else ''
+        print(f"{path:44} {cold[path] * 1e3:9.1f} {np.percentile(ms, 50):8.2f} "
+              f"{np.percentile(ms, 99):8.2f} {ms.max():8.2f} {len(ms):6}{flag}")
+    ms = np.concatenate(everything)
+    print(f"{'Totale':44} {'':9} {np.percentile(ms, 50):8.2f} {np.percentile(ms, 99):8.2f} "
+          f"{ms.max():8.2f} {total:6}")
+    print(f"\n{total} richieste in {elapsed:.2f} s → {total / elapsed:.0f} richieste/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prova di carico del servizio HTTP locale (p50/p99).")
+    parser.add_argument('--url', default=None, help="servizio già avviato (es. http://127.0.0.1:8765)")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None, help="processi per i grafici del servizio locale")
+    parser.add_argument('--png', action='store_true', help="include gli endpoint dei grafici")
+    parser.add_argument('--compare-cli', action='store_true', help="confronta con un comando lanciato come processo")
+    args = parser.parse_args(argv)
+
+    paths = PATHS + (PNG_PATHS if args.png else [])
+    if args.url:
+        url = urlsplit(args.url)
+        cold, samples, errors, elapsed = asyncio.run(
+            run(url.hostname, url.port or 80, paths, args.requests, args.concurrency))
+    else:
+        warm, cold, samples, errors, elapsed = asyncio.run(
+            run_local(paths, args.requests, args.concurrency, args.workers))
+        print(f"Avvio del servizio (pannello e tabelle): {warm:.2f} s\n")
+    report(cold, samples, errors, elapsed)
+    if args.compare_cli:
+        print(f"Stesso dato via processo (cli.py debt --no-plot): {cli_time() * 1e3:.0f} ms a richiesta")
+
+
+if __name__ == '__main__':
+    main()
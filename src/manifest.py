@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import owid_store
+from owid_store import CACHE_DIR, DATA_DIR, source_hash
+
+# === MANIFEST DEI FILE DI data/ ===
+# Per ogni CSV: hash del file, colonne, unità, hash del contenuto canonico
+# (colonne in ordine alfabetico, righe ordinate per Entity/Year), hash dei codici
+# ISO (Code) e hash di ogni serie (Entity, Year, valore). Da questi si ricavano
+# le relazioni tra file:
+#   - 'identical'  : stessi byte
+#   - 'equivalent' : stesso contenuto con colonne/righe in ordine diverso
+#   - 'subset'     : tutte le serie del file sono contenute, uguali, in un altro
+#   - 'overlap'    : serie con lo stesso nome e valori uguali sugli anni comuni
+#   - 'code_mismatch': come uno dei primi tre, ma il file ha una colonna Code
+#                    diversa da quella del file di riferimento (nessun alias)
+# I primi tre diventano alias: owid_store.load() restituisce le colonne della
+# copia già in memoria del file di riferimento invece di leggere il duplicato.
+# Schema e unità sono verificati una volta per contenuto (risultato nel manifest).
+
+MANIFEST_PATH = CACHE_DIR / 'manifest.json'
+MANIFEST_VERSION = 2        # cambia quando cambia il modo di calcolare gli hash
+KEYS = ['Entity', 'Year']
+
+# colonna (sottostringa, in ordine di priorità) → unità, minimo, massimo
+UNITS = [
+    ('(per capita)', 't CO₂ per persona', 0, 1e3),
+    ('Annual CO₂ emissions', 't CO₂', 0, 1e11),
+    ('greenhouse gas emissions', 't CO₂e', -1e11, 1e12),
+    ('Population', 'persone', 0, 2e10),
+    ('GDP per capita', '$ internazionali 2011', 0, 1e6),
+    ('temperature anomaly', '°C', -5, 5),
+]
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def unit_of(column):
+    for pattern, unit, lo, hi in UNITS:
+        if pattern in column:
+            return unit, lo, hi
+    return None
+
+
+def _value_columns(df):
+    return [c for c in df.columns if c not in ('Entity', 'Code', 'Year') and 'annotations' not in c]
+
+
+def _digest(*arrays):
+    h = hashlib.sha256()
+    for a in arrays:
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+
+def validate(name, df):
+    """Elenco dei problemi di schema/unità di `df` (vuoto se il file è valido)."""
+    errors = [f"colonna chiave assente: {k}" for k in KEYS if k not in df.columns]
+    if errors:
+        return errors
+    if not pd.api.types.is_integer_dtype(df['Year']):
+        errors.append("Year non intero")
+    dup = df.duplicated(KEYS).sum()
+    if dup:
+        errors.append(f"{dup} righe duplicate per (Entity, Year)")
+    for col in _value_columns(df):
+        rule = unit_of(col)
+        if rule is None:
+            errors.append(f"colonna senza unità nota: {col}")
+            continue
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            errors.append(f"{col}: valori non numerici")
+            continue
+        unit, lo, hi = rule
+        out = ((df[col] < lo) | (df[col] > hi)).sum()
+        if out:
+            errors.append(f"{col}: {out} valori fuori da [{lo:g}, {hi:g}] {unit}")
+    return errors
+
+
+def describe_file(name, df):
+    keyed = df.sort_values(KEYS, kind='stable', ignore_index=True)
+    keys = [keyed['Entity'].astype(str).to_numpy(dtype='U'), keyed['Year'].to_numpy(dtype='int64')]
+    values = sorted(_value_columns(df))
+    series = {}
+    for col in values:
+        present = keyed[col].notna().to_numpy()
+        series[col] = _digest(keys[0][present], keys[1][present],
+                              keyed[col].to_numpy(dtype=float)[present])
+    content = _digest(np.array(values, dtype='U'), *keys,
+                      *[keyed[c].to_numpy(dtype=float) for c in values])
+    codes = (_digest(*keys, keyed['Code'].astype(str).to_numpy(dtype='U'))
+             if 'Code' in keyed else None)
+    return {
+        'sha256': source_hash(name),
+        'rows': len(df),
+        'columns': list(df.columns),
+        'value_columns': values,
+        'units': {c: (unit_of(c) or [None])[0] for c in values},
+        'keys_hash': _digest(*keys),
+        'codes_hash': codes,
+        'content_hash': content,
+        'series': series,
+        'errors': validate(name, df),
+    }
+
+
+def _codes_match(alias, source):
+    # l'alias restituisce le colonne del file dal file di riferimento: se il file
+    # ha una colonna Code, deve essere uguale a quella del riferimento
+    return alias['codes_hash'] is None or alias['codes_hash'] == source['codes_hash']
+
+
+def _relations(files, frames):
+    relations, aliases = [], {}
+
+    def add_alias(file, of, kind, **extra):
+        if not _codes_match(files[file], files[of]):
+            relations.append({'kind': 'code_mismatch', 'file': file, 'of': of, 'relation': kind})
+            return
+        relations.append({'kind': kind, 'file': file, 'of': of, **extra})
+        aliases.setdefault(file, {'source': of, 'kind': kind})
+
+    names = sorted(files)
+    for i, a in enumerate(names):
+        for b in names[i + 1:]:
+            fa, fb = files[a], files[b]
+            if fa['sha256'] == fb['sha256']:
+                kind = 'identical'
+            elif fa['content_hash'] == fb['content_hash']:
+                kind = 'equivalent'
+            elif fa['keys_hash'] == fb['keys_hash'] and set(fa['series'].items()) >= set(fb['series'].items()):
+                add_alias(b, a, 'subset', columns=fb['value_columns'])
+                continue
+            elif fa['keys_hash'] == fb['keys_hash'] and set(fb['series'].items()) >= set(fa['series'].items()):
+                add_alias(a, b, 'subset', columns=fa['value_columns'])
+                continue
+            else:
+                common = sorted(set(fa['value_columns']) & set(fb['value_columns']))
+                for col in common:
+                    joined = frames[a][KEYS + [col]].merge(frames[b][KEYS + [col]], on=KEYS,
+                                                            suffixes=('_a', '_b')).dropna()
+                    if len(joined) and np.allclose(joined[col + '_a'], joined[col + '_b']):
+                        relations.append({'kind': 'overlap', 'file': b, 'of': a, 'columns': [col],
+                                          'common_rows': len(joined)})
+                continue
+            add_alias(b, a, kind)
+
+    # catene di alias risolte sul file di riferimento finale
+    for entry in aliases.values():
+        while entry['source'] in aliases:
+            entry['source'] = aliases[entry['source']]['source']
+    return relations, aliases
+
+
+def build_manifest():
+    frames = {p.name: owid_store.load_file(p.name) for p in sorted(DATA_DIR.glob('*.csv'))}
+    files = {name: describe_file(name, df) for name, df in frames.items()}
+    relations, aliases = _relations(files, frames)
+    manifest = {'version': MANIFEST_VERSION, 'files': files, 'relations': relations, 'aliases': aliases}
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    tmp.write_text(json.dumps(manifest, indent=1, ensure_ascii=False))
+    tmp.replace(MANIFEST_PATH)
+    return manifest
+
+
+_manifest = None
+
+
+def _fresh(manifest):
+    names = {p.name for p in DATA_DIR.glob('*.csv')}
+    return (manifest.get('version') == MANIFEST_VERSION
+            and names == set(manifest['files'])
+            and all(source_hash(n) == manifest['files'][n]['sha256'] for n in names))
+
+
+def get_manifest():
+    """Manifest aggiornato (ricostruito solo se i file di data/ sono cambiati).
+
+    Come le copie di owid_store, è verificato una sola volta per processo.
+    """
+    global _manifest
+    if _manifest is None:
+        if MANIFEST_PATH.exists():
+            cached = json.loads(MANIFEST_PATH.read_text())
+            if _fresh(cached):
+                _manifest = cached
+        if _manifest is None:
+            _manifest = build_manifest()
+    return _manifest
+
+
+def resolve(name):
+    """(file da leggere, colonne) per `name`; SchemaError se il file non è valido."""
+    manifest = get_manifest()
+    entry = manifest['files'].get(name)
+    if entry is None:
+        raise FileNotFoundError(f"{name} non è in {DATA_DIR}")
+    if entry['errors']:
+        raise SchemaError(f"{name}: " + '; '.join(entry['errors']))
+    alias = manifest['aliases'].get(name)
+    if alias is None:
+        return name, None
+    return alias['source'], entry['columns']
+
+
+if __name__ == '__main__':
+    m = build_manifest()
+    for name, f in m['files'].items():
+        status = 'OK' if not f['errors'] else '; '.join(f['errors'])
+        print(f"{name:50} {f['rows']:>6} righe  {f['sha256'][:12]}  {status}")
+    print("\nRelazioni tra file:")
+    for r in m['relations']:
+        extra = f" ({', '.join(r['columns'])})" if 'columns' in r else ''
+        print(f"  {r['file']:50} {r['kind']:10} di {r['of']}{extra}")
@@ -0,0 +1,223 @@
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from instrument import stage
+
+# === ARCHIVIO CONDIVISO DEI CSV OWID ===
+# Ogni CSV in data/ viene letto una sola volta e salvato in formato colonnare
+# binario (Parquet se pyarrow è disponibile) insieme al suo hash SHA-256.
+# Le esecuzioni successive rileggono la copia binaria finché il CSV non cambia.
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = Path(os.environ.get('OWID_DATA_DIR', ROOT / 'data'))
+CACHE_DIR = Path(os.environ.get('OWID_CACHE_DIR', ROOT / '.owid_cache'))
+
+try:
+    import pyarrow  # noqa: F401
+    BINARY_FORMAT = 'parquet'
+except ImportError:
+    # senza pyarrow ripieghiamo sul pickle di pandas (sempre tipizzato)
+    BINARY_FORMAT = 'pickle'
+
+# Copie già caricate in questo processo (un file → un DataFrame)
+_loaded = {}
+
+
+def file_hash(path, size=None):
+    """SHA-256 del file, o dei soli primi `size` byte."""
+    h = hashlib.sha256()
+    left = float('inf') if size is None else size
+    with open(path, 'rb') as f:
+        while left > 0:
+            block = f.read(int(min(1 << 20, left)))
+            if not block:
+                break
+            h.update(block)
+            left -= len(block)
+    return h.hexdigest()
+
+
+def _paths(name):
+    stem = Path(name).stem
+    ext = '.parquet' if BINARY_FORMAT == 'parquet' else '.pkl'
+    return CACHE_DIR / (stem + ext), CACHE_DIR / (stem + '.json')
+
+
+def _read_binary(path):
+    if BINARY_FORMAT == 'parquet':
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def _write_binary(df, path):
+    tmp = path.with_suffix(f'{path.suffix}.{os.getpid()}.tmp')
+    if BINARY_FORMAT == 'parquet':
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+def source_hash(name):
+    """SHA-256 del CSV sorgente (riusa quello salvato se il file non è cambiato)."""
+    src = DATA_DIR / name
+    _, meta_path = _paths(name)
+    st = src.stat()
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text())
+        if meta.get('size') == st.st_size and meta.get('mtime_ns') == st.st_mtime_ns:
+            return meta['sha256']
+    return file_hash(src)
+
+
+def load(name):
+    """Restituisce il CSV `name` di data/ passando per la copia binaria.
+
+    Il file è prima verificato sul manifest (schema e unità, SchemaError se non
+    valido); un duplicato o sottoinsieme di un altro file restituisce le colonne
+    della copia già caricata di quel file.
+    """
+    from manifest import resolve
+    source, columns = resolve(name)
+    if source != name:
+        return load(source)[columns]
+    return load_file(name)
+
+
+def load_file(name):
+    """Come load(), senza passare per il manifest (usato per costruirlo)."""
+    if name in _loaded:
+        return _loaded[name].copy(deep=False)
+
+    src = DATA_DIR / name
+    bin_path, meta_path = _paths(name)
+    st = src.stat()
+    meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+    fresh = bin_path.exists() and meta.get('format') == BINARY_FORMAT
+
+    if fresh and meta.get('size') == st.st_size and meta.get('mtime_ns') == st.st_mtime_ns:
+        df = _read_binary(bin_path)
+    else:
+        # mtime/dimensione diversi: decide il contenuto, non la data del file
+        digest = file_hash(src)
+        if fresh and meta.get('sha256') == digest:
+            df = _read_binary(bin_path)
+        else:
+            with stage(f'read_csv[{name}]'):
+                df = pd.read_csv(src)
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            _write_binary(df, bin_path)
+        meta = {'source': name, 'sha256': digest, 'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns, 'format': BINARY_FORMAT}
+        meta_path.write_text(json.dumps(meta, indent=2))
+
+    _loaded[name] = df
+    return df.copy(deep=False)
+
+
+# === LETTURA A BLOCCHI CON PROIEZIONE E FILTRI ===
+# Per file più grandi (es. il dataset OWID CO₂ completo) il CSV viene letto a
+# blocchi: si analizzano solo le colonne richieste, con tipi compatti, e i
+# filtri su anni ed entità sono applicati a ogni blocco prima di accumularlo.
+# La memoria resta proporzionale a blocco + risultato, non al file.
+
+CHUNKSIZE = 100_000
+KEY_DTYPES = {'Entity': 'category', 'Code': 'category', 'Year': 'int16'}
+
+# Colonne per cui float32 è sufficiente (per capita, PIL pro capite, anomalie);
+# le emissioni assolute (fino a ~4e10 t) restano in float64
+FLOAT32_COLUMNS = {
+    'Annual CO₂ emissions (per capita)',
+    'GDP per capita',
+    'Global average temperature anomaly relative to 1861-1890',
+    'Lower bound of the annual temperature anomaly (95% confidence interval)',
+    'Upper bound of the annual temperature anomaly (95% confidence interval)',
+}
+
+
+def _schema(name, columns=None):
+    """(chiavi, colonne valore, dtype) con cui leggere il CSV `name`."""
+    header = list(pd.read_csv(DATA_DIR / name, nrows=0).columns)
+    keys = [c for c in KEY_DTYPES if c in header]
+    if columns is None:
+        columns = [c for c in header if c not in KEY_DTYPES and 'annotations' not in c]
+    missing = set(columns) - set(header)
+    if missing:
+        raise KeyError(f"{name}: colonne assenti {sorted(missing)}")
+    dtype = {c: KEY_DTYPES[c] for c in keys}
+    dtype.update({c: 'float32' if c in FLOAT32_COLUMNS else 'float64' for c in columns})
+    return keys, list(columns), dtype
+
+
+def iter_chunks(name, columns=None, years=None, entities=None, chunksize=CHUNKSIZE):
+    """Blocchi già proiettati e filtrati del CSV `name`.
+
+    `columns`: colonne valore da leggere (di default tutte tranne le annotazioni)
+    `years`: (primo, ultimo) inclusi, None per lasciare aperto un estremo
+    `entities`: elenco di entità da tenere
+    """
+    src = DATA_DIR / name
+    keys, columns, dtype = _schema(name, columns)
+    start, end = years if years is not None else (None, None)
+    wanted = None if entities is None else set(entities)
+
+    reader = pd.read_csv(src, usecols=keys + list(columns), dtype=dtype, chunksize=chunksize)
+    for chunk in reader:
+        mask = np.ones(len(chunk), dtype=bool)
+        if start is not None:
+            mask &= chunk['Year'].to_numpy() >= start
+        if end is not None:
+            mask &= chunk['Year'].to_numpy() <= end
+        if wanted is not None:
+            # confronto sulle sole categorie del blocco, non riga per riga
+            cats = chunk['Entity'].cat.categories
+            mask &= np.isin(chunk['Entity'].cat.codes.to_numpy(),
+                            np.flatnonzero(cats.isin(wanted)))
+        if mask.any():
+            yield chunk[mask]
+
+
+def read_filtered(name, columns=None, years=None, entities=None, chunksize=CHUNKSIZE):
+    """Come iter_chunks ma restituisce un unico DataFrame compatto."""
+    chunks = list(iter_chunks(name, columns, years, entities, chunksize))
+    if not chunks:
+        return next(iter_chunks(name, columns, chunksize=1)).iloc[:0]
+    out = {}
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            out[col] = union_categoricals([c[col] for c in chunks]).remove_unused_categories()
+        else:
+            out[col] = np.concatenate([c[col].to_numpy() for c in chunks])
+    return pd.DataFrame(out)
+
+
+def read_tail(name, offset, columns=None):
+    """Righe del CSV `name` che iniziano dal byte `offset` (inizio di una riga).
+
+    Legge solo l'intestazione e i byte dopo `offset`, con gli stessi tipi di
+    iter_chunks: serve a chi sa che il file è cresciuto solo in coda.
+    """
+    keys, columns, dtype = _schema(name, columns)
+    with open(DATA_DIR / name, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read()
+    return pd.read_csv(io.BytesIO(header + tail), usecols=keys + columns, dtype=dtype)
+
+
+def warm():
+    """Converte in anticipo tutti i CSV di data/."""
+    for src in sorted(DATA_DIR.glob('*.csv')):
+        df = load(src.name)
+        print(f"{src.name:50} {len(df):>7} righe → {BINARY_FORMAT}")
+
+
+if __name__ == '__main__':
+    warm()
@@ -0,0 +1,225 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import cache_key, code_version
+from instrument import stage
+from owid_store import CACHE_DIR, load, read_filtered
+from query import Query
+
+# === PANNELLO (Entity, Year) CON ARRAY DENSI ===
+# Ogni metrica è una matrice entità × anno (float64, NaN dove manca il dato).
+# Le entità sono mappate su ID interi, gli anni su offset dal primo anno:
+# i join su ['Entity', 'Year'] diventano semplici indicizzazioni di array.
+# Le matrici sono esportate una volta in .owid_cache/panel/<metrica>.npy e
+# riaperte in sola lettura con np.load(mmap_mode='r'): script e processi worker
+# condividono le stesse pagine di memoria invece di rileggere ognuno i CSV.
+
+# metrica → (file, colonna del valore)
+METRICS = {
+    'co2': ('annual-co2-emissions-per-country.csv', 'Annual CO₂ emissions'),
+    'population': ('population.csv', 'Population (historical)'),
+    'gdp_per_capita': ('gdp-per-capita-maddison.csv', 'GDP per capita'),
+    'co2_per_capita': ('co2-emissions-per-capita.csv', 'Annual CO₂ emissions (per capita)'),
+    'ghg': ('total-ghg-emissions.csv', 'Annual greenhouse gas emissions in CO₂ equivalents'),
+    'coal': ('co2-by-source.csv', 'Annual CO₂ emissions from coal'),
+    'oil': ('co2-by-source.csv', 'Annual CO₂ emissions from oil'),
+    'gas': ('co2-by-source.csv', 'Annual CO₂ emissions from gas'),
+    'cement': ('co2-by-source.csv', 'Annual CO₂ emissions from cement'),
+    'flaring': ('co2-by-source.csv', 'Annual CO₂ emissions from flaring'),
+    'other_industry': ('co2-by-source.csv', 'Annual CO₂ emissions from other industry'),
+    'temperature': ('temperature-anomaly.csv', 'Global average temperature anomaly relative to 1861-1890'),
+    'temperature_lower': ('temperature-anomaly.csv',
+                          'Lower bound of the annual temperature anomaly (95% confidence interval)'),
+    'temperature_upper': ('temperature-anomaly.csv',
+                          'Upper bound of the annual temperature anomaly (95% confidence interval)'),
+}
+# nome della fonte nei grafici → metrica del pannello
+FUEL_METRICS = {'Coal': 'coal', 'Oil': 'oil', 'Gas': 'gas', 'Cement': 'cement',
+                'Flaring': 'flaring', 'Other industry': 'other_industry'}
+
+SOURCES = sorted({f for f, _ in METRICS.values()})
+
+# Nessuna analisi usa anni precedenti al 1750 (population.csv parte dal -10000)
+START_YEAR = 1750
+MMAP_DIR = CACHE_DIR / 'panel'
+
+
+class Panel:
+
+    def __init__(self, entities, codes, years, metrics):
+        self.entities = list(entities)
+        self.codes = list(codes)
+        self.entity_id = {e: i for i, e in enumerate(self.entities)}
+        self.years = np.asarray(years)
+        self.year0 = int(self.years[0])
+        self.metrics = metrics
+
+    def __repr__(self):
+        return (f"Panel({len(self.entities)} entità × {len(self.years)} anni "
+                f"{self.years[0]}–{self.years[-1]}, metriche: {', '.join(self.metrics)})")
+
+    # --- indici ---
+    def ids(self, entities=None):
+        if entities is None:
+            return np.arange(len(self.entities))
+        if isinstance(entities, str):
+            entities = [entities]
+        return np.array([self.entity_id[e] for e in entities], dtype=np.intp)
+
+    def year_slice(self, years=None):
+        if years is None:
+            return slice(None)
+        start, end = years
+        lo = 0 if start is None else max(int(start) - self.year0, 0)
+        hi = len(self.years) if end is None else max(int(end) - self.year0 + 1, 0)
+        return slice(lo, hi)
+
+    # --- accesso ---
+    def get(self, metric, entities=None, years=None):
+        """Matrice entità × anno per `metric`, ristretta a entità e finestra di anni."""
+        return self.metrics[metric][self.ids(entities)][:, self.year_slice(years)]
+
+    def series(self, metric, entity, years=None):
+        return self.metrics[metric][self.entity_id[entity], self.year_slice(years)]
+
+    def last_valid(self, metric, entity, years=None):
+        """(anno, valore) dell'ultimo dato disponibile, o (None, nan)."""
+        s = self.series(metric, entity, years)
+        valid = np.flatnonzero(~np.isnan(s))
+        if len(valid) == 0:
+            return None, np.nan
+        yrs = self.years[self.year_slice(years)]
+        return int(yrs[valid[-1]]), s[valid[-1]]
+
+    def select(self, *metrics):
+        """Query lazy sulle metriche indicate (vedi query.py)."""
+        return Query(self).select(*metrics)
+
+    def frame(self, metrics, entities=None, years=None, require=None):
+        """Tabella lunga Entity/Year/metriche, come il vecchio merge su ['Entity', 'Year'].
+
+        Tiene le righe in cui tutte le metriche di `require` sono presenti
+        (di default: almeno una metrica presente).
+        """
+        if isinstance(metrics, str):
+            metrics = [metrics]
+        q = self.select(*metrics).where(entities=entities, years=years)
+        if require is not None:
+            q = q.dropna(*([require] if isinstance(require, str) else require))
+        return q.collect()
+
+
+def build_panel(metrics=None, start_year=START_YEAR, entities=None, streaming=False):
+    """Costruisce il pannello leggendo i CSV una volta sola tramite owid_store.
+
+    Con `streaming=True` i CSV sono letti a blocchi (solo la colonna della
+    metrica, anni >= start_year ed eventuali `entities`), per file troppo
+    grandi da tenere interi in memoria.
+    """
+    metrics = list(METRICS) if metrics is None else metrics
+    frames = {}
+    for m in metrics:
+        name, col = METRICS[m]
+        if streaming:
+            df = read_filtered(name, columns=[col], years=(start_year, None), entities=entities)
+            df['Entity'] = df['Entity'].astype(str)
+        else:
+            df = load(name)
+            df = df[df['Year'] >= start_year]
+            if entities is not None:
+                df = df[df['Entity'].isin(entities)]
+        frames[m] = df
+
+    # Asse entità: unione ordinata; codice ISO dal primo file che lo riporta
+    codes = {}
+    for df in frames.values():
+        if 'Code' in df.columns:
+            first = df.drop_duplicates('Entity')
+            for e, c in zip(first['Entity'], first['Code'].astype(object)):
+                if e not in codes or (pd.isna(codes[e]) and not pd.isna(c)):
+                    codes[e] = c
+        for e in df['Entity'].unique():
+            codes.setdefault(e, np.nan)
+    entities = sorted(codes)
+
+    # Asse anni contiguo: offset = anno - primo anno
+    last_year = max(int(df['Year'].max()) for df in frames.values())
+    years = np.arange(start_year, last_year + 1)
+
+    arrays = {}
+    for m, df in frames.items():
+        arr = np.full((len(entities), len(years)), np.nan)
+        rows = pd.Categorical(df['Entity'], categories=entities).codes
+        arr[rows, df['Year'].to_numpy() - start_year] = df[METRICS[m][1]].to_numpy(dtype=float)
+        arrays[m] = arr
+
+    return Panel(entities, [codes[e] for e in entities], years, arrays)
+
+
+# === ARRAY IN MEMORY-MAP ===
+
+def mmap_key(start_year=START_YEAR):
+    # cambia se cambiano i CSV sorgente o questo file
+    return cache_key('panel_mmap', SOURCES, {'start_year': start_year}, code_version(__file__))
+
+
+def export_mmap(panel, out_dir=MMAP_DIR, key=None):
+    """Scrive una .npy per metrica e panel.json con gli assi entità/anni."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    pid = os.getpid()
+    for m, arr in panel.metrics.items():
+        tmp = out_dir / f'{m}.{pid}.tmp.npy'
+        np.save(tmp, np.ascontiguousarray(arr, dtype=float))
+        tmp.replace(out_dir / f'{m}.npy')
+    meta = {
+        'key': key,
+        'entities': panel.entities,
+        'codes': [None if pd.isna(c) else c for c in panel.codes],
+        'years': [int(panel.years[0]), int(panel.years[-1])],
+        'metrics': list(panel.metrics),
+    }
+    # il sidecar è scritto per ultimo: chi lo legge trova tutte le matrici
+    tmp = out_dir / f'panel.{pid}.tmp'
+    tmp.write_text(json.dumps(meta, ensure_ascii=False))
+    tmp.replace(out_dir / 'panel.json')
+
+
+def open_mmap(path=MMAP_DIR, key=None):
+    """Pannello in sola lettura senza copie; None se manca o se `key` non coincide."""
+    meta_path = path / 'panel.json'
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text())
+    if key is not None and meta['key'] != key:
+        return None
+    try:
+        metrics = {m: np.load(path / f'{m}.npy', mmap_mode='r') for m in meta['metrics']}
+    except FileNotFoundError:
+        return None
+    codes = [np.nan if c is None else c for c in meta['codes']]
+    years = np.arange(meta['years'][0], meta['years'][1] + 1)
+    return Panel(meta['entities'], codes, years, metrics)
+
+
+_panel = None
+
+
+def load_panel():
+    """Pannello condiviso del processo: memory-map da .owid_cache/panel/,
+    esportato alla prima chiamata o quando cambiano i CSV."""
+    global _panel
+    if _panel is None:
+        key = mmap_key()
+        _panel = open_mmap(key=key)
+        if _panel is None:
+            with stage('build_panel'):
+                export_mmap(build_panel(), key=key)
+            _panel = open_mmap(key=key)
+    return _panel
+
+
+if __name__ == '__main__':
+    print(load_panel())
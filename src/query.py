@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+# === QUERY LAZY SUL PANNELLO ===
+# panel.select('co2', 'population').where(entities=..., years=(1990, 2023)).per_capita()
+# costruisce solo un piano; collect() lo esegue in un unico passaggio:
+#   - proiezione: si leggono solo le matrici delle metriche usate (selezionate o
+#     richieste dalle colonne derivate); con il pannello in memory-map le altre
+#     non vengono mai toccate
+#   - predicati: entità (o livello della gerarchia) e finestra di anni diventano
+#     un unico indice righe × slice applicato alle matrici prima di tutto il resto
+#   - buchi delle serie sparse riempiti (alignment.py) sulle righe intere, prima
+#     della finestra di anni, con una colonna <metrica>_filled che segna le celle stimate
+#   - colonne derivate calcolate sulle matrici già ridotte, poi dropna e rename
+# Sostituisce negli script la catena read → rename → isin → merge → anni → dropna.
+
+
+class Query:
+
+    def __init__(self, panel, metrics=(), entities=None, years=None, level=None,
+                 derived=(), require=None, names=None, fills=None):
+        self.panel = panel
+        self.metrics = tuple(metrics)
+        self.entities = entities
+        self.years = years
+        self.level = level
+        self.derived = tuple(derived)      # (nome, operazione, (a, b), scala)
+        self.require = require             # None: almeno una colonna; tupla: tutte quelle indicate
+        self.names = dict(names or {})
+        self.fills = dict(fills or {})     # metrica → (metodo, max_gap)
+
+    def _with(self, **changes):
+        return Query(**{**vars(self), **changes})
+
+    def __repr__(self):
+        return 'Query(\n  ' + '\n  '.join(self.explain()) + '\n)'
+
+    # --- costruzione del piano ---
+    def select(self, *metrics):
+        unknown = [m for m in metrics if m not in self.panel.metrics]
+        if unknown:
+            raise KeyError(f"metriche sconosciute: {', '.join(unknown)}")
+        return self._with(metrics=self.metrics + tuple(m for m in metrics if m not in self.metrics))
+
+    def where(self, entities=None, years=None, level=None):
+        """Filtra per entità, finestra di anni (inizio, fine) e livello ('country', ...)."""
+        if isinstance(entities, str):
+            entities = [entities]
+        if entities is not None and self.entities is not None:
+            wanted = set(entities)
+            entities = [e for e in self.entities if e in wanted]
+        if years is not None and self.years is not None:
+            starts = [y for y in (years[0], self.years[0]) if y is not None]
+            ends = [y for y in (years[1], self.years[1]) if y is not None]
+            years = (max(starts) if starts else None, min(ends) if ends else None)
+        return self._with(entities=self.entities if entities is None else list(entities),
+                          years=self.years if years is None else tuple(years),
+                          level=self.level if level is None else level)
+
+    def fill(self, *metrics, method='linear', max_gap=None):
+        """Riempie i buchi di `metrics` (vedi alignment.fill_gaps) prima di filtri e derivate."""
+        unknown = [m for m in metrics if m not in self.panel.metrics]
+        if unknown:
+            raise KeyError(f"metriche sconosciute: {', '.join(unknown)}")
+        return self._with(fills={**self.fills, **{m: (method, max_gap) for m in metrics}})
+
+    def _derive(self, name, op, a, b, scale):
+        return self._with(derived=self.derived + ((name, op, (a, b), scale),))
+
+    def per_capita(self, metric='co2', population='population', name=None, scale=1.0):
+        return self._derive(name or f'{metric}_per_capita', 'div', metric, population, scale)
+
+    def total(self, metric, population='population', name=None, scale=1.0):
+        """Valore totale da una metrica pro capite (es. PIL pro capite × popolazione)."""
+        return self._derive(name or f'{metric}_total', 'mul', metric, population, scale)
+
+    def ratio(self, numerator, denominator, name=None, scale=1.0):
+        return self._derive(name or f'{numerator}_per_{denominator}', 'div', numerator, denominator, scale)
+
+    def dropna(self, *columns):
+        """Tiene le righe in cui `columns` (di default tutte le colonne) sono presenti."""
+        return self._with(require=tuple(columns) if columns else tuple(self.columns))
+
+    def rename(self, mapping=None, **names):
+        return self._with(names={**self.names, **(mapping or {}), **names})
+
+    # --- piano ---
+    @property
+    def columns(self):
+        return list(self.metrics) + [d[0] for d in self.derived]
+
+    @property
+    def inputs(self):
+        """Metriche del pannello effettivamente lette (proiezione)."""
+        produced = {d[0] for d in self.derived}
+        needed = list(self.metrics)
+        for _, _, args, _ in self.derived:
+            needed += [a for a in args if a not in produced and a not in needed]
+        return needed
+
+    def explain(self):
+        steps = [f"leggi: {', '.join(self.inputs)}"]
+        for m, (method, max_gap) in self.fills.items():
+            steps.append(f"riempi {m}: {method}" + (f", buchi fino a {max_gap} anni" if max_gap is not None else ''))
+        if self.level is not None:
+            steps.append(f"livello: {self.level}")
+        if self.entities is not None:
+            steps.append(f"entità: {len(self.entities)}")
+        if self.years is not None:
+            steps.append(f"anni: {self.years[0]}–{self.years[1]}")
+        for name, op, (a, b), scale in self.derived:
+            sym = '/' if op == 'div' else '×'
+            steps.append(f"{name} = {a} {sym} {b}" + (f" × {scale:g}" if scale != 1 else ''))
+        if self.require is not None:
+            steps.append(f"dropna: {', '.join(self.require)}")
+        if self.names:
+            steps.append('rinomina: ' + ', '.join(f'{a} → {b}' for a, b in self.names.items()))
+        return steps
+
+    # --- esecuzione ---
+    def _entity_ids(self):
+        entities = self.entities
+        if self.level is not None:
+            from hierarchy import load_hierarchy
+            at_level = load_hierarchy().entities_at(self.level)
+            if entities is None:
+                entities = at_level
+            else:
+                wanted = set(at_level)
+                entities = [e for e in entities if e in wanted]
+        return self.panel.ids(entities)
+
+    def _evaluate(self):
+        p = self.panel
+        ids = self._entity_ids()
+        ys = p.year_slice(self.years)
+        mats, masks = {}, {}
+        for m in self.inputs:
+            if m in self.fills:
+                from alignment import fill_gaps
+                filled, mask = fill_gaps(p.metrics[m][ids], *self.fills[m])
+                mats[m], masks[m] = filled[:, ys], mask[:, ys]
+            else:
+                mats[m] = np.asarray(p.metrics[m][ids, ys])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name, op, (a, b), scale in self.derived:
+                value = mats[a] / mats[b] if op == 'div' else mats[a] * mats[b]
+                mats[name] = value * scale if scale != 1 else value
+        return ids, p.years[ys], mats, masks
+
+    def collect(self):
+        """Tabella lunga Entity / Year / colonne, ordinata per entità e anno."""
+        ids, yrs, mats, masks = self._evaluate()
+        cols = {c: mats[c].ravel() for c in self.columns}
+        n = len(ids) * len(yrs)
+        if self.require is None:
+            keep = np.zeros(n, dtype=bool)
+            for c in cols.values():
+                keep |= ~np.isnan(c)
+        else:
+            keep = np.ones(n, dtype=bool)
+            for c in self.require:
+                keep &= ~np.isnan(cols[c])
+
+        names = np.array(self.panel.entities, dtype=object)[ids]
+        out = pd.DataFrame({'Entity': np.repeat(names, len(yrs))[keep],
+                            'Year': np.tile(yrs, len(ids))[keep]})
+        for c, values in cols.items():
+            out[self.names.get(c, c)] = values[keep]
+        for m, mask in masks.items():
+            out[self.names.get(m, m) + '_filled'] = mask.ravel()[keep]
+        return out
+
+    def wide(self, column):
+        """Matrice entità × anno di una colonna (selezionata o derivata)."""
+        ids, yrs, mats, _ = self._evaluate()
+        return pd.DataFrame(mats[column], columns=pd.Index(yrs, name='Year'),
+                            index=pd.Index(np.array(self.panel.entities, dtype=object)[ids], name='Entity'))
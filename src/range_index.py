@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+import panel
+from cache import memoize
+from panel import FUEL_METRICS, load_panel
+
+# === INDICE A SOMME PREFISSE PER FINESTRE DI ANNI ===
+# "Emissioni cumulative di X tra l'anno A e l'anno B" per qualsiasi A, B:
+#   prefix[m, e, k] = Σ valori osservati di m per l'entità e negli anni < year0 + k
+#   count[m, e, k]  = numero di anni osservati negli stessi anni
+# La somma su [A, B] è prefix[B + 1] - prefix[A] (due letture, O(1)); il conteggio
+# dice quanti anni della finestra hanno davvero un dato. Gli anni mancanti non
+# sono mai sommati come zero senza dirlo; `missing` decide cosa fare:
+#   'strict'   → NaN se nella finestra manca anche un solo anno (default)
+#   'observed' → somma degli anni presenti (la copertura è nella colonna Years_observed)
+#   'raise'    → ValueError
+# Anni della finestra fuori dal pannello contano come mancanti.
+# Pro capite sulla finestra: somma delle emissioni / popolazione media degli
+# stessi anni (tonnellate per persona nel periodo, come nel debito climatico).
+
+METRICS = ['co2', 'ghg', 'population', *FUEL_METRICS.values()]
+MISSING = ('strict', 'observed', 'raise')
+
+
+class RangeIndex:
+
+    def __init__(self, entities, years, metrics, prefix, count):
+        self.entities = entities
+        self.entity_id = {e: i for i, e in enumerate(entities)}
+        self.years = years
+        self.year0 = int(years[0])
+        self.metrics = list(metrics)
+        self.metric_id = {m: i for i, m in enumerate(self.metrics)}
+        self.prefix = prefix    # metrica × entità × (anni + 1), float64
+        self.count = count      # metrica × entità × (anni + 1), int16
+
+    def __repr__(self):
+        return (f"RangeIndex({len(self.entities)} entità × {len(self.years)} anni "
+                f"{self.years[0]}–{self.years[-1]}, metriche: {', '.join(self.metrics)})")
+
+    def _bounds(self, start, end):
+        start, end = np.asarray(start, dtype=np.int64), np.asarray(end, dtype=np.int64)
+        if np.any(end < start):
+            raise ValueError("finestra con fine precedente all'inizio")
+        n = len(self.years)
+        lo = np.clip(start - self.year0, 0, n)
+        hi = np.clip(end - self.year0 + 1, 0, n)
+        return lo, np.maximum(hi, lo), end - start + 1
+
+    def _ids(self, entities):
+        if isinstance(entities, str):
+            entities = [entities]
+        return np.array([self.entity_id[e] for e in entities], dtype=np.intp)
+
+    def window(self, metric, entities, start, end, missing='strict'):
+        """Somme su [start, end] (inclusi) per entità; start/end scalari o array.
+
+        Restituisce (somma, anni osservati, anni della finestra), array della
+        lunghezza comune di entities/start/end.
+        """
+        if missing not in MISSING:
+            raise ValueError(f"missing deve essere uno di {MISSING}")
+        ids, start, end = np.broadcast_arrays(self._ids(entities), start, end)
+        lo, hi, span = self._bounds(start, end)
+        m = self.metric_id[metric]
+        total = self.prefix[m, ids, hi] - self.prefix[m, ids, lo]
+        observed = self.count[m, ids, hi].astype(np.int64) - self.count[m, ids, lo]
+        incomplete = observed < span
+        if missing == 'raise' and incomplete.any():
+            bad = [self.entities[i] for i in np.unique(ids[incomplete])]
+            raise ValueError(f"{metric}: anni mancanti nella finestra per {', '.join(bad[:5])}"
+                             + (' ...' if len(bad) > 5 else ''))
+        if missing == 'strict':
+            total = np.where(incomplete, np.nan, total)
+        else:
+            total = np.where(observed > 0, total, np.nan)
+        return total, observed, span
+
+    def per_capita(self, metric, entities, start, end, missing='strict', population='population'):
+        """Somma di `metric` su [start, end] / popolazione media degli stessi anni."""
+        total, observed, span = self.window(metric, entities, start, end, missing)
+        pop, pop_observed, _ = self.window(population, entities, start, end, missing)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return total / (pop / pop_observed)
+
+    def query(self, metrics, entities, start, end, missing='strict', per_capita=False):
+        """Tabella Entity / Start / End / somme (e pro capite) per una o più finestre."""
+        if isinstance(metrics, str):
+            metrics = [metrics]
+        if isinstance(entities, str):
+            entities = [entities]
+        names, start, end = np.broadcast_arrays(np.array(entities, dtype=object), start, end)
+        out = pd.DataFrame({'Entity': names, 'Start': start, 'End': end})
+        for metric in metrics:
+            total, observed, span = self.window(metric, names, start, end, missing)
+            out[metric] = total
+            out[f'{metric}_years_observed'] = observed
+            if per_capita:
+                out[f'{metric}_per_capita'] = self.per_capita(metric, names, start, end, missing)
+        out['Years'] = end - start + 1
+        return out
+
+
+@memoize(sources=panel.SOURCES)
+def build_index(metrics=tuple(METRICS)):
+    p = load_panel()
+    n_e, n_y = len(p.entities), len(p.years)
+    prefix = np.zeros((len(metrics), n_e, n_y + 1))
+    count = np.zeros((len(metrics), n_e, n_y + 1), dtype=np.int16)
+    for i, m in enumerate(metrics):
+        values = np.asarray(p.metrics[m])
+        present = ~np.isnan(values)
+        np.cumsum(np.where(present, values, 0.0), axis=1, out=prefix[i, :, 1:])
+        np.cumsum(present, axis=1, out=count[i, :, 1:])
+    return RangeIndex(p.entities, p.years, metrics, prefix, count)
+
+
+if __name__ == '__main__':
+    import time
+    t0 = time.perf_counter()
+    index = build_index.__wrapped__()
+    print(f"{index} costruito in {time.perf_counter() - t0:.3f} s, "
+          f"{(index.prefix.nbytes + index.count.nbytes) / 1e6:.1f} MB")
+
+    entities = ['World', 'United States', 'China', 'India', 'Italy']
+    for start in (1750, 1850):
+        table = index.query('co2', entities, start, 2023, missing='observed', per_capita=True)
+        table['co2'] /= 1e9
+        print(f"\nCO₂ cumulato {start}–2023 (Gt, t per persona, anni con dati):")
+        print(table[['Entity', 'co2', 'co2_per_capita', 'co2_years_observed', 'Years']].round(1).to_string(index=False))
+
+    n = 100_000
+    rng = np.random.default_rng(0)
+    starts = rng.integers(1850, 2000, n)
+    names = np.array(index.entities, dtype=object)[rng.integers(0, len(index.entities), n)]
+    t0 = time.perf_counter()
+    index.window('co2', names, starts, starts + 20, missing='observed')
+    print(f"\n{n} finestre in {time.perf_counter() - t0:.3f} s")
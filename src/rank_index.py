@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+import debt_engine
+import fuel_attribution
+import hierarchy
+import panel
+from cache import memoize
+from debt_engine import POP_FFILL_YEARS, _ffill, year_offset
+
+# === INDICE DELLE CLASSIFICHE PER ANNO ===
+# Per ogni misura (emissioni annuali, cumulate, pro capite, debito climatico,
+# quota cumulata di ogni fonte) e ogni anno, i paesi in ordine decrescente:
+#   order[k, t] = paese al posto k+1 nell'anno t    (int16, un argsort per colonna)
+#   rank[e, t]  = posizione del paese e nell'anno t (int16, 1 = primo, 0 = senza dato)
+# Gli anni senza dato non entrano in classifica (finiscono in fondo a order).
+# "Posizione dell'Italia nel 1950" è una lettura; "top 10 di ogni anno
+# 1900–2024" è una fetta order[:10, anni], senza riordinare nulla.
+
+MEASURES = ['co2', 'cumulative', 'per_capita', 'debt',
+            *[f'share_{m}' for m in panel.FUEL_METRICS.values()]]
+NO_RANK = 0
+
+
+def _measures(h, ids):
+    """(anni, misure): gli anni si fermano all'ultimo con emissioni osservate."""
+    p = h.panel
+    debt = debt_engine.compute_debt(p, first_cutoff=p.year0)
+    ys = slice(0, len(debt.years))
+    co2 = np.asarray(p.metrics['co2'][ids][:, ys])
+    pop = _ffill(np.asarray(p.metrics['population'][ids]), limit=POP_FFILL_YEARS)[:, ys]
+    fa = fuel_attribution.compute_attribution()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = {
+            'co2': co2,
+            'cumulative': debt.cumulative[ids],
+            'per_capita': co2 / pop,
+            'debt': debt.debt[ids],
+        }
+        for j, fuel in enumerate(fa.fuels):
+            out[f'share_{panel.FUEL_METRICS[fuel]}'] = fa.cumulative[ids, ys, j] / fa.total[ids, ys]
+    return debt.years, out
+
+
+class RankIndex:
+
+    def __init__(self, entities, years, values, order, rank):
+        self.entities = entities
+        self.entity_id = {e: i for i, e in enumerate(entities)}
+        self.years = years
+        self.year0 = int(years[0])
+        self.values = values    # misura → paese × anno (float64)
+        self.order = order      # misura → posto × anno (int16)
+        self.rank = rank        # misura → paese × anno (int16)
+
+    def __repr__(self):
+        return (f"RankIndex({len(self.entities)} paesi × {len(self.years)} anni, "
+                f"misure: {', '.join(self.values)})")
+
+    def _t(self, years):
+        t = np.asarray(years, dtype=np.int64) - self.year0
+        if np.any((t < 0) | (t >= len(self.years))):
+            raise KeyError(f"anni fuori dall'intervallo {self.years[0]}–{self.years[-1]}")
+        return t
+
+    def rank_of(self, measure, entity, year):
+        """Posizione (1 = primo) di `entity` nell'anno `year`, None se senza dato."""
+        r = int(self.rank[measure][self.entity_id[entity], year_offset(self.years, year)])
+        return r if r != NO_RANK else None
+
+    def ranks(self, measure, entities, years):
+        """Posizioni per coppie (entità, anno) con broadcast; 0 = senza dato."""
+        names = np.asarray(entities, dtype=object)
+        ids = np.array([self.entity_id[e] for e in names.ravel()], dtype=np.intp).reshape(names.shape)
+        ids, t = np.broadcast_arrays(ids, self._t(years))
+        return self.rank[measure][ids, t]
+
+    def history(self, measure, entity):
+        """Posizione di `entity` anno per anno (solo anni con dato)."""
+        r = pd.Series(self.rank[measure][self.entity_id[entity]], index=pd.Index(self.years, name='Year'))
+        return r[r != NO_RANK].astype('int16')
+
+    def top(self, measure, year, n=10):
+        return self.top_by_year(measure, n, (year, year)).drop(columns='Year')
+
+    def top_by_year(self, measure, n=10, years=None):
+        """Primi `n` di ogni anno della finestra: Year, Rank, Entity, Value."""
+        lo, hi = (self.years[0], self.years[-1]) if years is None else years
+        t = np.arange(max(int(lo), self.year0), min(int(hi), int(self.years[-1])) + 1) - self.year0
+        top = self.order[measure][:n][:, t]                       # n × anni
+        values = self.values[measure][top, t]
+        out = pd.DataFrame({
+            'Year': np.tile(self.years[t], len(top)),
+            'Rank': np.repeat(np.arange(1, len(top) + 1, dtype=np.int16), len(t)),
+            'Entity': np.array(self.entities, dtype=object)[top.ravel()],
+            'Value': values.ravel(),
+        })
+        out = out[out['Value'].notna()]
+        return out.sort_values(['Year', 'Rank'], kind='stable', ignore_index=True)
+
+
+def rank_matrix(values):
+    """(order, rank) int16 di una matrice paese × anno, valori maggiori primi."""
+    n = len(values)
+    if n > np.iinfo(np.int16).max:
+        raise ValueError(f"{n} entità: troppe per posizioni int16")
+    missing = np.isnan(values)
+    key = np.where(missing, -np.inf, values)
+    order = np.argsort(-key, axis=0, kind='stable').astype(np.int16)
+    rank = np.empty_like(order)
+    positions = np.broadcast_to(np.arange(1, n + 1, dtype=np.int16)[:, None], order.shape)
+    np.put_along_axis(rank, order.astype(np.intp), positions, axis=0)
+    rank[missing] = NO_RANK
+    return order, rank
+
+
+@memoize(sources=panel.SOURCES)
+def build_rank_index(level='country'):
+    h = hierarchy.load_hierarchy()
+    entities = h.entities_at(level)
+    ids = h.panel.ids(entities)
+    years, values = _measures(h, ids)
+    order, rank = {}, {}
+    for m, v in values.items():
+        order[m], rank[m] = rank_matrix(v)
+    return RankIndex(list(entities), years, values, order, rank)
+
+
+if __name__ == '__main__':
+    import time
+    t0 = time.perf_counter()
+    index = build_rank_index.__wrapped__()
+    size = sum(o.nbytes + r.nbytes for o, r in zip(index.order.values(), index.rank.values()))
+    print(f"{index} in {time.perf_counter() - t0:.3f} s, posizioni: {size / 1e6:.1f} MB")
+    for m in ('co2', 'per_capita', 'debt'):
+        print(f"Italia nel 1950, {m}: {index.rank_of(m, 'Italy', 1950)}°")
+    t0 = time.perf_counter()
+    race = index.top_by_year('cumulative', 10, (1900, 2024))
+    print(f"top 10 cumulate 1900–2024: {len(race)} righe in {(time.perf_counter() - t0) * 1e3:.1f} ms")
+    print(index.top('share_coal', 2023, 5).round(3).to_string(index=False))
@@ -0,0 +1,184 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import runpy
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# === RENDER DI TUTTI I GRAFICI SENZA DISPLAY ===
+# Ogni script viene eseguito in un processo separato con backend Agg;
+# plt.show() è sostituito da un salvataggio in results/ nei formati richiesti.
+# Alla fine viene stampato il tempo di ogni grafico (il più lento in cima).
+# Un grafico già presente in results/ viene riusato se non sono cambiati né
+# lo script, né i moduli condivisi, né i CSV da cui dipende, né DPI/formati.
+# Con --stages si vedono anche le fasi di ogni script (load, compute, plot, save).
+
+SRC_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = SRC_DIR.parent / 'results'
+
+# figura → (script, nome del file in results/)
+FIGURES = {
+    'climate_debt': ('climate_debt.py', 'climate_debt'),
+    'decoupling': ('emissions_country.py', 'emitionscountry'),
+    'decoupling_focus': ('less_emissions.py', 'lessemitionscountry'),
+    'fuel': ('fuel.py', 'fuel+legend'),
+    'statdesc': ('stat_descrittive.py', 'statdesc'),
+    'tcre': ('tcre.py', 'tcre'),
+    'trajectory': ('trajectory.py', 'trajectoryless'),
+}
+
+# CSV letti da ogni grafico
+PANEL_FILES = ['annual-co2-emissions-per-country.csv', 'population.csv',
+               'gdp-per-capita-maddison.csv', 'co2-emissions-per-capita.csv',
+               'total-ghg-emissions.csv', 'co2-by-source.csv', 'temperature-anomaly.csv']
+FIGURE_SOURCES = {
+    'climate_debt': PANEL_FILES,
+    'decoupling': PANEL_FILES,
+    'decoupling_focus': PANEL_FILES,
+    'fuel': PANEL_FILES,
+    'statdesc': ['co2-by-source.csv', 'co2-emissions-by-fuel-line.csv', 'total-ghg-emissions.csv',
+                 'co2-emissions-per-capita.csv', 'annual-co-emissions-by-region.csv',
+                 'annual-co2-emissions-per-country.csv', 'temperature-anomaly.csv'],
+    'tcre': PANEL_FILES,
+    'trajectory': PANEL_FILES,
+}
+
+
+def figure_key(figure, formats, dpi):
+    from cache import cache_key, code_version
+
+    scripts = {script for script, _ in FIGURES.values()}
+    shared = sorted(p for p in SRC_DIR.glob('*.py') if p.name not in scripts)
+    version = code_version(SRC_DIR / FIGURES[figure][0], *shared)
+    return cache_key(figure, FIGURE_SOURCES[figure], {'formats': sorted(formats), 'dpi': dpi}, version)
+
+
+def _manifest_path():
+    from owid_store import CACHE_DIR
+    return CACHE_DIR / 'render_manifest.json'
+
+
+def render(figure, out_dir=RESULTS_DIR, formats=('png',), dpi=150, force=False):
+    """Esegue lo script di `figure` e salva i grafici; restituisce i tempi."""
+    if str(SRC_DIR) not in sys.path:
+        sys.path.insert(0, str(SRC_DIR))
+    out_dir = Path(out_dir)
+    key = figure_key(figure, formats, dpi)
+    manifest = _manifest_path()
+    entries = json.loads(manifest.read_text()) if manifest.exists() else {}
+    entry = entries.get(str(out_dir.resolve() / figure))
+    if (not force and entry and entry['key'] == key
+            and all((out_dir / name).exists() for name in entry['files'])):
+        return {'figure': figure, 'wall_s': 0.0, 'cpu_s': 0.0, 'save_s': 0.0,
+                'files': entry['files'], 'stdout': '', 'cached': True, 'key': key}
+
+    import instrument
+    os.environ['MPLBACKEND'] = 'Agg'
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    script, stem = FIGURES[figure]
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    written = []
+    timings = {'save': 0.0}
+
+    def save_and_close(*args, **kwargs):
+        instrument.end()    # chiude la fase aperta dallo script (di solito 'plot')
+        if not plt.get_fignums():
+            return
+        t0 = time.perf_counter()
+        with instrument.stage('save'):
+            for n, num in enumerate(plt.get_fignums()):
+                fig = plt.figure(num)
+                name = stem if n == 0 else f'{stem}_{n + 1}'
+                for fmt in formats:
+                    path = out_dir / f'{name}.{fmt}'
+                    fig.savefig(path, dpi=dpi, bbox_inches='tight', facecolor='white')
+                    written.append(path.name)
+            plt.close('all')
+        timings['save'] += time.perf_counter() - t0
+
+    plt.show = save_and_close
+    instrument.reset()
+    instrument.label = Path(script).stem
+    log = io.StringIO()
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    with contextlib.redirect_stdout(log):
+        runpy.run_path(str(SRC_DIR / script), run_name='__main__')
+    save_and_close()   # figure rimaste aperte senza plt.show()
+    return {
+        'figure': figure,
+        'wall_s': time.perf_counter() - t0,
+        'cpu_s': time.process_time() - cpu0,
+        'save_s': timings['save'],
+        'files': written,
+        'stdout': log.getvalue(),
+        'cached': False,
+        'key': key,
+        'stages': list(instrument.records),
+    }
+
+
+def render_all(figures=None, out_dir=RESULTS_DIR, formats=('png',), dpi=150, jobs=None, force=False):
+    figures = list(FIGURES) if figures is None else figures
+    results = []
+    # un processo nuovo per ogni grafico: stile e figure di uno script
+    # (plt.style.use, sns.set_theme, ...) non arrivano al successivo
+    with ProcessPoolExecutor(max_workers=jobs or min(len(figures), os.cpu_count()),
+                             max_tasks_per_child=1) as pool:
+        futures = {pool.submit(render, f, out_dir, tuple(formats), dpi, force): f for f in figures}
+        for fut in as_completed(futures):
+            results.append(fut.result())
+
+    # manifest aggiornato solo dal processo principale (niente scritture concorrenti)
+    manifest = _manifest_path()
+    entries = json.loads(manifest.read_text()) if manifest.exists() else {}
+    for r in results:
+        entries[str(Path(out_dir).resolve() / r['figure'])] = {'key': r['key'], 'files': r['files']}
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    manifest.write_text(json.dumps(entries, indent=1))
+    return sorted(results, key=lambda r: r['wall_s'], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera tutti i grafici in results/ senza display.")
+    parser.add_argument('figures', nargs='*',
+                        help=f"grafici da generare (default: tutti): {', '.join(FIGURES)}")
+    parser.add_argument('--out', default=RESULTS_DIR, type=Path)
+    parser.add_argument('--formats', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'])
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--jobs', type=int, default=None, help="processi paralleli")
+    parser.add_argument('--force', action='store_true', help="rigenera anche i grafici invariati")
+    parser.add_argument('--verbose', action='store_true', help="mostra l'output a console degli script")
+    parser.add_argument('--stages', action='store_true', help="tempi e memoria per fase di ogni script")
+    args = parser.parse_args(argv)
+    unknown = set(args.figures) - set(FIGURES)
+    if unknown:
+        parser.error(f"grafici sconosciuti: {', '.join(sorted(unknown))}")
+
+    t0 = time.perf_counter()
+    results = render_all(args.figures or None, args.out, args.formats, args.dpi, args.jobs, args.force)
+    total = time.perf_counter() - t0
+
+    print(f"{'Grafico':18} {'wall (s)':>9} {'cpu (s)':>8} {'save (s)':>9}  file")
+    print('-' * 80)
+    for r in results:
+        files = ', '.join(r['files']) + (' (invariato)' if r['cached'] else '')
+        print(f"{r['figure']:18} {r['wall_s']:9.2f} {r['cpu_s']:8.2f} {r['save_s']:9.2f}  {files}")
+        if args.verbose:
+            print(r['stdout'])
+        if args.stages:
+            for s in r.get('stages', []):
+                print(f"  {s['stage']:30} {s['wall_s']:9.2f} {s['cpu_s']:8.2f}  RSS {s['rss_mb']:.0f} MB")
+    print(f"Totale (parallelo): {total:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
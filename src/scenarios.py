@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+from hierarchy import load_hierarchy
+from owid_store import CACHE_DIR
+
+# === SIMULATORE DI SCENARI 1.5°C (SCENARIO × PAESE × ANNO) ===
+# Estende la regola unica di trajectory.py a una griglia di scenari:
+#   - budget globale residuo (GtCO₂ dal 2025)
+#   - anno di zero netto
+#   - soglia di equità (t pro capite sotto cui un paese può ancora crescere)
+#   - regola di riduzione:
+#       'linear'      : lineare a zero nell'anno di zero netto
+#       'exponential' : tasso costante fino al 5% del livello iniziale, poi zero
+#       'convergence' : pro capite che converge alla media mondiale a metà
+#                       periodo, poi tutti insieme a zero (contrazione e convergenza)
+#   Con 'linear' ed 'exponential' i paesi sotto la soglia crescono del tasso
+#   `growth` fino a metà periodo e poi scendono linearmente a zero.
+# Ogni traiettoria è confrontata con il budget (cumulata dei paesi, bunker esclusi)
+# e con la quota equa di ciascun paese (budget × quota di popolazione).
+# Il budget non cambia le traiettorie (solo il confronto), e con 'convergence'
+# non contano né soglia né crescita: le traiettorie sono calcolate e salvate una
+# volta per ogni combinazione distinta (zero netto, soglia, regola, crescita);
+# ogni scenario punta alla sua (campo `pathway` di scenarios.npy).
+# I blocchi di traiettorie sono calcolati in parallelo e scritti direttamente in un
+# .npy (float32) aperto in memory-map: la lettura di uno scenario è immediata.
+
+START_YEAR = 2025
+HORIZON = 2070
+BUDGET_GT = 280
+EQUITY_THRESHOLD = 3.0
+EQUITY_GROWTH = 0.025
+RESIDUAL = 0.05
+RULES = ('linear', 'exponential', 'convergence')
+MIN_LAST_YEAR = 2020     # esclude stati storici (URSS, Jugoslavia, ...) senza dati recenti
+# paesi della tabella di trajectory.py (usati anche da cli.py trajectory)
+TRAJECTORY_COUNTRIES = [
+    'United States', 'China', 'India', 'Russia', 'Japan',
+    'Germany', 'Canada', 'United Kingdom', 'France', 'Australia',
+    'South Korea', 'Brazil', 'Indonesia', 'Saudi Arabia', 'South Africa'
+]
+CHUNK = 64
+SCENARIO_DIR = CACHE_DIR / 'scenarios'
+
+PARAMS_DTYPE = [('budget_gt', 'f4'), ('net_zero_year', 'i2'), ('equity_threshold', 'f4'),
+                ('rule', 'i1'), ('growth', 'f4')]
+PATHWAY_DTYPE = PARAMS_DTYPE[1:]
+SUMMARY_DTYPE = [('total_gt', 'f4'), ('within_budget', '?'), ('exhaust_year', 'i2'),
+                 ('countries_over_share', 'i2')]
+
+
+def baseline(entities=None):
+    """CO₂ e popolazione di ogni paese nell'ultimo anno in cui ci sono entrambe
+    (tonnellate, abitanti, anno)."""
+    h = load_hierarchy()
+    panel = h.panel
+    entities = h.entities_at('country') if entities is None else list(entities)
+    ids = panel.ids(entities)
+    co2 = panel.metrics['co2'][ids]
+    pop = panel.metrics['population'][ids]
+
+    valid = ~np.isnan(co2) & ~np.isnan(pop)
+    idx = valid.shape[1] - 1 - valid[:, ::-1].argmax(1)
+    rows = np.arange(len(ids))
+    e0, p0 = co2[rows, idx], pop[rows, idx]
+    keep = valid.any(1) & (p0 > 0) & (panel.years[idx] >= MIN_LAST_YEAR)
+    names = np.array(entities, dtype=object)[keep]
+    return pd.DataFrame({'co2': e0[keep], 'population': p0[keep], 'year': panel.years[idx][keep]},
+                        index=pd.Index(names, name='Entity'))
+
+
+def annual_reduction(per_capita, year, net_zero_year=2050):
+    """Riduzione annua % della tabella di trajectory.py: lineare a zero entro
+    `net_zero_year` dall'anno del dato, crescita consentita sotto la soglia di equità."""
+    years_left = np.maximum(net_zero_year - np.asarray(year), net_zero_year - START_YEAR + 1)
+    return np.where(np.asarray(per_capita) < EQUITY_THRESHOLD, -EQUITY_GROWTH * 100, 100 / years_left)
+
+
+def scenario_grid(budgets=sorted({*range(100, 801, 50), BUDGET_GT}),
+                  net_zero_years=range(2040, HORIZON + 1, 5), thresholds=(0, 1, 2, 3, 4, 5), rules=RULES, growth=(EQUITY_GROWTH,)):
+    """Prodotto cartesiano dei parametri come array strutturato (uno scenario per riga)."""
+    rows = product(budgets, net_zero_years, thresholds, [RULES.index(r) for r in rules], growth)
+    return np.array(list(rows), dtype=PARAMS_DTYPE)
+
+
+def distinct_pathways(params):
+    """(combinazioni distinte che cambiano la traiettoria, indice della combinazione per scenario)."""
+    key = np.zeros(len(params), dtype=PATHWAY_DTYPE)
+    for name in key.dtype.names:
+        key[name] = params[name]
+    conv = params['rule'] == RULES.index('convergence')
+    key['equity_threshold'][conv] = 0
+    key['growth'][conv] = 0
+    unique, inverse = np.unique(key, return_inverse=True)
+    return unique, inverse.ravel()
+
+
+def project(params, e0, p0, years, start=START_YEAR):
+    """Traiettorie annuali (scenari × paesi × anni) in tonnellate di CO₂."""
+    t = (np.asarray(years) - start)[None, None, :].astype(float)
+    span = (params['net_zero_year'].astype(float) - start)[:, None, None]
+    rule = params['rule'][:, None, None]
+    e0 = np.asarray(e0, dtype=float)[None, :, None]
+    p0 = np.asarray(p0, dtype=float)[None, :, None]
+    frac = np.clip(t / span, 0, 1)
+
+    linear = 1 - frac
+    expo = np.where(frac < 1, RESIDUAL ** frac, 0.0)
+
+    # convergenza: la somma dei paesi segue la traiettoria lineare mondiale
+    pc0 = e0 / p0
+    world_pc = e0.sum() / p0.sum()
+    w = np.clip(2 * t / span, 0, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conv = np.where(e0 > 0, (pc0 * (1 - w) + world_pc * w) * (1 - frac) / pc0, 0.0)
+
+    factor = np.select([rule == 0, rule == 1], [linear, expo], conv)
+
+    # equità: crescita fino a metà periodo, poi lineare a zero
+    peak = span / 2
+    growth = params['growth'][:, None, None].astype(float)
+    equity = (1 + growth) ** np.minimum(t, peak) * np.clip((span - t) / (span - peak), 0, 1)
+    low = (pc0 < params['equity_threshold'][:, None, None]) & (rule != 2)
+    factor = np.where(low, equity, factor)
+    return (factor * e0).astype(np.float32)
+
+
+def cumulate(paths):
+    """Cumulata per paese (scenari × paesi) e mondiale anno per anno (scenari × anni), in Gt."""
+    return paths.sum(2, dtype=float) / 1e9, paths.sum(1, dtype=float).cumsum(1) / 1e9
+
+
+def summarize(paths, params, p0, years):
+    return _summary(*cumulate(paths), params['budget_gt'].astype(float), p0, years)
+
+
+def _summary(cum_country, cum_world, budget, p0, years):
+    over = cum_world > budget[:, None]
+    share = np.asarray(p0, dtype=float) / np.sum(p0)
+
+    out = np.zeros(len(budget), dtype=SUMMARY_DTYPE)
+    out['total_gt'] = cum_world[:, -1]
+    out['within_budget'] = ~over.any(1)
+    out['exhaust_year'] = np.where(over.any(1), np.asarray(years)[over.argmax(1)], 0)
+    out['countries_over_share'] = (cum_country > budget[:, None] * share[None, :]).sum(1)
+    return out
+
+
+def _run_chunk(path, lo, params, e0, p0, years):
+    paths = project(params, e0, p0, years)
+    out = open_memmap(path, mode='r+')
+    out[lo:lo + len(params)] = paths
+    out.flush()
+    return lo, cumulate(paths)
+
+
+def simulate(params=None, base=None, out_dir=SCENARIO_DIR, horizon=HORIZON, jobs=None, chunk=CHUNK):
+    """Calcola tutti gli scenari e li salva in `out_dir`; restituisce lo store."""
+    params = scenario_grid() if params is None else params
+    base = baseline() if base is None else base
+    years = np.arange(START_YEAR, horizon + 1)
+    e0, p0 = base['co2'].to_numpy(), base['population'].to_numpy()
+    pathways, pathway_id = distinct_pathways(params)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / 'meta.json').unlink(missing_ok=True)    # lo store è valido solo a fine scrittura
+    path = out_dir / 'pathways.npy'
+    open_memmap(path, mode='w+', dtype=np.float32, shape=(len(pathways), len(e0), len(years)))
+
+    cum_country = np.zeros((len(pathways), len(e0)))
+    cum_world = np.zeros((len(pathways), len(years)))
+    starts = range(0, len(pathways), chunk)
+    workers = jobs or min(len(starts), os.cpu_count())
+    if workers == 1:
+        results = [_run_chunk(path, lo, pathways[lo:lo + chunk], e0, p0, years) for lo in starts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_chunk, path, lo, pathways[lo:lo + chunk], e0, p0, years)
+                       for lo in starts]
+            results = [fut.result() for fut in futures]
+    for lo, (country, world) in results:
+        cum_country[lo:lo + len(country)] = country
+        cum_world[lo:lo + len(world)] = world
+
+    # il budget entra solo qui, nel confronto
+    summary = _summary(cum_country[pathway_id], cum_world[pathway_id],
+                       params['budget_gt'].astype(float), p0, years)
+    table = np.zeros(len(params), dtype=PARAMS_DTYPE + [('pathway', 'i4')] + SUMMARY_DTYPE)
+    for name in params.dtype.names:
+        table[name] = params[name]
+    table['pathway'] = pathway_id
+    for name in summary.dtype.names:
+        table[name] = summary[name]
+    np.save(out_dir / 'scenarios.npy', table)
+    meta = {
+        'countries': list(base.index), 'years': years.tolist(), 'rules': list(RULES),
+        'unit': 'tCO2', 'start_year': START_YEAR, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'baseline_co2': e0.tolist(), 'baseline_population': p0.tolist(),
+    }
+    (out_dir / 'meta.json').write_text(json.dumps(meta, ensure_ascii=False))
+    return ScenarioStore(out_dir)
+
+
+class ScenarioStore:
+    """Lettura degli scenari salvati: le traiettorie restano su disco (memory-map)."""
+
+    def __init__(self, path=SCENARIO_DIR):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / 'meta.json').read_text())
+        self.countries = self.meta['countries']
+        self.years = np.array(self.meta['years'])
+        self.rules = self.meta['rules']
+        self.pathways = np.load(self.path / 'pathways.npy', mmap_mode='r')
+        self.scenarios = np.load(self.path / 'scenarios.npy')
+        if 'pathway' not in self.scenarios.dtype.names:
+            raise ValueError(f"{self.path}: store del formato precedente, rieseguire scenarios.py")
+        self._country_id = {c: i for i, c in enumerate(self.countries)}
+
+    def __len__(self):
+        return len(self.scenarios)
+
+    def table(self):
+        df = pd.DataFrame(self.scenarios)
+        df['rule'] = np.array(self.rules, dtype=object)[df['rule']]
+        df.index.name = 'scenario'
+        return df
+
+    def find(self, **criteria):
+        """Indici degli scenari con i parametri dati, es. find(budget_gt=300, rule='linear')."""
+        mask = np.ones(len(self.scenarios), dtype=bool)
+        for name, value in criteria.items():
+            if name == 'rule':
+                value = self.rules.index(value)
+            mask &= np.isclose(self.scenarios[name], value)
+        return np.flatnonzero(mask)
+
+    def pathway(self, scenario, countries=None):
+        """Traiettoria di uno scenario: anni × paesi, in tonnellate."""
+        countries = self.countries if countries is None else countries
+        cols = [self._country_id[c] for c in countries]
+        paths = self.pathways[self.scenarios['pathway'][scenario]]
+        return pd.DataFrame(np.asarray(paths[cols].T), columns=countries,
+                            index=pd.Index(self.years, name='Year'))
+
+    def world(self, scenario):
+        paths = self.pathways[self.scenarios['pathway'][scenario]]
+        return pd.Series(np.asarray(paths).sum(0, dtype=float),
+                         index=pd.Index(self.years, name='Year'), name='co2')
+
+
+def open_scenarios(path=SCENARIO_DIR):
+    return ScenarioStore(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simula la griglia di scenari 1.5°C per tutti i paesi.")
+    parser.add_argument('--out', default=SCENARIO_DIR, type=Path)
+    parser.add_argument('--horizon', type=int, default=HORIZON)
+    parser.add_argument('--jobs', type=int, default=None, help="processi paralleli")
+    parser.add_argument('--budget', type=float, default=BUDGET_GT, help="budget per il riepilogo")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    store = simulate(out_dir=args.out, horizon=args.horizon, jobs=args.jobs)
+    elapsed = time.perf_counter() - t0
+    size = (store.path / 'pathways.npy').stat().st_size / 1e6
+    print(f"{len(store)} scenari ({len(store.pathways)} traiettorie distinte) × {len(store.countries)} paesi "
+          f"× {len(store.years)} anni in {elapsed:.2f} s ({size:.1f} MB in {store.path})")
+
+    table = store.table()
+    sub = table[np.isclose(table['budget_gt'], args.budget)]
+    ok = sub[sub['within_budget']]
+    print(f"\nBudget {args.budget:.0f} GtCO₂: {len(ok)} scenari su {len(sub)} restano nel budget")
+    print(sub.groupby(['rule', 'net_zero_year'])['total_gt'].min().unstack().round(0).to_string())
+
+    t0 = time.perf_counter()
+    sid = store.find(budget_gt=args.budget, net_zero_year=2050, equity_threshold=EQUITY_THRESHOLD,
+                     rule='linear')[0]
+    path = store.pathway(sid, ['United States', 'China', 'India'])
+    print(f"\nScenario {sid} letto in {(time.perf_counter() - t0) * 1e3:.2f} ms")
+    print((path.loc[[2025, 2030, 2040, 2050]] / 1e9).round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
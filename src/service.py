@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import cli
+import render_all
+from owid_store import CACHE_DIR, DATA_DIR
+
+# === SERVIZIO HTTP LOCALE PER LE ANALISI ===
+# python src/service.py [--port 8765] [--workers N]
+# Un solo processo asyncio (solo libreria standard): all'avvio carica pannello,
+# gerarchia e tabelle derivate, poi risponde da memoria invece di rilanciare
+# gli script (avvio dell'interprete + lettura dei CSV a ogni richiesta).
+#   GET /api/<analisi>?top=10&entities=Italy,France&year=2023   tabelle di cli.py in JSON
+#   GET /api/fuel_shares?year=2023&top=10                         quote cumulative per fonte
+#   GET /png/<grafico>?dpi=100                                    grafico di render_all
+#   GET /health
+# Niente calcolo sul ciclo degli eventi: le tabelle (bootstrap TCRE, prima
+# costruzione di un indice, ...) girano in un pool di thread che condivide il
+# pannello in memoria, i grafici (matplotlib, secondi di CPU) in un pool di
+# processi; una richiesta pesante non ferma le altre. Tutte le risposte sono tenute in una
+# cache LRU con nella chiave la versione di dati e codice (i PNG con la chiave
+# di render_all): se cambia un CSV di data/ le copie in memoria sono ricaricate
+# e le tabelle ricalcolate. Per la misura delle latenze: loadtest.py.
+
+HOST = '127.0.0.1'
+PORT = 8765
+CACHE_ENTRIES = 256
+DPI_RANGE = (30, 300)                   # dpi dei PNG, fuori intervallo viene portato al limite
+PNG_DIR = CACHE_DIR / 'service'
+LIST_PARAMS = ('entities', 'years')     # valori separati da virgola
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json(obj):
+    return 'application/json; charset=utf-8', json.dumps(obj, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def _records(df):
+    return df.to_json(orient='records', force_ascii=False).encode('utf-8')
+
+
+class Service:
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count()
+        self.pool = None
+        self.threads = None
+        self.cache = OrderedDict()
+        self.hits = self.misses = 0
+        self.started = time.time()
+        self.clients = set()
+        self.data_version = None
+
+    # --- avvio ---
+    def warm(self):
+        """Carica una volta pannello, gerarchia e tabelle in cache."""
+        from fuel_attribution import compute_attribution
+        from hierarchy import load_hierarchy
+        from tcre_engine import tcre_data
+
+        t0 = time.perf_counter()
+        self.data_version = self.versions()[0]
+        load_hierarchy()
+        compute_attribution()
+        tcre_data()
+        # 'spawn': i processi dei grafici non ereditano i socket aperti del servizio
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self.threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='table')
+        return time.perf_counter() - t0
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        if self.threads is not None:
+            self.threads.shutdown(cancel_futures=True)
+
+    async def drain(self, timeout=5.0):
+        """Attende la chiusura delle connessioni aperte (client già disconnessi)."""
+        if self.clients:
+            await asyncio.wait(list(self.clients), timeout=timeout)
+
+    # --- cache delle risposte ---
+    def versions(self):
+        """(dati, codice): hash dei CSV di data/ e dei sorgenti di src/."""
+        from cache import cache_key, code_version
+
+        data = cache_key('data', [p.name for p in DATA_DIR.glob('*.csv')], None, None)
+        return data, code_version(*sorted(render_all.SRC_DIR.glob('*.py')))
+
+    def _reload(self):
+        """Dimentica le copie dei CSV già caricate: la prossima tabella rilegge data/."""
+        import hierarchy
+        import manifest
+        import owid_store
+        import panel
+
+        owid_store._loaded.clear()
+        manifest._manifest = None
+        panel._panel = None
+        hierarchy._hierarchy = None
+
+    def _cached(self, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+        self.misses += 1
+        return None
+
+    def _store(self, key, response):
+        self.cache[key] = response
+        while len(self.cache) > CACHE_ENTRIES:
+            self.cache.popitem(last=False)
+        return response
+
+    # --- endpoint ---
+    async def handle(self, path, query):
+        parts = [unquote(p) for p in path.strip('/').split('/') if p]
+        if parts == ['health']:
+            return _json({'status': 'ok', 'uptime_s': time.time() - self.started,
+                          'cache_entries': len(self.cache), 'hits': self.hits, 'misses': self.misses})
+        if len(parts) == 2 and parts[0] == 'api':
+            data, code = self.versions()
+            if data != self.data_version:
+                self._reload()
+                self.data_version = data
+            key = ('api', data, code, parts[1], tuple(sorted(query.items())))
+            return self._cached(key) or self._store(key, await self.table(parts[1], query))
+        if len(parts) == 2 and parts[0] == 'png':
+            return await self.png(parts[1], query)
+        if not parts:
+            return _json({'api': sorted([*cli.ANALYSES, 'fuel_shares']), 'png': sorted(render_all.FIGURES)})
+        raise HTTPError(404, f"percorso sconosciuto: {path}")
+
+    async def table(self, analysis, query):
+        if analysis == 'fuel_shares':
+            return self.fuel_shares(query)
+        if analysis not in cli.ANALYSES:
+            raise HTTPError(404, f"analisi sconosciuta: {analysis}")
+        argv = [analysis, '--no-plot']
+        for name, value in query.items():
+            argv.append('--' + name.replace('_', '-'))
+            argv += value.split(',') if name in LIST_PARAMS else [value]
+        err = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(err):
+                args = cli.build_parser().parse_args(argv)
+        except SystemExit:
+            raise HTTPError(400, err.getvalue().strip().splitlines()[-1])
+        fn = cli.ANALYSES[analysis][0]
+        try:
+            df = await asyncio.get_running_loop().run_in_executor(self.threads, fn, args)
+        except KeyError as e:
+            raise HTTPError(400, f"entità, metrica o anno non validi: {e}")
+        except ValueError as e:
+            raise HTTPError(400, f"parametri non validi: {e}")
+        return 'application/json; charset=utf-8', _records(df)
+
+    def fuel_shares(self, query):
+        from fuel_attribution import compute_attribution
+        from hierarchy import load_hierarchy
+
+        fa = compute_attribution()
+        try:
+            year = int(query.get('year', fa.years[-1]))
+            top = int(query.get('top', 10))
+            entities = (query['entities'].split(',') if 'entities' in query
+                        else load_hierarchy().entities_at('country'))
+            table = fa.at(year, entities).head(top)
+        except (KeyError, ValueError, IndexError) as e:
+            raise HTTPError(400, f"parametri non validi: {e}")
+        return 'application/json; charset=utf-8', _records(table)
+
+    async def png(self, figure, query):
+        if figure not in render_all.FIGURES:
+            raise HTTPError(404, f"grafico sconosciuto: {figure}")
+        try:
+            dpi = int(query.get('dpi', 100))
+        except ValueError:
+            raise HTTPError(400, "dpi deve essere un intero")
+        dpi = min(max(dpi, DPI_RANGE[0]), DPI_RANGE[1])
+        key = ('png', render_all.figure_key(figure, ('png',), dpi))
+        cached = self._cached(key)
+        if cached:
+            return cached
+        out_dir = PNG_DIR / f'{dpi}dpi'
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.pool, render_all.render, figure, out_dir, ('png',), dpi)
+        if not result['files']:
+            raise HTTPError(500, f"{figure}: nessun grafico prodotto")
+        return self._store(key, ('image/png', (out_dir / result['files'][0]).read_bytes()))
+
+    # --- HTTP/1.1 minimale (GET, keep-alive) ---
+    async def serve_client(self, reader, writer):
+        task = asyncio.current_task()
+        self.clients.add(task)
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request.decode('latin-1').split()
+                except ValueError:
+                    break
+                conn = headers.get('connection', '').lower()
+                keep_alive = conn == 'keep-alive' or (version == 'HTTP/1.1' and conn != 'close')
+                status, ctype, body = await self.respond(method, target)
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                             f"Content-Type: {ctype}\r\nContent-Length: {len(body)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+                             + (body if method != 'HEAD' else b''))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.discard(task)
+            writer.close()
+
+    async def respond(self, method, target):
+        if method not in ('GET', 'HEAD'):
+            return (405, *_json({'error': 'solo GET'}))
+        url = urlsplit(target)
+        try:
+            return (200, *await self.handle(url.path, dict(parse_qsl(url.query))))
+        except HTTPError as e:
+            return (e.status, *_json({'error': str(e)}))
+        except Exception as e:     # noqa: BLE001 - l'errore va al client, il servizio resta su
+            return (500, *_json({'error': f'{type(e).__name__}: {e}'}))
+
+
+async def start(service, host=HOST, port=PORT):
+    return await asyncio.start_server(service.serve_client, host, port)
+
+
+async def serve(host=HOST, port=PORT, workers=None):
+    service = Service(workers)
+    warm = service.warm()
+    server = await start(service, host, port)
+    print(f"Pannello caricato in {warm:.2f} s; in ascolto su http://{host}:{port}/", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servizio HTTP locale per tabelle e grafici delle analisi.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=None, help="processi per i grafici")
+    args = parser.parse_args(argv)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(args.host, args.port, args.workers))
+
+
+if __name__ == '__main__':
+    main()
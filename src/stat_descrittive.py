@@ -1,21 +1,30 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import warnings
 warnings.filterwarnings('ignore')
 
+from descriptive import decade_summary, stats_table
+from hierarchy import country_mask
+from instrument import begin
+from owid_store import load
+
 # Stile grafico coerente
 plt.style.use('seaborn-v0_8-darkgrid')
 sns.set_palette("husl")
 
 # 1. Caricamento di tutti i dataset
-co2_source = pd.read_csv("co2-by-source.csv")
-co2_fuel = pd.read_csv("co2-emissions-by-fuel-line.csv")
-ghg_total = pd.read_csv("total-ghg-emissions.csv")
-co2_per_capita = pd.read_csv("co2-emissions-per-capita.csv")
-co2_by_region = pd.read_csv("annual-co-emissions-by-region.csv")
-co2_by_country = pd.read_csv("annual-co2-emissions-per-country.csv")
-temperature = pd.read_csv("temperature-anomaly.csv")
+begin('load')
+co2_source = load("co2-by-source.csv")
+co2_fuel = load("co2-emissions-by-fuel-line.csv")
+ghg_total = load("total-ghg-emissions.csv")
+co2_per_capita = load("co2-emissions-per-capita.csv")
+co2_by_region = load("annual-co-emissions-by-region.csv")
+co2_by_country = load("annual-co2-emissions-per-country.csv")
+temperature = load("temperature-anomaly.csv")
+
+# Statistiche per entità e decennio di tutti i file (in cache, calcolate in parallelo)
+begin('stats')
+stats = stats_table()
 
 # Lista per iterare
 datasets = {
@@ -33,13 +42,15 @@ def get_global(df, value_col):
     if 'Entity' in df.columns:
         global_df = df[df['Entity'].isin(['World', 'OWID_WRL'])].copy()
         if global_df.empty:
-            # fallback: somma tutti i paesi per anno
-            global_df = df.groupby('Year')[value_col].sum().reset_index()
+            # fallback: somma dei soli paesi per anno (senza continenti e altri aggregati)
+            countries = df[country_mask(df)] if 'Code' in df.columns else df
+            global_df = countries.groupby('Year')[value_col].sum().reset_index()
             global_df['Entity'] = 'World (sum)'
         return global_df
     return df
 
 # 3. Analisi e un grafico per dataset
+begin('plot')
 fig, axes = plt.subplots(4, 2, figsize=(16, 20))
 axes = axes.flatten()
 i = 0
@@ -49,10 +60,6 @@ for name, df in datasets.items():
     print(f"{name.upper()}")
     print(f"{'='*60}")
     
-    # Statistiche di base
-    numeric_cols = df.select_dtypes(include='number').columns
-    print(df[numeric_cols].describe())
-    
     # Preparazione serie da plottare
     if name == "Anomalia termica globale":
         world_temp = temperature[temperature['Entity'] == 'World'].copy()
@@ -88,6 +95,10 @@ for name, df in datasets.items():
     # Conversione in milioni per leggibilità (dove ha senso)
     unit = "Mt" if scale == 1e6 else ylabel
     plot_df = plot_df[plot_df['Year'] >= 1950].copy()  # focus post-1950
+
+    # Statistiche per decennio della serie mostrata (solo World, niente aggregati mescolati)
+    decades = decade_summary(stats, name, col_to_plot, since=1950)
+    print(decades[['Decade', 'count', 'mean', 'p25', 'median', 'p75', 'cagr', 'volatility']].to_string(index=False))
     
     ax = axes[i]
     ax.plot(plot_df['Year'], plot_df[col_to_plot] / scale, linewidth=2.5, color=sns.color_palette()[i % len(sns.color_palette())])
@@ -95,6 +106,11 @@ for name, df in datasets.items():
     ax.set_xlabel('Anno')
     ax.set_ylabel(ylabel.replace("tonnellate", unit))
     ax.grid(True, alpha=0.3)
+
+    # Fascia p25–p75 di ogni decennio
+    for _, d in decades.iterrows():
+        ax.fill_between([d['Decade'], d['last_year']], d['p25'] / scale, d['p75'] / scale,
+                        color=ax.get_lines()[-1].get_color(), alpha=0.15, linewidth=0)
     
     # Annotazione ultimo valore
     last_year = plot_df['Year'].iloc[-1]
@@ -2,15 +2,20 @@ import pandas as pd
 import numpy as np
 from scipy import stats
 import matplotlib.pyplot as plt
-import seaborn as sns
 
-# Ricarica i due dataset chiave (se non già in memoria)
-co2_country = pd.read_csv("annual-co2-emissions-per-country.csv")
-temp = pd.read_csv("temperature-anomaly.csv")
+from hierarchy import load_hierarchy
+from instrument import begin
+from tcre_engine import bootstrap
+
+# Entrambe le serie dal pannello condiviso (array in memory-map, niente CSV)
+begin('load')
+hierarchy = load_hierarchy()
 
 # 1. CO₂ globale annuale (tonnellate → GtCO₂)
-co2_global = co2_country.groupby('Year')['Annual CO₂ emissions'].sum().reset_index()
-co2_global = co2_global[co2_global['Year'] >= 1850]
+# Riga World della gerarchia: sommare tutte le righe per anno contava più
+# volte le stesse emissioni (World + continenti + gruppi di reddito + paesi)
+co2_global = hierarchy.global_series('co2', years=(1850, None)).dropna()
+co2_global = co2_global.rename('Annual CO₂ emissions').reset_index()
 
 # Conversione in GtCO₂
 co2_global['GtCO2'] = co2_global['Annual CO₂ emissions'] / 1e9
@@ -19,15 +24,15 @@ co2_global['GtCO2'] = co2_global['Annual CO₂ emissions'] / 1e9
 co2_global['Cumulative_GtCO2'] = co2_global['GtCO2'].cumsum()
 
 # 3. Anomalia termica globale (World)
-temp_world = temp[temp['Entity'] == 'World'].copy()
-temp_world = temp_world[['Year', 'Global average temperature anomaly relative to 1861-1890']].dropna()
-temp_world = temp_world.rename(columns={'Global average temperature anomaly relative to 1861-1890': 'Temp_anomaly'})
+temp_world = hierarchy.global_series('temperature').dropna()
+temp_world = temp_world.rename('Temp_anomaly').reset_index()
 
 # 4. Merge su anno comune (dal 1850)
 df = pd.merge(co2_global[['Year', 'GtCO2', 'Cumulative_GtCO2']], 
               temp_world, on='Year', how='inner')
 
 # 5. Regressione lineare: ΔT = TCRE × Cumulative CO₂ + intercept
+begin('compute')
 slope, intercept, r_value, p_value, std_err = stats.linregress(df['Cumulative_GtCO2'], df['Temp_anomaly'])
 
 # TCRE in °C per GtCO₂
@@ -40,7 +45,13 @@ print(f"Ultime emissioni cumulative (1850–2024): {df['Cumulative_GtCO2'].iloc[
 print(f"Anomalia 2024: {df['Temp_anomaly'].iloc[-1]:.3f} °C")
 print(f"Carbon budget rimanente per +0.5°C (1.5°C totali): {(1500 - df['Temp_anomaly'].iloc[-1]*1000) / (TCRE*1000):.0f} GtCO₂")
 
+# Incertezza: bootstrap sugli anni + perturbazione entro l'IC 95% dell'anomalia
+samples = bootstrap(n_rep=5000)
+lo, hi = samples['budget_gt'].quantile([0.025, 0.975])
+print(f"Intervallo 95% del budget (bootstrap, 5000 repliche): {lo:.0f} – {hi:.0f} GtCO₂")
+
 # 6. Grafico
+begin('plot')
 plt.figure(figsize=(14, 8))
 plt.scatter(df['Cumulative_GtCO2'], df['Temp_anomaly'], 
             c=df['Year'], cmap='inferno', s=60, edgecolors='white', linewidth=0.5, alpha=0.9)
@@ -0,0 +1,151 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from hierarchy import load_hierarchy
+
+# === TCRE: STIMA ONLINE + BOOTSTRAP VETTORIALE ===
+# ΔT = intercetta + TCRE × CO₂ cumulativa (GtCO₂), come in tcre.py.
+# - RegressionStats tiene le somme sufficienti: il fit si aggiorna anno per
+#   anno senza rileggere la serie (usato anche da incremental.py)
+# - bootstrap() ricampiona coppie anno/anomalia e perturba l'anomalia entro
+#   l'intervallo al 95% di temperature-anomaly.csv: migliaia di repliche in
+#   un unico batch NumPy, facoltativamente divise su un pool di processi.
+
+TEMP_METRICS = ['temperature', 'temperature_lower', 'temperature_upper']
+START_YEAR = 1850
+TARGET = 1.5
+Z95 = 1.959964
+
+
+class RegressionStats:
+    """Somme sufficienti per la regressione lineare y = a + b·x."""
+
+    def __init__(self, n=0, sx=0.0, sy=0.0, sxx=0.0, sxy=0.0, syy=0.0):
+        self.n, self.sx, self.sy = n, sx, sy
+        self.sxx, self.sxy, self.syy = sxx, sxy, syy
+
+    def add(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.n += x.size
+        self.sx += x.sum()
+        self.sy += y.sum()
+        self.sxx += (x * x).sum()
+        self.sxy += (x * y).sum()
+        self.syy += (y * y).sum()
+
+    def fit(self):
+        """(slope, intercept, r²)"""
+        return _fit(self.n, self.sx, self.sy, self.sxx, self.sxy, self.syy)
+
+    def to_dict(self):
+        return {k: float(v) for k, v in vars(self).items()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(int(d['n']), d['sx'], d['sy'], d['sxx'], d['sxy'], d['syy'])
+
+
+def _fit(n, sx, sy, sxx, sxy, syy):
+    # funziona sia su scalari sia su array (un fit per elemento)
+    cxx = sxx - sx * sx / n
+    cxy = sxy - sx * sy / n
+    cyy = syy - sy * sy / n
+    slope = cxy / cxx
+    intercept = (sy - slope * sx) / n
+    return slope, intercept, cxy * cxy / (cxx * cyy)
+
+
+def remaining_budget(slope, t_now, target=TARGET):
+    """GtCO₂ ancora emettibili prima di raggiungere `target` °C."""
+    return (target - t_now) / slope
+
+
+def tcre_data():
+    """Tabella Year / Cumulative_GtCO2 / Temp_anomaly / Lower / Upper (dal 1850)."""
+    h = load_hierarchy()
+    glob = h.global_series('co2', years=(START_YEAR, None)).dropna()
+    cum = (glob / 1e9).cumsum().rename('Cumulative_GtCO2')
+
+    world = pd.concat([h.global_series(m, years=(START_YEAR, None)) for m in TEMP_METRICS],
+                      axis=1).dropna()
+    world.columns = ['Temp_anomaly', 'Lower', 'Upper']
+    return pd.concat([cum, world], axis=1, join='inner').reset_index()
+
+
+def expanding_fit(x, y):
+    """Fit aggiornato anno per anno: TCRE, intercetta e R² per ogni anno finale."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = np.arange(1, len(x) + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _fit(n, np.cumsum(x), np.cumsum(y), np.cumsum(x * x),
+                    np.cumsum(x * y), np.cumsum(y * y))
+
+
+# === BOOTSTRAP ===
+
+def _bootstrap_batch(x, y, sigma, n_rep, seed, mode, target):
+    rng = np.random.default_rng(seed)
+    n = len(x)
+    if mode == 'bounds':
+        idx = np.broadcast_to(np.arange(n), (n_rep, n))
+    else:
+        idx = rng.integers(0, n, size=(n_rep, n))
+    xb = x[idx]
+    yb = y[idx]
+    # anomalia dell'ultimo anno osservato, usata per il budget residuo
+    t_now = np.full(n_rep, y[-1])
+    if mode in ('bounds', 'both'):
+        yb = yb + rng.standard_normal((n_rep, n)) * sigma[idx]
+        t_now = t_now + rng.standard_normal(n_rep) * sigma[-1]
+
+    slope, intercept, r2 = _fit(n, xb.sum(1), yb.sum(1), (xb * xb).sum(1),
+                                (xb * yb).sum(1), (yb * yb).sum(1))
+    return np.stack([slope, intercept, r2, remaining_budget(slope, t_now, target)])
+
+
+def bootstrap(data=None, n_rep=5000, mode='both', seed=0, workers=None,
+              batch=2000, target=TARGET):
+    """Distribuzione di TCRE e budget residuo.
+
+    `mode`: 'pairs' (ricampiona gli anni), 'bounds' (perturba l'anomalia con
+    σ = (upper - lower) / 3.92) oppure 'both'.
+    `workers`: None = tutto nel processo corrente, altrimenti numero di processi.
+    """
+    data = tcre_data() if data is None else data
+    x = data['Cumulative_GtCO2'].to_numpy(dtype=float)
+    y = data['Temp_anomaly'].to_numpy(dtype=float)
+    sigma = (data['Upper'].to_numpy(dtype=float) - data['Lower'].to_numpy(dtype=float)) / (2 * Z95)
+
+    sizes = [batch] * (n_rep // batch) + ([n_rep % batch] if n_rep % batch else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(x, y, sigma, size, s, mode, target) for size, s in zip(sizes, seeds)]
+
+    if workers and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_bootstrap_batch, *zip(*args)))
+    else:
+        parts = [_bootstrap_batch(*a) for a in args]
+
+    out = np.concatenate(parts, axis=1)
+    return pd.DataFrame({'TCRE': out[0], 'intercept': out[1], 'r2': out[2], 'budget_gt': out[3]})
+
+
+def summary(samples, q=(2.5, 50, 97.5)):
+    return samples.quantile([v / 100 for v in q]).rename(index=lambda v: f'p{v * 100:g}')
+
+
+if __name__ == '__main__':
+    import time
+
+    data = tcre_data()
+    slope, intercept, r2 = expanding_fit(data['Cumulative_GtCO2'], data['Temp_anomaly'])
+    print(f"TCRE: {slope[-1]:.6f} °C/GtCO₂ | R²: {r2[-1]:.4f}")
+    t0 = time.perf_counter()
+    samples = bootstrap(data, n_rep=20000, workers=os.cpu_count())
+    print(f"Bootstrap 20000 repliche in {time.perf_counter() - t0:.2f} s")
+    print(summary(samples).to_string())
@@ -1,24 +1,22 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from instrument import begin
+from panel import load_panel
+from scenarios import (BUDGET_GT, EQUITY_THRESHOLD, START_YEAR, TRAJECTORY_COUNTRIES,
+                       annual_reduction, baseline, project, scenario_grid, summarize)
+
 # === CARICAMENTO E CALCOLO (100% funzionante) ===
-co2 = pd.read_csv("annual-co2-emissions-per-country.csv")
-pop = pd.read_csv("population.csv")
-pop = pop.rename(columns={'Population (historical)': 'Population'})
-
-countries = [
-    'United States', 'China', 'India', 'Russia', 'Japan',
-    'Germany', 'Canada', 'United Kingdom', 'France', 'Australia',
-    'South Korea', 'Brazil', 'Indonesia', 'Saudi Arabia', 'South Africa'
-]
-
-df = co2[co2['Entity'].isin(countries)].copy()
-df = df.rename(columns={'Annual CO₂ emissions': 'CO2_tons'})
-df = df.merge(pop[['Entity', 'Year', 'Population']], on=['Entity', 'Year'], how='left')
-df = df.dropna(subset=['CO2_tons', 'Population']).copy()
-df['CO2_tons'] = pd.to_numeric(df['CO2_tons'], errors='coerce')
-df['Population'] = pd.to_numeric(df['Population'], errors='coerce')
-df = df.dropna(subset=['CO2_tons', 'Population'])
+begin('load')
+panel = load_panel()
+
+countries = TRAJECTORY_COUNTRIES
+
+df = (panel.select('co2', 'population')
+      .where(entities=countries)
+      .dropna()
+      .rename(co2='CO2_tons', population='Population')
+      .collect())
 
 # === SPIEGAZIONE SEMPLICE E CORRETTA (finalmente!) ===
 # Per stare sotto 1.5°C con giustizia climatica:
@@ -26,32 +24,48 @@ df = df.dropna(subset=['CO2_tons', 'Population'])
 # - Partendo da livelli diversi → chi emette tanto oggi deve scendere MOLTO VELOCEMENTE
 # - Chi emette poco può mantenere o crescere leggermente (per sviluppo)
 
+begin('compute')
+# Ultima riga di ogni paese in un solo passaggio (df è già ordinato per anno)
+latest = df.groupby('Entity', sort=False).tail(1).set_index('Entity')
+
 results = []
 for country in countries:
-    last = df[df['Entity'] == country].sort_values('Year').iloc[-1]
+    last = latest.loc[country]
     co2_tons = float(last['CO2_tons'])
     pop = float(last['Population'])
     per_capita = co2_tons / pop
-    years_left = max(2050 - int(last['Year']), 26)
-    
-    # Riduzione lineare a zero entro il 2050
-    annual_reduction_percent = (per_capita / years_left) / per_capita * 100  # sempre ~3.85%
-    
-    # Ma per giustizia climatica: chi è sotto 3 t/capita può crescere un po'
-    if per_capita < 3.0:
-        annual_reduction_percent = -2.5  # crescita consentita per sviluppo pulito
-    
+
+    # Riduzione lineare a zero entro il 2050; per giustizia climatica chi è
+    # sotto 3 t/capita può crescere del 2.5% (sviluppo pulito)
+    annual_reduction_percent = float(annual_reduction(per_capita, int(last['Year'])))
+
     results.append({
         'Paese': country,
-        'CO₂ 2023 (Gt)': f"{co2_tons / 1e9:.2f}",
-        'Per capita 2023 (t)': f"{per_capita:.1f}",
-        'Riduzione annua\nnecessaria 2025→2050': f"{annual_reduction_percent:.1f}%"
+        'CO₂ 2023 (Gt)': co2_tons / 1e9,
+        'Per capita 2023 (t)': per_capita,
+        'Riduzione annua\nnecessaria 2025→2050': annual_reduction_percent
     })
 
-tabella = pd.DataFrame(results)
-tabella = tabella.sort_values('Per capita 2023 (t)', key=lambda x: x.astype(float), ascending=False)
+# Ordinamento sui valori numerici; le stringhe servono solo alla tabella grafica
+tabella = pd.DataFrame(results).sort_values('Per capita 2023 (t)', ascending=False, ignore_index=True)
+celle = tabella.copy()
+for col, fmt in zip(tabella.columns[1:], ['{:.2f}', '{:.1f}', '{:.1f}%']):
+    celle[col] = tabella[col].map(fmt.format)
+
+begin('budget')
+# === VERIFICA DEL BUDGET (regola di riferimento applicata a tutti i paesi) ===
+# Zero netto 2050, crescita del 2.5% sotto 3 t pro capite: la cumulata 2025–2050
+# dei paesi è confrontata con il budget IPCC invece di citarlo solo in nota
+ref = scenario_grid([BUDGET_GT], [2050], [EQUITY_THRESHOLD], rules=['linear'])
+base = baseline()
+paths = project(ref, base['co2'], base['population'], range(START_YEAR, 2051))
+summary = summarize(paths, ref, base['population'], range(START_YEAR, 2051))[0]
+esito = 'rispettato' if summary['within_budget'] else f"esaurito nel {summary['exhaust_year']}"
+print(f"Cumulata 2025–2050 con la regola di riferimento: {summary['total_gt']:.0f} GtCO₂ "
+      f"su un budget di {BUDGET_GT} GtCO₂ ({esito})")
 
 # === TABELLA GRAFICA PERFETTA - NESSUNA SOVRAPPOSIZIONE ===
+begin('plot')
 fig = plt.figure(figsize=(15, 9.5))
 ax = fig.add_subplot(111)
 ax.axis('off')
@@ -59,7 +73,7 @@ ax.axis('off')
 # Larghezze colonne adattate
 col_widths = [0.25, 0.18, 0.18, 0.39]
 
-table = ax.table(cellText=tabella.values,
+table = ax.table(cellText=celle.values,
                  colLabels=tabella.columns,
                  cellLoc='center',
                  loc='upper center',
@@ -78,7 +92,7 @@ for i in range(len(tabella)):
             cell.set_facecolor('#f8f8f8')
         # Evidenzia ultima colonna
         if j == 3:
-            val = float(tabella.iloc[i, 3].replace('%', '').replace('+', ''))
+            val = tabella.iloc[i, 3]
             if val > 3.0:
                 cell.set_facecolor('#ffcccc')
                 cell.get_text().set_color('darkred')